@@ -1,9 +1,9 @@
 from django.conf import settings
 import logging
-from django.core.mail import EmailMultiAlternatives
-from django.template.loader import render_to_string
 from django.urls import reverse
 
+from payments import mail_templates, outbox, smtp
+
 
 logger = logging.getLogger(__name__)
 
@@ -40,13 +40,8 @@ def send_welcome_email(*, user, request=None) -> None:
             except Exception:
                 context["login_url"] = None
 
-        html_body = render_to_string("emails/welcome_email.html", context)
-
         # Provide a minimal text alternative for clients that don't render HTML
-        text_body = render_to_string(
-            "emails/welcome_email.txt",
-            context,
-        ) if template_exists("emails/welcome_email.txt") else (
+        text_body = (
             f"Hare Krishna {context['username']},\n\n"
             f"Your account has been created successfully.\n"
             f"Username: {user.username}\n"
@@ -56,22 +51,21 @@ def send_welcome_email(*, user, request=None) -> None:
         )
 
         from_email = getattr(settings, "DEFAULT_FROM_EMAIL", "noreply@iskcongorakhpur.com")
-        msg = EmailMultiAlternatives(subject, text_body, from_email, [user.email])
-        msg.attach_alternative(html_body, "text/html")
-        msg.send(fail_silently=_should_fail_silently())
+        msg = mail_templates.message(
+            subject, [user.email], context=context, from_email=from_email,
+            text_template="emails/welcome_email.txt", text=text_body,
+            html_template="emails/welcome_email.html",
+        )
+        outbox.enqueue(msg, kind="welcome", fail_silently=_should_fail_silently())
     except Exception:
         # Never block signup flow due to email errors; log for ops visibility
         logger.exception("Failed to send welcome email to %s", getattr(user, "email", None))
 
 
 def template_exists(path: str) -> bool:
-    """Best-effort check for template existence without raising errors."""
-    from django.template import engines
-
+    """Best-effort check for template existence without raising errors (cached per process)."""
     try:
-        django_engine = engines["django"]
-        django_engine.get_template(path)
-        return True
+        return mail_templates.exists(path)
     except Exception:
         return False
 
@@ -95,13 +89,12 @@ def send_signup_otp_email(*, email: str, username: str, code: str) -> bool:
         )
         subject = "Your ISKCON Gorakhpur verification code"
         context = {"username": username, "code": code}
-        html_body = render_to_string("emails/otp_email.html", context)
         text_body = f"Dear {username},\nYour verification code is: {code}\n\nHare Krishna,\nTeam ISKCON"
         from_email = getattr(settings, "EMAIL_HOST_USER", None) or getattr(settings, "DEFAULT_FROM_EMAIL", "noreply@iskcongorakhpur.com")
         logger.info("Using from address for signup OTP: %s", from_email)
-        msg = EmailMultiAlternatives(subject, text_body, from_email, [email])
-        msg.attach_alternative(html_body, "text/html")
-        sent_count = msg.send(fail_silently=_should_fail_silently())
+        msg = mail_templates.message(subject, [email], context=context, from_email=from_email,
+                                     text=text_body, html_template="emails/otp_email.html")
+        sent_count = smtp.send(msg, fail_silently=_should_fail_silently())
         return bool(sent_count)
     except Exception:
         # Do not raise in user flow; log error for diagnosis
@@ -128,14 +121,13 @@ def send_login_otp_email(*, email: str, username: str, code: str) -> bool:
         )
         subject = "Your ISKCON Gorakhpur login code"
         context = {"username": username, "code": code}
-        html_body = render_to_string("emails/otp_email.html", context)
         text_body = f"Dear {username},\nYour login code is: {code}\n\nHare Krishna,\nTeam ISKCON"
         # Prefer authenticated SMTP user as from address for provider compatibility
         from_email = getattr(settings, "EMAIL_HOST_USER", None) or getattr(settings, "DEFAULT_FROM_EMAIL", "noreply@iskcongorakhpur.com")
         logger.info("Using from address for login OTP: %s", from_email)
-        msg = EmailMultiAlternatives(subject, text_body, from_email, [email])
-        msg.attach_alternative(html_body, "text/html")
-        sent_count = msg.send(fail_silently=_should_fail_silently())
+        msg = mail_templates.message(subject, [email], context=context, from_email=from_email,
+                                     text=text_body, html_template="emails/otp_email.html")
+        sent_count = smtp.send(msg, fail_silently=_should_fail_silently())
         return bool(sent_count)
     except Exception:
         logger.exception("Failed to send login OTP email to %s", email)
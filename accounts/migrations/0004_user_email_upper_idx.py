@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """Functional index for ``User.objects.filter(email__iexact=...)`` (sign-up and sign-in).
+
+    ``auth.User`` belongs to django.contrib.auth, so the index is created with
+    SQL here rather than declared in ``Meta.indexes``. The expression has to
+    be ``UPPER(email)``: that is what Django compiles ``__iexact`` to on
+    PostgreSQL, and an index on ``LOWER(email)`` would never be used.
+    """
+
+    dependencies = [
+        ("accounts", "0003_delete_customer"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql="CREATE INDEX auth_user_email_upper_idx ON auth_user (UPPER(email));",
+            reverse_sql="DROP INDEX auth_user_email_upper_idx;",
+        ),
+    ]
@@ -1,12 +1,98 @@
 from django.contrib import admin
-from .models import Donor, Donation, Receipt, MagicLinkToken, OtpCode
+from .models import (Donor, Donation, Receipt, MagicLinkToken, OtpCode, WebhookEvent, Campaign, CampaignDelivery,
+                     DonorPurposeSummary, DailyDonationRollup, MonthlyDonationRollup, RollupWatermark)
+
+class DonorPurposeSummaryInline(admin.TabularInline):
+    model = DonorPurposeSummary
+    fields = ("purpose","total_amount","donation_count")
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
 
 @admin.register(Donor)
 class DonorAdmin(admin.ModelAdmin):
-    list_display = ("id","name","email_norm","phone_e164","pan","is_claimed","created_at")
+    list_display = ("id","name","email_norm","phone_e164","pan","is_claimed","total_given","last_donation","created_at")
     search_fields = ("name","email","email_norm","phone_e164","pan")
+    list_select_related = ("summary",)
+    inlines = [DonorPurposeSummaryInline]
+
+    # Read from DonorSummary (kept by mark_paid_and_receipt), not aggregated per row
+    @admin.display(description="Total given", ordering="summary__total_amount")
+    def total_given(self, obj):
+        summary = getattr(obj, "summary", None)
+        return f"₹{summary.total_amount} ({summary.donation_count})" if summary else "—"
+
+    @admin.display(description="Last donation", ordering="summary__last_donation_at")
+    def last_donation(self, obj):
+        summary = getattr(obj, "summary", None)
+        return summary.last_donation_at if summary else None
 
 admin.site.register(Donation)
 admin.site.register(Receipt)
 admin.site.register(MagicLinkToken)
 admin.site.register(OtpCode)
+
+@admin.register(WebhookEvent)
+class WebhookEventAdmin(admin.ModelAdmin):
+    list_display = ("id","gw_order_id","event","status","outcome","deliveries","attempts","received_at","processed_at")
+    list_filter = ("status","outcome")
+    search_fields = ("gw_order_id","gw_txn_id")
+    readonly_fields = ("gw_order_id","gw_txn_id","event","deliveries","received_at","processed_at")
+    actions = ["requeue"]
+
+    @admin.action(description="Requeue selected events")
+    def requeue(self, request, queryset):
+        from django.utils import timezone
+        queryset.exclude(status="DONE").update(status="PENDING", attempts=0, next_attempt_at=timezone.now())
+
+
+@admin.register(Campaign)
+class CampaignAdmin(admin.ModelAdmin):
+    list_display = ("id","name","status","sent_count","failed_count","started_at","finished_at")
+    list_filter = ("status",)
+    readonly_fields = ("status","last_donor_id","sent_count","failed_count","started_at","finished_at")
+
+
+@admin.register(CampaignDelivery)
+class CampaignDeliveryAdmin(admin.ModelAdmin):
+    list_display = ("campaign","email","status","error","sent_at")
+    list_filter = ("campaign","status")
+    search_fields = ("email",)
+    raw_id_fields = ("donor",)
+
+
+class RollupAdmin(admin.ModelAdmin):
+    """Read-only: rows are written by ``rollup_donations``."""
+    list_filter = ("source","mode","currency")
+    search_fields = ("purpose",)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(DailyDonationRollup)
+class DailyDonationRollupAdmin(RollupAdmin):
+    list_display = ("day","source","purpose","mode","currency","count","total_amount","refunded_amount")
+    date_hierarchy = "day"
+
+
+@admin.register(MonthlyDonationRollup)
+class MonthlyDonationRollupAdmin(RollupAdmin):
+    list_display = ("month","source","purpose","mode","currency","count","total_amount","refunded_amount")
+    date_hierarchy = "month"
+
+
+@admin.register(RollupWatermark)
+class RollupWatermarkAdmin(admin.ModelAdmin):
+    list_display = ("source","value","updated_at")
+
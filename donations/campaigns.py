@@ -0,0 +1,205 @@
+"""Bulk campaign mailings to the donor base.
+
+``send()`` streams donors with ``.iterator(chunk_size=...)`` in primary-key
+order and works through them in batches:
+
+* each message is rendered on the calling thread from templates compiled
+  once per run (HTML gets its CSS inlined like ``compile_email_templates``);
+* a few worker threads send them, each over its own pooled SMTP connection
+  (``payments.smtp``), sharing one token bucket so the whole run stays under
+  ``CAMPAIGN_RATE_PER_MINUTE``;
+* per-donor outcomes are written with one ``bulk_create`` per batch in the
+  same transaction that moves ``Campaign.last_donor_id`` past the batch.
+
+A run that crashes or is stopped resumes after the last finished batch; at
+most that one batch is sent again (``campaign_delivery_once`` keeps its
+outcome rows from doubling). A batch in which every send failed is not
+recorded at all: the run stops there, so the next one retries those donors
+instead of marking them failed and moving on.
+"""
+import smtplib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives
+from django.db import transaction
+from django.db.models import F
+from django.template import engines
+from django.utils import timezone
+
+from payments import email_inline, smtp
+from payments.reconcile import TokenBucket
+
+from .emails import FROM
+from .models import Campaign, CampaignDelivery, Donor
+
+# The server or the network went away: the message was not taken, resend it on a new connection
+_DROPPED = (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError)
+
+
+class CampaignStats:
+    def __init__(self):
+        self.sent = 0
+        self.failed = 0
+        self.started = time.monotonic()
+
+    @property
+    def rate(self) -> float:
+        elapsed = time.monotonic() - self.started
+        return (self.sent + self.failed) / elapsed * 60 if elapsed > 0 else 0.0
+
+    def summary(self) -> str:
+        return (f"Sent {self.sent}, failed {self.failed} in {time.monotonic() - self.started:.1f}s "
+                f"({self.rate:.0f}/min).")
+
+
+def recipients(campaign: Campaign):
+    """Donors still to mail, in checkpoint order."""
+    return (
+        Donor.objects.filter(pk__gt=campaign.last_donor_id, newsletter_opt_out=False)
+        .exclude(email__isnull=True).exclude(email="")
+        .order_by("pk")
+        .only("pk", "email", "name")
+    )
+
+
+class _Renderer:
+    def __init__(self, campaign: Campaign):
+        engine = engines["django"]
+        self.campaign = campaign
+        self.subject = engine.from_string(campaign.subject)
+        self.text = engine.from_string(campaign.text_body)
+        self.html = engine.from_string(email_inline.inline_css(campaign.html_body)) if campaign.html_body else None
+
+    def message(self, donor: Donor) -> EmailMultiAlternatives:
+        ctx = {"donor": donor, "campaign": self.campaign}
+        subject = " ".join(self.subject.render(ctx).split())
+        msg = EmailMultiAlternatives(subject, self.text.render(ctx), FROM, [donor.email])
+        if self.html is not None:
+            msg.attach_alternative(self.html.render(ctx), "text/html")
+        return msg
+
+
+class _Senders:
+    """Worker threads, each keeping one pooled SMTP connection until the server drops it."""
+
+    def __init__(self, connections: int, bucket: TokenBucket):
+        self.bucket = bucket
+        self.pool = ThreadPoolExecutor(max_workers=connections, thread_name_prefix="campaign")
+        self.local = threading.local()
+        self.opened = []
+        self.lock = threading.Lock()
+
+    def _connect(self):
+        conn = self.local.conn = smtp.acquire()
+        with self.lock:
+            self.opened.append(conn)
+        return conn
+
+    def _drop(self, conn) -> None:
+        # A dead socket must not go back to the pool for the next caller
+        self.local.conn = None
+        with self.lock:
+            self.opened.remove(conn)
+        conn.close()
+
+    def _send(self, msg) -> str:
+        self.bucket.acquire()
+        try:
+            conn = getattr(self.local, "conn", None) or self._connect()
+            try:
+                conn.send([msg])
+            except _DROPPED:
+                self._drop(conn)
+                self._connect().send([msg])
+        except Exception as e:
+            return f"{type(e).__name__}: {e}"[:255]
+        return ""
+
+    def send_all(self, messages) -> list[str]:
+        """Error text per message ("" if sent), in order."""
+        return list(self.pool.map(self._send, messages))
+
+    def close(self) -> None:
+        self.pool.shutdown(wait=True)
+        for conn in self.opened:
+            smtp.release(conn)
+
+
+def _record(campaign: Campaign, donors, errors, stats: CampaignStats) -> bool:
+    """Write the batch's outcomes and move the checkpoint past it; False (nothing written) if none got through."""
+    if all(errors):
+        return False
+    now = timezone.now()
+    rows = [
+        CampaignDelivery(campaign=campaign, donor=d, email=d.email, status="FAILED" if err else "SENT",
+                         error=err, sent_at=now)
+        for d, err in zip(donors, errors)
+    ]
+    failed = sum(1 for err in errors if err)
+    with transaction.atomic():
+        CampaignDelivery.objects.bulk_create(rows, ignore_conflicts=True)
+        Campaign.objects.filter(pk=campaign.pk).update(
+            last_donor_id=donors[-1].pk,
+            sent_count=F("sent_count") + len(rows) - failed,
+            failed_count=F("failed_count") + failed,
+        )
+    campaign.last_donor_id = donors[-1].pk
+    stats.sent += len(rows) - failed
+    stats.failed += failed
+    return True
+
+
+def send(campaign: Campaign, *, rate_per_minute: float | None = None, connections: int | None = None,
+         batch_size: int | None = None, limit: int | None = None, stop=None, log=None) -> CampaignStats:
+    """Mail ``campaign`` to the donors it has not reached yet; ``stop`` (an Event) ends it after a batch."""
+    rate_per_minute = rate_per_minute or getattr(settings, "CAMPAIGN_RATE_PER_MINUTE", 300)
+    connections = connections or getattr(settings, "CAMPAIGN_CONNECTIONS", 3)
+    batch_size = batch_size or getattr(settings, "CAMPAIGN_BATCH_SIZE", 200)
+    log = log or (lambda message, level="info": None)
+    stats = CampaignStats()
+
+    if campaign.status == "DONE":
+        return stats
+    renderer = _Renderer(campaign)
+    Campaign.objects.filter(pk=campaign.pk, started_at__isnull=True).update(started_at=timezone.now())
+    Campaign.objects.filter(pk=campaign.pk).update(status="SENDING")
+    campaign.status = "SENDING"
+
+    senders = _Senders(connections, TokenBucket(rate_per_minute / 60.0, burst=connections))
+
+    def run_batch(batch) -> bool:
+        errors = senders.send_all([renderer.message(d) for d in batch])
+        if _record(campaign, batch, errors, stats):
+            return True
+        log(f"{campaign.name}: every send in the batch after donor #{campaign.last_donor_id} failed "
+            f"({errors[-1]}); stopping so the next run retries them", "error")
+        return False
+
+    finished = True
+    try:
+        batch = []
+        for donor in recipients(campaign).iterator(chunk_size=batch_size):
+            batch.append(donor)
+            if len(batch) >= batch_size:
+                if not run_batch(batch):
+                    finished = False
+                    break
+                log(f"{campaign.name}: up to donor #{campaign.last_donor_id} - {stats.summary()}", "info")
+                batch = []
+                if (stop is not None and stop.is_set()) or (limit and stats.sent + stats.failed >= limit):
+                    finished = False
+                    break
+        else:
+            if batch and not run_batch(batch):
+                finished = False
+    finally:
+        senders.close()
+
+    if finished:
+        Campaign.objects.filter(pk=campaign.pk).update(status="DONE", finished_at=timezone.now())
+        campaign.status = "DONE"
+    log(f"{campaign.name}: {stats.summary()}", "success")
+    return stats
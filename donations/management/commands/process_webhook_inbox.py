@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from donations import inbox
+from payments import reconcile
+
+
+class Command(BaseCommand):
+    help = "Apply stored HDFC webhook events (retrying failures with backoff)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--max", type=int, default=1000, help="Max events to apply per pass")
+        parser.add_argument("--batch", type=int, default=None, help="Events claimed per batch (default: WEBHOOK_INBOX_BATCH)")
+        parser.add_argument("--loop", action="store_true", help="Keep running, draining every --interval seconds until SIGTERM")
+        parser.add_argument("--interval", type=float, default=2, help="Seconds between passes with --loop")
+
+    def handle(self, *args, **opts):
+        log = reconcile.command_log(self)
+
+        def drain():
+            stats = inbox.drain(batch=opts["batch"], limit=opts["max"], log=log)
+            if stats.done or stats.retried or stats.poisoned or not opts["loop"]:
+                log(stats.summary(), "success")
+
+        if opts["loop"]:
+            reconcile.run_loop(drain, name="process_webhook_inbox", interval=opts["interval"], log=log)
+        else:
+            drain()
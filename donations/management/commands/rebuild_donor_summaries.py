@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from donations import summary
+from payments import reconcile
+
+
+class Command(BaseCommand):
+    help = "Recompute donor lifetime summaries from successful donations, in chunks of donors"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--check", action="store_true", help="Only compare the stored summaries with Donation; exit 1 on any difference")
+        parser.add_argument("--chunk-size", type=int, default=500, help="Donors per transaction")
+        parser.add_argument("--show", type=int, default=50, help="With --check: differences to print")
+
+    def handle(self, *args, **opts):
+        if opts["check"]:
+            problems = summary.check(opts["chunk_size"])
+            for line in problems[:opts["show"]]:
+                self.stdout.write(self.style.WARNING(line))
+            if problems:
+                raise CommandError(f"{len(problems)} donor summary differences; run rebuild_donor_summaries")
+            self.stdout.write(self.style.SUCCESS("Donor summaries match the donations."))
+            return
+        written = summary.rebuild(opts["chunk_size"], log=reconcile.command_log(self))
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt summaries for {written} donors."))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from donations import rollups
+from payments import reconcile
+
+
+class Command(BaseCommand):
+    help = "Update daily/monthly donation rollups from rows paid since the last run (safe to re-run)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--source", choices=sorted(rollups.SOURCES), action="append",
+                            help="Only this source (repeatable; default: all)")
+        parser.add_argument("--full", action="store_true", help="Ignore the watermarks and recompute every day")
+
+    def handle(self, *args, **opts):
+        done = rollups.run(opts["source"], full=opts["full"], log=reconcile.command_log(self))
+        self.stdout.write(self.style.SUCCESS(
+            "Rollups up to date: " + ", ".join(f"{name} {days} days" for name, days in done.items())))
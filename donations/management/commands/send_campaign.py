@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from donations import campaigns
+from donations.models import Campaign
+from payments import reconcile
+
+
+class Command(BaseCommand):
+    help = "Send a campaign email to all donors, throttled; re-run to resume after a crash or --limit"
+
+    def add_arguments(self, parser):
+        parser.add_argument("campaign_id", type=int)
+        parser.add_argument("--rate", type=float, default=None, help="Messages per minute (default: CAMPAIGN_RATE_PER_MINUTE)")
+        parser.add_argument("--connections", type=int, default=None, help="Parallel SMTP connections (default: CAMPAIGN_CONNECTIONS)")
+        parser.add_argument("--batch-size", type=int, default=None, help="Donors per checkpoint (default: CAMPAIGN_BATCH_SIZE)")
+        parser.add_argument("--limit", type=int, default=None, help="Stop after about this many messages")
+        parser.add_argument("--dry-run", action="store_true", help="Only count the donors still to mail")
+
+    def handle(self, *args, **opts):
+        try:
+            campaign = Campaign.objects.get(pk=opts["campaign_id"])
+        except Campaign.DoesNotExist:
+            raise CommandError(f"No campaign #{opts['campaign_id']}")
+        if opts["dry_run"]:
+            self.stdout.write(f"{campaign.name}: {campaigns.recipients(campaign).count()} donors to mail.")
+            return
+        if campaign.status == "DONE":
+            self.stdout.write(f"{campaign.name} was already sent to everyone.")
+            return
+        campaigns.send(
+            campaign, rate_per_minute=opts["rate"], connections=opts["connections"],
+            batch_size=opts["batch_size"], limit=opts["limit"], log=reconcile.command_log(self),
+        )
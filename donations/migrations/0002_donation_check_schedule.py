@@ -0,0 +1,33 @@
+# Generated by Django 5.2.4 on 2026-10-17 23:29
+
+import payments.utils
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('donations', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='donation',
+            name='check_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='donation',
+            name='next_check_at',
+            field=models.DateTimeField(blank=True, default=payments.utils.first_check_at, null=True),
+        ),
+        migrations.AlterField(
+            model_name='donation',
+            name='status',
+            field=models.CharField(choices=[('PENDING', 'PENDING'), ('SUCCESS', 'SUCCESS'), ('FAILED', 'FAILED'), ('EXPIRED', 'EXPIRED')], db_index=True, default='PENDING', max_length=16),
+        ),
+        migrations.AddIndex(
+            model_name='donation',
+            index=models.Index(fields=['status', 'next_check_at'], name='donation_due_check_idx'),
+        ),
+    ]
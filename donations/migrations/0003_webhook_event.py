@@ -0,0 +1,33 @@
+# Generated by Django 5.2.4 on 2026-10-17 23:33
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('donations', '0002_donation_check_schedule'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WebhookEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dedupe_hash', models.CharField(max_length=64, unique=True)),
+                ('payload', models.JSONField(default=dict)),
+                ('base_url', models.CharField(blank=True, default='', max_length=200)),
+                ('status', models.CharField(choices=[('PENDING', 'PENDING'), ('DONE', 'DONE'), ('POISON', 'POISON')], default='PENDING', max_length=16)),
+                ('outcome', models.CharField(blank=True, default='', max_length=32)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True, default='')),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='webhook_due_idx')],
+            },
+        ),
+    ]
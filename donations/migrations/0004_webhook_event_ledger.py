@@ -0,0 +1,76 @@
+# Generated by Django 5.2.4 on 2026-10-17 23:34
+
+import hashlib
+import json
+
+from django.db import migrations, models
+
+
+def _status(payload):
+    for part in (payload, *(payload.get(k) for k in ("order", "payment", "transaction", "result"))):
+        if isinstance(part, dict) and part.get("status"):
+            return str(part["status"]).upper()
+    return ""
+
+
+def backfill_keys(apps, schema_editor):
+    """Key events stored before the ledger the way ``donations.inbox.event_key`` does."""
+    WebhookEvent = apps.get_model("donations", "WebhookEvent")
+    seen = set()
+    for event in WebhookEvent.objects.order_by("pk").iterator(chunk_size=500):
+        payload = event.payload if isinstance(event.payload, dict) else {}
+        order, txn = payload.get("order") or {}, payload.get("transaction") or {}
+        kind = str(payload.get("event") or payload.get("event_type") or "").upper()
+        key = (
+            str((isinstance(order, dict) and order.get("id")) or payload.get("order_id") or "")[:64],
+            str((isinstance(txn, dict) and txn.get("id")) or payload.get("txn_id") or "")[:64],
+            "/".join(filter(None, [_status(payload), kind]))[:64],
+        )
+        if not any(key):
+            body = json.dumps(event.payload, sort_keys=True, separators=(",", ":"), default=str)
+            key = ("", "", "sha256:" + hashlib.sha256(body.encode()).hexdigest()[:56])
+        if key in seen:
+            # Already-stored redeliveries of one event stay as separate rows
+            key = (*key[:2], f"{key[2][:50]}#{event.pk}")
+        seen.add(key)
+        event.gw_order_id, event.gw_txn_id, event.event = key
+        event.save(update_fields=["gw_order_id", "gw_txn_id", "event"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('donations', '0003_webhook_event'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='webhookevent',
+            name='dedupe_hash',
+        ),
+        migrations.AddField(
+            model_name='webhookevent',
+            name='deliveries',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='webhookevent',
+            name='event',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='webhookevent',
+            name='gw_order_id',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='webhookevent',
+            name='gw_txn_id',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.RunPython(backfill_keys, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='webhookevent',
+            constraint=models.UniqueConstraint(fields=('gw_order_id', 'gw_txn_id', 'event'), name='webhook_event_key'),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.4 on 2026-10-17 23:53
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('donations', '0004_webhook_event_ledger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Campaign',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=128)),
+                ('subject', models.CharField(max_length=255)),
+                ('text_body', models.TextField()),
+                ('html_body', models.TextField(blank=True, default='')),
+                ('status', models.CharField(choices=[('DRAFT', 'DRAFT'), ('SENDING', 'SENDING'), ('DONE', 'DONE')], default='DRAFT', max_length=16)),
+                ('last_donor_id', models.PositiveBigIntegerField(default=0)),
+                ('sent_count', models.PositiveIntegerField(default=0)),
+                ('failed_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='donor',
+            name='newsletter_opt_out',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name='CampaignDelivery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('email', models.EmailField(max_length=254)),
+                ('status', models.CharField(choices=[('SENT', 'SENT'), ('FAILED', 'FAILED')], max_length=8)),
+                ('error', models.CharField(blank=True, default='', max_length=255)),
+                ('sent_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('campaign', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='deliveries', to='donations.campaign')),
+                ('donor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='campaign_deliveries', to='donations.donor')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('campaign', 'donor'), name='campaign_delivery_once')],
+            },
+        ),
+    ]
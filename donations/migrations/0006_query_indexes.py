@@ -0,0 +1,27 @@
+# Generated by Django 5.2.4 on 2026-10-17 23:55
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('donations', '0005_campaigns'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='donor',
+            name='phone_e164',
+            field=models.CharField(blank=True, db_index=True, max_length=16, null=True, validators=[django.core.validators.RegexValidator('^\\+\\d{6,15}$')]),
+        ),
+        migrations.AddIndex(
+            model_name='donation',
+            index=models.Index(fields=['status', 'created_at'], name='donation_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='donation',
+            index=models.Index(fields=['donor', 'created_at'], name='donation_donor_created_idx'),
+        ),
+    ]
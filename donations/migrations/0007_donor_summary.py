@@ -0,0 +1,39 @@
+# Generated by Django 5.2.4 on 2026-10-17 23:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('donations', '0006_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DonorSummary',
+            fields=[
+                ('donor', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to='donations.donor')),
+                ('total_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('donation_count', models.PositiveIntegerField(default=0)),
+                ('first_donation_at', models.DateTimeField()),
+                ('last_donation_at', models.DateTimeField()),
+                ('last_amount', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DonorPurposeSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('purpose', models.CharField(max_length=64)),
+                ('total_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('donation_count', models.PositiveIntegerField(default=0)),
+                ('donor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='purpose_summaries', to='donations.donor')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('donor', 'purpose'), name='donor_purpose_summary_key')],
+            },
+        ),
+    ]
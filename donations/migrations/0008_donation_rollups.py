@@ -0,0 +1,64 @@
+# Generated by Django 5.2.4 on 2026-10-18 00:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('donations', '0007_donor_summary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyDonationRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(choices=[('donation', 'Donation'), ('order', 'Order')], max_length=8)),
+                ('purpose', models.CharField(max_length=128)),
+                ('mode', models.CharField(blank=True, default='', max_length=64)),
+                ('currency', models.CharField(default='INR', max_length=8)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('total_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('refunded_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('day', models.DateField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='MonthlyDonationRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(choices=[('donation', 'Donation'), ('order', 'Order')], max_length=8)),
+                ('purpose', models.CharField(max_length=128)),
+                ('mode', models.CharField(blank=True, default='', max_length=64)),
+                ('currency', models.CharField(default='INR', max_length=8)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('total_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('refunded_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('month', models.DateField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=8, unique=True)),
+                ('value', models.DateTimeField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='donation',
+            index=models.Index(fields=['paid_at'], name='donation_paid_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailydonationrollup',
+            constraint=models.UniqueConstraint(fields=('day', 'source', 'purpose', 'mode', 'currency'), name='daily_rollup_key'),
+        ),
+        migrations.AddConstraint(
+            model_name='monthlydonationrollup',
+            constraint=models.UniqueConstraint(fields=('month', 'source', 'purpose', 'mode', 'currency'), name='monthly_rollup_key'),
+        ),
+    ]
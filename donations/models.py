@@ -2,11 +2,13 @@ from django.db import models
 from django.core.validators import RegexValidator
 from django.utils import timezone
 
+from payments.utils import first_check_at
+
 class Donor(models.Model):
     email = models.EmailField(null=True, blank=True)
     email_norm = models.EmailField(null=True, blank=True, unique=True)
     phone_e164 = models.CharField(
-        max_length=16, null=True, blank=True, unique=False,
+        max_length=16, null=True, blank=True, unique=False, db_index=True,
         validators=[RegexValidator(r'^\+\d{6,15}$')]
     )
     name = models.CharField(max_length=128, blank=True, default="")
@@ -18,6 +20,7 @@ class Donor(models.Model):
     postal_code = models.CharField(max_length=16, blank=True, default="")
     country = models.CharField(max_length=2, blank=True, default="IN")
     is_claimed = models.BooleanField(default=False)
+    newsletter_opt_out = models.BooleanField(default=False)  # skipped by campaign mailings
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
@@ -28,6 +31,7 @@ class Donation(models.Model):
         ("PENDING","PENDING"),
         ("SUCCESS","SUCCESS"),
         ("FAILED","FAILED"),
+        ("EXPIRED","EXPIRED"),
     ]
     donor = models.ForeignKey(Donor, on_delete=models.PROTECT, related_name="donations")
     amount = models.DecimalField(max_digits=10, decimal_places=2)
@@ -40,6 +44,20 @@ class Donation(models.Model):
     issued_receipt_no = models.CharField(max_length=32, blank=True, default="", db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
     paid_at = models.DateTimeField(null=True, blank=True)
+    # Reconciler schedule (NULL = stop polling)
+    next_check_at = models.DateTimeField(null=True, blank=True, default=first_check_at)
+    check_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "next_check_at"], name="donation_due_check_idx"),
+            # Expiry sweep: PENDING donations older than a cutoff
+            models.Index(fields=["status", "created_at"], name="donation_status_created_idx"),
+            # donor_dashboard: a donor's donations, newest first
+            models.Index(fields=["donor", "created_at"], name="donation_donor_created_idx"),
+            # rollup_donations: donations paid since the watermark, in any status
+            models.Index(fields=["paid_at"], name="donation_paid_idx"),
+        ]
 
     def __str__(self):
         return f"{self.txn_id} {self.status} ₹{self.amount}"
@@ -68,3 +86,168 @@ class OtpCode(models.Model):
     consumed = models.BooleanField(default=False)
     attempts = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
+
+class WebhookEvent(models.Model):
+    """Gateway webhook ledger: one row per (order id, txn id, status/event), applied by ``process_webhook_inbox``."""
+    STATUS_CHOICES = [
+        ("PENDING","PENDING"),
+        ("DONE","DONE"),
+        ("POISON","POISON"),  # gave up after WEBHOOK_MAX_ATTEMPTS; a redelivery or the admin requeues it
+    ]
+    gw_order_id = models.CharField(max_length=64, blank=True, default="")
+    gw_txn_id = models.CharField(max_length=64, blank=True, default="")
+    event = models.CharField(max_length=64, blank=True, default="")  # normalized "STATUS/EVENT"
+    deliveries = models.PositiveIntegerField(default=1)  # >1 means HDFC redelivered it
+    payload = models.JSONField(default=dict)
+    base_url = models.CharField(max_length=200, blank=True, default="")  # for absolute links in emails
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default="PENDING")
+    outcome = models.CharField(max_length=32, blank=True, default="")
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True, default="")
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["gw_order_id", "gw_txn_id", "event"], name="webhook_event_key"),
+        ]
+        indexes = [
+            models.Index(fields=["status", "next_attempt_at"], name="webhook_due_idx"),
+        ]
+
+    def __str__(self):
+        return f"Webhook#{self.pk} {self.status} {self.outcome}".rstrip()
+
+
+class Campaign(models.Model):
+    """A mailing to every donor with an email, sent by ``send_campaign``.
+
+    ``subject``, ``text_body`` and ``html_body`` are Django templates rendered
+    per donor with ``donor`` and ``campaign`` in the context.
+    """
+    STATUS_CHOICES = [
+        ("DRAFT","DRAFT"),
+        ("SENDING","SENDING"),  # started; re-running resumes after last_donor_id
+        ("DONE","DONE"),
+    ]
+    name = models.CharField(max_length=128)
+    subject = models.CharField(max_length=255)
+    text_body = models.TextField()
+    html_body = models.TextField(blank=True, default="")
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default="DRAFT")
+    last_donor_id = models.PositiveBigIntegerField(default=0)  # checkpoint: donors up to here are done
+    sent_count = models.PositiveIntegerField(default=0)
+    failed_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.status})"
+
+
+class CampaignDelivery(models.Model):
+    """Outcome of one campaign email to one donor."""
+    campaign = models.ForeignKey(Campaign, on_delete=models.CASCADE, related_name="deliveries")
+    donor = models.ForeignKey(Donor, on_delete=models.CASCADE, related_name="campaign_deliveries")
+    email = models.EmailField()
+    status = models.CharField(max_length=8, choices=[("SENT","SENT"), ("FAILED","FAILED")])
+    error = models.CharField(max_length=255, blank=True, default="")
+    sent_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["campaign", "donor"], name="campaign_delivery_once"),
+        ]
+
+    def __str__(self):
+        return f"{self.campaign_id} -> {self.email}: {self.status}"
+
+
+class DonorSummary(models.Model):
+    """Lifetime giving of one donor, kept current by ``mark_paid_and_receipt`` (see ``donations.summary``).
+
+    Only successful donations count. ``rebuild_donor_summaries`` recomputes
+    the table from ``Donation`` and ``--check`` reports drift.
+    """
+    donor = models.OneToOneField(Donor, on_delete=models.CASCADE, primary_key=True, related_name="summary")
+    total_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    donation_count = models.PositiveIntegerField(default=0)
+    first_donation_at = models.DateTimeField()
+    last_donation_at = models.DateTimeField()
+    last_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Donor#{self.donor_id}: ₹{self.total_amount} in {self.donation_count}"
+
+
+class DonorPurposeSummary(models.Model):
+    """Per-purpose part of ``DonorSummary``."""
+    donor = models.ForeignKey(Donor, on_delete=models.CASCADE, related_name="purpose_summaries")
+    purpose = models.CharField(max_length=64)
+    total_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    donation_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["donor", "purpose"], name="donor_purpose_summary_key"),
+        ]
+
+    def __str__(self):
+        return f"Donor#{self.donor_id} {self.purpose}: ₹{self.total_amount}"
+
+
+class DonationRollup(models.Model):
+    """Paid totals for one (purpose, payment mode, currency) group; see ``rollup_donations``."""
+    SOURCE_CHOICES = [
+        ("donation","Donation"),  # donations app: Donation.mode
+        ("order","Order"),  # payments app: Order.payment_method_type
+    ]
+    source = models.CharField(max_length=8, choices=SOURCE_CHOICES)
+    purpose = models.CharField(max_length=128)
+    mode = models.CharField(max_length=64, blank=True, default="")
+    currency = models.CharField(max_length=8, default="INR")
+    count = models.PositiveIntegerField(default=0)
+    total_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    refunded_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        abstract = True
+
+
+class DailyDonationRollup(DonationRollup):
+    day = models.DateField()  # local (TIME_ZONE) date paid
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["day", "source", "purpose", "mode", "currency"], name="daily_rollup_key"),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.source} {self.purpose} {self.mode or '-'}: {self.total_amount}"
+
+
+class MonthlyDonationRollup(DonationRollup):
+    month = models.DateField()  # first day of the month
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["month", "source", "purpose", "mode", "currency"],
+                                    name="monthly_rollup_key"),
+        ]
+
+    def __str__(self):
+        return f"{self.month:%Y-%m} {self.source} {self.purpose} {self.mode or '-'}: {self.total_amount}"
+
+
+class RollupWatermark(models.Model):
+    """How far ``rollup_donations`` has read each source (by paid/updated time)."""
+    source = models.CharField(max_length=8, unique=True)
+    value = models.DateTimeField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.source} @ {self.value}"
@@ -0,0 +1,121 @@
+"""Reconciliation source for PENDING donations (see ``payments.reconcile``)."""
+from django.db import transaction
+from django.utils import timezone
+
+from payments.integrations.hdfc import SUCCESS_STATUSES, extract_status
+from payments import live, references
+from payments.reconcile import expiry_grace, max_age, schedule_next_check
+
+from .emails import send_receipt_email
+from .models import Donation
+from .services import mark_paid_and_receipt, issue_magic_link
+from .utils import gateway_customer_id
+
+
+class DonationSource:
+    """Due PENDING donations, optionally only those created in the last ``minutes``."""
+
+    order_field = "next_check_at"
+
+    def __init__(self, minutes: int = 0):
+        self.minutes = minutes
+
+    def candidates(self):
+        now = timezone.now()
+        qs = (
+            Donation.objects.filter(status="PENDING", next_check_at__lte=now)
+            .select_related("donor")
+            .only("txn_id", "order_id", "amount", "purpose", "status", "mode", "paid_at", "issued_receipt_no",
+                  "gateway_meta", "created_at", "next_check_at", "check_count",
+                  "donor", "donor__name", "donor__email", "donor__phone_e164")
+        )
+        if self.minutes > 0:
+            qs = qs.filter(created_at__gte=now - timezone.timedelta(minutes=self.minutes))
+        return qs
+
+    def expires_at(self, d):
+        return d.created_at + max_age()
+
+    def overdue(self, now):
+        return Donation.objects.filter(status="PENDING", created_at__lt=now - max_age() - expiry_grace())
+
+    def expire_overdue(self, now) -> int:
+        """Make overdue donations due for one last status check instead of expiring them unseen.
+
+        ``apply()`` then expires those the gateway still reports as pending
+        and settles any that were paid after all.
+        """
+        self.overdue(now).exclude(next_check_at__lte=now).update(next_check_at=now)
+        return 0
+
+    def identity(self, d):
+        # We used our txn_id as the HDFC order_id
+        return d.txn_id, gateway_customer_id(d.donor)
+
+    def label(self, d):
+        return d.txn_id
+
+    def apply(self, results, log) -> tuple[int, int]:
+        now = timezone.now()
+        paid, failed, waiting = [], [], []
+        expired = 0
+        for d, data in results:
+            d.check_count += 1
+            status = extract_status(data)
+            if status in SUCCESS_STATUSES:
+                d.next_check_at = None
+                paid.append((d, data))
+            elif status == "FAILED":
+                d.status = "FAILED"
+                d.gateway_meta = data
+                d.next_check_at = None
+                failed.append(d)
+            else:
+                if now >= self.expires_at(d):
+                    d.status, d.next_check_at = "EXPIRED", None
+                    expired += 1
+                else:
+                    d.next_check_at = schedule_next_check(d.check_count, now, self.expires_at(d))
+                waiting.append(d)
+                log(f"Donation {d.txn_id}: status={status or 'UNKNOWN'}", "info")
+
+        with transaction.atomic():
+            # Only touch rows still PENDING; the webhook may have settled them meanwhile
+            still_pending = set(
+                Donation.objects.select_for_update()
+                .filter(pk__in=[d.pk for d in failed + waiting], status="PENDING")
+                .values_list("pk", flat=True)
+            )
+            failed = [d for d in failed if d.pk in still_pending]
+            waiting = [d for d in waiting if d.pk in still_pending]
+            Donation.objects.bulk_update(failed, ["status", "gateway_meta", "next_check_at", "check_count"])
+            Donation.objects.bulk_update(waiting, ["status", "next_check_at", "check_count"])
+        for d in failed:
+            log(f"Donation {d.txn_id} -> FAILED", "warning")
+        live.publish(*[d.txn_id for d in failed + waiting if d.status != "PENDING"])
+        # Remember the gateway's own ids so later callbacks resolve in one lookup
+        references.index(((d.txn_id, d.order_id, data.get("id"), data.get("txn_id")), None, d) for d, data in results)
+
+        # Paid rows go through mark_paid_and_receipt one by one: it issues the receipt
+        for d, data in paid:
+            mode = data.get("payment_method") or data.get("payment_method_type") or ""
+            with transaction.atomic():
+                mark_paid_and_receipt(d, mode, data)
+                # queue receipt + magic link once, committed together with the SUCCESS status
+                meta = d.gateway_meta or {}
+                if not bool(meta.get("receipt_email_sent")):
+                    try:
+                        with transaction.atomic():
+                            mlt = issue_magic_link(d.donor)
+                            from django.urls import reverse
+                            from django.contrib.sites.models import Site
+                            domain = Site.objects.get_current().domain
+                            link = f"https://{domain}" + reverse("donations:magic_claim", kwargs={"token": mlt.token})
+                            send_receipt_email(d, magic_link_url=link)
+                            meta["receipt_email_sent"] = True
+                            d.gateway_meta = meta
+                            d.save(update_fields=["gateway_meta"])
+                    except Exception:
+                        pass
+            log(f"Donation {d.txn_id} -> SUCCESS", "success")
+        return len(paid) + len(failed), expired
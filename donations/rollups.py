@@ -0,0 +1,177 @@
+"""Daily and monthly paid totals for finance (``DailyDonationRollup``/``MonthlyDonationRollup``).
+
+GROUP BY over the whole ``Donation`` and ``Order`` tables is too slow to run
+from the admin, so ``rollup_donations`` (cron) keeps pre-aggregated rows per
+(day or month, source, purpose, payment mode, currency):
+
+* each source has a watermark; a run looks only at rows paid (donations) or
+  updated (orders) after it, whatever their status is now, minus
+  ``ROLLUP_OVERLAP_MINUTES`` for rows that committed late, and collects the
+  days they fall on (a payment that stopped counting as paid must still
+  recompute its day);
+* each of those days is recomputed from scratch with one range-bounded
+  GROUP BY and upserted, and groups that no longer exist are deleted; the
+  affected months are then re-summed from the daily rows;
+* the watermark moves only after that, so a crashed or repeated run just
+  recomputes the same days to the same numbers.
+
+``totals()`` reads the rollups for reports and the staff JSON view.
+"""
+from datetime import date, datetime, time, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Sum, Value
+from django.db.models.functions import Left, TruncDate
+from django.utils import timezone
+
+from payments.digest import order_purpose
+from payments.integrations.hdfc import SUCCESS_STATUSES
+from payments.models import Order
+
+from .models import DailyDonationRollup, Donation, MonthlyDonationRollup, RollupWatermark
+
+GROUP_FIELDS = ("source", "purpose", "mode", "currency")
+DAYS_PER_TRANSACTION = 31
+
+
+class DonationRollupSource:
+    """Successful ``Donation`` rows, by local date paid and ``Donation.mode``."""
+
+    name = "donation"
+
+    def changed_days(self, since, until):
+        qs = Donation.objects.filter(paid_at__isnull=False, paid_at__lte=until)
+        if since is not None:
+            qs = qs.filter(paid_at__gt=since)
+        return qs.annotate(day=TruncDate("paid_at")).values_list("day", flat=True).order_by().distinct()
+
+    def groups(self, start, end):
+        return (
+            Donation.objects.filter(status="SUCCESS", paid_at__gte=start, paid_at__lt=end)
+            .values(day=TruncDate("paid_at"), group_purpose=F("purpose"), group_mode=F("mode"),
+                    group_currency=Value("INR"))
+            .annotate(count=Count("pk"), total=Sum("amount"), refunded=Value(0))
+            .order_by()
+        )
+
+
+class OrderRollupSource:
+    """Paid ``payments.Order`` rows, by local date created and ``Order.payment_method_type``.
+
+    Orders have no paid timestamp; any later update (e.g. a refund, or a
+    paid order turning FAILED) moves ``updated_at`` past the watermark, so the
+    order's day is recomputed.
+    """
+
+    name = "order"
+
+    def changed_days(self, since, until):
+        qs = Order.objects.filter(updated_at__lte=until)
+        if since is not None:
+            qs = qs.filter(updated_at__gt=since)
+        return qs.annotate(day=TruncDate("created_at")).values_list("day", flat=True).order_by().distinct()
+
+    def groups(self, start, end):
+        return (
+            Order.objects.filter(status__in=SUCCESS_STATUSES, created_at__gte=start, created_at__lt=end)
+            .values(day=TruncDate("created_at"), group_purpose=Left(order_purpose(), 128),
+                    group_mode=F("payment_method_type"), group_currency=F("currency"))
+            .annotate(count=Count("pk"), total=Sum("amount"), refunded=Sum("amount_refunded"))
+            .order_by()
+        )
+
+
+SOURCES = {s.name: s for s in (DonationRollupSource(), OrderRollupSource())}
+
+
+def _start_of(day: date):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _replace(model, period_field: str, source: str, periods, rows) -> None:
+    """Make ``model``'s rows for ``source`` and ``periods`` exactly ``rows`` (upsert, then drop the rest)."""
+    keep = {tuple(getattr(r, f) for f in (period_field, *GROUP_FIELDS)) for r in rows}
+    stale = [
+        pk for pk, *key in model.objects.filter(**{f"{period_field}__in": periods, "source": source})
+        .values_list("pk", period_field, *GROUP_FIELDS)
+        if tuple(key) not in keep
+    ]
+    if stale:
+        model.objects.filter(pk__in=stale).delete()
+    model.objects.bulk_create(
+        rows, update_conflicts=True, unique_fields=[period_field, *GROUP_FIELDS],
+        update_fields=["count", "total_amount", "refunded_amount", "updated_at"],
+    )
+
+
+def refresh_days(source, days: list[date]) -> int:
+    """Recompute the daily rollups of ``source`` for ``days`` (sorted); returns the number of rows."""
+    wanted = set(days)
+    rows = [
+        DailyDonationRollup(day=g["day"], source=source.name, purpose=g["group_purpose"] or "",
+                            mode=g["group_mode"] or "", currency=g["group_currency"] or "INR",
+                            count=g["count"], total_amount=g["total"], refunded_amount=g["refunded"] or 0)
+        for g in source.groups(_start_of(days[0]), _start_of(days[-1] + timedelta(days=1)))
+        if g["day"] in wanted
+    ]
+    _replace(DailyDonationRollup, "day", source.name, days, rows)
+    return len(rows)
+
+
+def refresh_month(source_name: str, month: date) -> int:
+    """Re-sum one month of ``source_name`` from its daily rollups."""
+    month = month.replace(day=1)
+    next_month = (month + timedelta(days=32)).replace(day=1)
+    rows = [
+        MonthlyDonationRollup(month=month, source=source_name, **g)
+        for g in DailyDonationRollup.objects.filter(source=source_name, day__gte=month, day__lt=next_month)
+        .values("purpose", "mode", "currency")
+        .annotate(count=Sum("count"), total_amount=Sum("total_amount"), refunded_amount=Sum("refunded_amount"))
+        .order_by()
+    ]
+    _replace(MonthlyDonationRollup, "month", source_name, [month], rows)
+    return len(rows)
+
+
+def run(sources=None, *, full: bool = False, now=None, log=None) -> dict:
+    """Bring the rollups up to date; returns ``{source: days recomputed}``."""
+    log = log or (lambda message, level="info": None)
+    now = now or timezone.now()
+    overlap = timedelta(minutes=getattr(settings, "ROLLUP_OVERLAP_MINUTES", 10))
+    done = {}
+    for name in sources or SOURCES:
+        source = SOURCES[name]
+        mark = None if full else RollupWatermark.objects.filter(source=name).first()
+        since = mark.value - overlap if mark else None
+        days = sorted(source.changed_days(since, now))
+        for i in range(0, len(days), DAYS_PER_TRANSACTION):
+            chunk = days[i:i + DAYS_PER_TRANSACTION]
+            with transaction.atomic():
+                rows = refresh_days(source, chunk)
+            log(f"{name}: {chunk[0]}..{chunk[-1]} -> {rows} daily rows", "info")
+        for month in sorted({d.replace(day=1) for d in days}):
+            with transaction.atomic():
+                refresh_month(name, month)
+        RollupWatermark.objects.update_or_create(source=name, defaults={"value": now})
+        done[name] = len(days)
+        log(f"{name}: recomputed {len(days)} days", "success")
+    return done
+
+
+def totals(start: date, end: date, *, period: str = "day", source: str | None = None,
+           group_by=("purpose", "mode")) -> list[dict]:
+    """Rolled-up totals between ``start`` and ``end`` (inclusive), one dict per period and group."""
+    if period == "month":
+        model, field, start = MonthlyDonationRollup, "month", start.replace(day=1)
+    else:
+        model, field = DailyDonationRollup, "day"
+    qs = model.objects.filter(**{f"{field}__gte": start, f"{field}__lte": end})
+    if source:
+        qs = qs.filter(source=source)
+    group = [field, *[g for g in GROUP_FIELDS if g in group_by]]
+    return list(
+        qs.values(*group)
+        .annotate(count=Sum("count"), total_amount=Sum("total_amount"), refunded_amount=Sum("refunded_amount"))
+        .order_by(*group)
+    )
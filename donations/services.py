@@ -1,6 +1,13 @@
+from decimal import Decimal
+
 from django.db import transaction
+from django.db.models import Case, Count, F, IntegerField, Sum, When
+from django.db.models.functions import Coalesce, ExtractMonth, ExtractYear
+from django.db.models.lookups import GreaterThanOrEqual
 from django.utils import timezone
 from .models import Donor, Donation, Receipt, MagicLinkToken, OtpCode
+from payments import live
+from . import summary
 from .utils import normalize_email, gen_receipt_number, token_32, gen_otp, expiry
 
 def normalize_phone(phone: str | None) -> str | None:
@@ -64,6 +71,12 @@ def issue_email_otp(donor: Donor, minutes=10) -> OtpCode:
 def mark_paid_and_receipt(donation: Donation, mode: str, gateway_meta: dict) -> Receipt:
     if donation.status == "SUCCESS":
         return donation.receipt  # idempotent
+    # Flip the row first: of two callers holding a stale PENDING copy, only one counts the payment
+    first_success = Donation.objects.filter(pk=donation.pk).exclude(status="SUCCESS").update(status="SUCCESS") == 1
+    if not first_success:
+        donation.refresh_from_db()
+        if hasattr(donation, "receipt"):
+            return donation.receipt
     donation.status = "SUCCESS"
     donation.mode = mode
     donation.paid_at = timezone.now()
@@ -71,8 +84,48 @@ def mark_paid_and_receipt(donation: Donation, mode: str, gateway_meta: dict) ->
     if not donation.issued_receipt_no:
         donation.issued_receipt_no = gen_receipt_number()
     donation.save()
+    if first_success:
+        summary.record_payment(donation)
+
+    live.publish(donation.txn_id)
 
     if not hasattr(donation, "receipt"):
         r = Receipt.objects.create(donation=donation, number=donation.issued_receipt_no)
         return r
     return donation.receipt
+
+
+def financial_year_start():
+    """Calendar year in which a donation's Indian financial year (April-March) began, by paid date."""
+    paid = Coalesce(F("paid_at"), F("created_at"))
+    return Case(
+        When(GreaterThanOrEqual(ExtractMonth(paid), 4), then=ExtractYear(paid)),
+        default=ExtractYear(paid) - 1,
+        output_field=IntegerField(),
+    )
+
+
+def giving_totals(donor: Donor) -> dict:
+    """Successful donations of ``donor`` totalled per financial year and per purpose, from one GROUP BY query."""
+    rows = (
+        Donation.objects.filter(donor=donor, status="SUCCESS")
+        .annotate(fy=financial_year_start())
+        .values("fy", "purpose")
+        .annotate(total=Sum("amount"), count=Count("pk"))
+        .order_by()
+    )
+    years, purposes = {}, {}
+    grand = {"total": Decimal("0"), "count": 0}
+    for row in rows:
+        for bucket in (years.setdefault(row["fy"], {"total": Decimal("0"), "count": 0}),
+                       purposes.setdefault(row["purpose"], {"total": Decimal("0"), "count": 0}),
+                       grand):
+            bucket["total"] += row["total"]
+            bucket["count"] += row["count"]
+    return {
+        "years": [{"label": f"FY {fy}-{(fy + 1) % 100:02d}", **v} for fy, v in sorted(years.items(), reverse=True)],
+        "purposes": [{"purpose": p, **v} for p, v in sorted(purposes.items(), key=lambda kv: -kv[1]["total"])],
+        "total": grand["total"],
+        "count": grand["count"],
+    }
+
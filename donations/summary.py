@@ -0,0 +1,148 @@
+"""Donor lifetime summaries (``DonorSummary``/``DonorPurposeSummary``).
+
+``record_payment()`` runs inside ``mark_paid_and_receipt``'s transaction once
+per donation that turns SUCCESS and bumps the donor's rows with ``F()``
+expressions, so concurrent payments for one donor never lose an update and
+reading a donor's totals is a primary-key lookup instead of an aggregate
+over ``Donation``.
+
+``rebuild()`` recomputes the tables from ``Donation`` one chunk of donors at
+a time (one transaction per chunk) and ``check()`` lists where the stored
+rows and ``Donation`` disagree; both back ``rebuild_donor_summaries``.
+"""
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import (Case, Count, DateTimeField, DecimalField, F, Max, Min, OuterRef, Subquery, Sum,
+                              Value, When)
+from django.db.models.functions import Coalesce, Greatest, Least
+
+from .models import Donation, Donor, DonorPurposeSummary, DonorSummary
+
+
+def _upsert(model, key: dict, create: dict, update: dict) -> None:
+    if model.objects.filter(**key).update(**update):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**key, **create)
+    except IntegrityError:
+        # Another payment for this donor created the row first
+        model.objects.filter(**key).update(**update)
+
+
+def record_payment(donation: Donation) -> None:
+    """Add one newly successful donation to its donor's summary rows."""
+    paid = donation.paid_at or donation.created_at
+    amount = Decimal(donation.amount)
+    paid_value = Value(paid, output_field=DateTimeField())
+    _upsert(
+        DonorSummary, {"donor_id": donation.donor_id},
+        create={"total_amount": amount, "donation_count": 1, "first_donation_at": paid,
+                "last_donation_at": paid, "last_amount": amount},
+        update={
+            "total_amount": F("total_amount") + amount,
+            "donation_count": F("donation_count") + 1,
+            "first_donation_at": Least(F("first_donation_at"), paid_value),
+            "last_donation_at": Greatest(F("last_donation_at"), paid_value),
+            # Every right-hand side reads the row as it was before this UPDATE
+            "last_amount": Case(
+                When(last_donation_at__lte=paid, then=Value(amount)),
+                default=F("last_amount"),
+                output_field=DecimalField(max_digits=10, decimal_places=2),
+            ),
+        },
+    )
+    _upsert(
+        DonorPurposeSummary, {"donor_id": donation.donor_id, "purpose": donation.purpose},
+        create={"total_amount": amount, "donation_count": 1},
+        update={"total_amount": F("total_amount") + amount, "donation_count": F("donation_count") + 1},
+    )
+
+
+def _paid():
+    return Coalesce(F("paid_at"), F("created_at"))
+
+
+def computed(lo: int, hi: int) -> tuple[list[DonorSummary], list[DonorPurposeSummary]]:
+    """Summary rows for donors ``lo < pk <= hi``, aggregated from ``Donation``."""
+    paid = Donation.objects.filter(status="SUCCESS", donor_id__gt=lo, donor_id__lte=hi)
+    latest = (
+        Donation.objects.filter(donor_id=OuterRef("donor_id"), status="SUCCESS")
+        .annotate(paid=_paid()).order_by("-paid", "-pk").values("amount")[:1]
+    )
+    summaries = [
+        DonorSummary(donor_id=row["donor_id"], total_amount=row["total"], donation_count=row["count"],
+                     first_donation_at=row["first"], last_donation_at=row["last"],
+                     last_amount=row["last_amount"])
+        for row in paid.values("donor_id").annotate(
+            total=Sum("amount"), count=Count("pk"), first=Min(_paid()), last=Max(_paid()),
+        ).annotate(last_amount=Subquery(latest)).order_by("donor_id")
+    ]
+    purposes = [
+        DonorPurposeSummary(donor_id=row["donor_id"], purpose=row["purpose"], total_amount=row["total"],
+                            donation_count=row["count"])
+        for row in paid.values("donor_id", "purpose").annotate(total=Sum("amount"), count=Count("pk"))
+        .order_by("donor_id", "purpose")
+    ]
+    return summaries, purposes
+
+
+def _chunks(chunk_size: int):
+    last = 0
+    while True:
+        ids = list(Donor.objects.filter(pk__gt=last).order_by("pk").values_list("pk", flat=True)[:chunk_size])
+        if not ids:
+            return
+        yield last, ids[-1]
+        last = ids[-1]
+
+
+def rebuild(chunk_size: int = 500, log=None) -> int:
+    """Recompute every summary row from ``Donation``; returns the number of donors with a summary."""
+    log = log or (lambda message, level="info": None)
+    written = 0
+    for lo, hi in _chunks(chunk_size):
+        with transaction.atomic():
+            # Payments recorded meanwhile for these donors wait for this chunk, then bump the new rows
+            list(DonorSummary.objects.select_for_update().filter(donor_id__gt=lo, donor_id__lte=hi)
+                 .values_list("pk", flat=True))
+            summaries, purposes = computed(lo, hi)
+            DonorSummary.objects.filter(donor_id__gt=lo, donor_id__lte=hi).delete()
+            DonorPurposeSummary.objects.filter(donor_id__gt=lo, donor_id__lte=hi).delete()
+            DonorSummary.objects.bulk_create(summaries)
+            DonorPurposeSummary.objects.bulk_create(purposes)
+        written += len(summaries)
+        log(f"Donors up to #{hi}: {written} summaries", "info")
+    return written
+
+
+def _fields(row, names):
+    return {name: getattr(row, name) for name in names}
+
+
+def check(chunk_size: int = 500) -> list[str]:
+    """Differences between the stored summaries and ``Donation``, one line each."""
+    summary_fields = ("total_amount", "donation_count", "first_donation_at", "last_donation_at", "last_amount")
+    purpose_fields = ("total_amount", "donation_count")
+    problems = []
+    for lo, hi in _chunks(chunk_size):
+        summaries, purposes = computed(lo, hi)
+        expected = {s.donor_id: _fields(s, summary_fields) for s in summaries}
+        expected.update({(p.donor_id, p.purpose): _fields(p, purpose_fields) for p in purposes})
+        stored = {s.donor_id: _fields(s, summary_fields)
+                  for s in DonorSummary.objects.filter(donor_id__gt=lo, donor_id__lte=hi)}
+        stored.update({(p.donor_id, p.purpose): _fields(p, purpose_fields)
+                       for p in DonorPurposeSummary.objects.filter(donor_id__gt=lo, donor_id__lte=hi)})
+        for key in sorted(expected.keys() | stored.keys(), key=str):
+            label = f"donor #{key}" if isinstance(key, int) else f"donor #{key[0]} purpose {key[1]!r}"
+            want, have = expected.get(key), stored.get(key)
+            if have is None:
+                problems.append(f"{label}: missing")
+            elif want is None:
+                problems.append(f"{label}: no successful donations but a summary exists")
+            else:
+                for name, value in want.items():
+                    if have[name] != value:
+                        problems.append(f"{label}: {name} is {have[name]}, expected {value}")
+    return problems
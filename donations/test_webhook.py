@@ -1,11 +1,25 @@
+import base64
+import importlib
 import json
+from unittest import mock
+
+from django.apps import apps
+from django.core import mail
 from django.test import TestCase, override_settings
 from django.urls import reverse
+from django.utils import timezone
+
+from payments import metrics, references
+from payments.models import EmailOutbox
 
-from .models import Donor, Donation
+from . import inbox
+from .models import Donor, Donation, WebhookEvent
 
 
-@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+@override_settings(
+    EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    HDFC_WEBHOOK_BASIC_USER='hook', HDFC_WEBHOOK_BASIC_PASS='secret',
+)
 class HdfcWebhookTests(TestCase):
     def setUp(self):
         self.donor = Donor.objects.create(
@@ -14,10 +28,12 @@ class HdfcWebhookTests(TestCase):
         )
 
     def _post(self, payload: dict):
+        auth = base64.b64encode(b'hook:secret').decode()
         return self.client.post(
             reverse('donations:hdfc_webhook'),
             data=json.dumps(payload),
             content_type='application/json',
+            HTTP_AUTHORIZATION=f'Basic {auth}',
         )
 
     def test_transaction_id_matches_txn_id(self):
@@ -31,8 +47,12 @@ class HdfcWebhookTests(TestCase):
         payload = {'transaction': {'id': 'TXN123', 'status': 'SUCCESS'}}
         resp = self._post(payload)
         self.assertEqual(resp.status_code, 200)
+        inbox.drain()
         donation.refresh_from_db()
         self.assertEqual(donation.status, 'SUCCESS')
+        # Receipt is queued with the status change, not sent from the worker pass
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(list(EmailOutbox.objects.values_list('kind', 'to')), [('receipt', ['alice@example.com'])])
 
     def test_transaction_id_matches_order_id(self):
         donation = Donation.objects.create(
@@ -45,5 +65,95 @@ class HdfcWebhookTests(TestCase):
         payload = {'transaction': {'id': 'GW456', 'status': 'SUCCESS'}}
         resp = self._post(payload)
         self.assertEqual(resp.status_code, 200)
+        inbox.drain()
         donation.refresh_from_db()
         self.assertEqual(donation.status, 'SUCCESS')
+
+    def test_ack_stores_event_without_applying_it(self):
+        Donation.objects.create(donor=self.donor, amount=100, txn_id='TXN1', order_id='GW1')
+        payload = {'order': {'id': 'TXN1', 'status': 'CHARGED'}}
+        self.assertEqual(self._post(payload).status_code, 200)
+        self.assertEqual(self._post(payload).status_code, 200)
+
+        self.assertEqual(WebhookEvent.objects.count(), 1)
+        self.assertEqual(Donation.objects.get(txn_id='TXN1').status, 'PENDING')
+
+    def test_replayed_event_is_acknowledged_without_touching_donation(self):
+        Donation.objects.create(donor=self.donor, amount=100, txn_id='TXN1', order_id='GW1')
+        self._post({'order': {'id': 'TXN1', 'status': 'CHARGED'}})
+        inbox.drain()
+        metrics.reset()
+
+        # HDFC redelivers with a different body (e.g. a new timestamp) but the same event
+        with mock.patch('donations.inbox.apply_payload') as apply_payload:
+            resp = self._post({'order': {'id': 'TXN1', 'status': 'CHARGED'}, 'date_created': 'later'})
+            inbox.drain()
+        self.assertEqual(resp.status_code, 200)
+        apply_payload.assert_not_called()
+        self.assertEqual(WebhookEvent.objects.get().deliveries, 2)
+        self.assertEqual(metrics.snapshot().get('webhook.duplicate'), 1)
+
+        # A different status for the same order is a new event
+        self._post({'order': {'id': 'TXN1', 'status': 'FAILED'}})
+        self.assertEqual(WebhookEvent.objects.count(), 2)
+
+    def test_unauthenticated_webhook_is_rejected(self):
+        resp = self.client.post(reverse('donations:hdfc_webhook'), data='{}', content_type='application/json')
+        self.assertEqual(resp.status_code, 401)
+        self.assertFalse(WebhookEvent.objects.exists())
+
+    def test_failing_event_retries_then_is_poisoned(self):
+        self._post({'order': {'id': 'TXN1', 'status': 'CHARGED'}})
+        event = WebhookEvent.objects.get()
+        with mock.patch('donations.inbox.apply_payload', side_effect=RuntimeError('smtp down')), \
+             self.settings(WEBHOOK_MAX_ATTEMPTS=2):
+            stats = inbox.drain()
+            event.refresh_from_db()
+            self.assertEqual((event.status, event.attempts, stats.retried), ('PENDING', 1, 1))
+            self.assertGreater(event.next_attempt_at, timezone.now())
+
+            self.assertEqual(inbox.drain().retried, 0)  # not due yet
+            WebhookEvent.objects.update(next_attempt_at=timezone.now())
+            stats = inbox.drain()
+
+        event.refresh_from_db()
+        self.assertEqual((event.status, event.attempts, stats.poisoned), ('POISON', 2, 1))
+        self.assertIn('smtp down', event.last_error)
+
+    def test_redelivered_poison_event_is_requeued(self):
+        self._post({'order': {'id': 'TXN1', 'status': 'CHARGED'}})
+        WebhookEvent.objects.update(status='POISON', attempts=8)
+        metrics.reset()
+
+        self._post({'order': {'id': 'TXN1', 'status': 'CHARGED'}})
+        event = WebhookEvent.objects.get()
+        self.assertEqual((event.status, event.attempts, event.deliveries), ('PENDING', 0, 2))
+        self.assertLessEqual(event.next_attempt_at, timezone.now())
+        self.assertEqual(metrics.snapshot().get('webhook.requeued'), 1)
+
+    def test_payloads_without_ids_are_keyed_by_body(self):
+        self._post({'note': 'first'})
+        self._post({'note': 'second'})
+        self._post({'note': 'first'})
+        events = WebhookEvent.objects.order_by('pk')
+        self.assertEqual([e.deliveries for e in events], [2, 1])
+        self.assertTrue(all(e.event.startswith('sha256:') for e in events))
+
+    def test_migration_keys_events_stored_before_the_ledger(self):
+        migration = importlib.import_module('donations.migrations.0004_webhook_event_ledger')
+        keyed = WebhookEvent.objects.create(payload={'order': {'id': 'TXN1', 'status': 'charged'}})
+        bare = WebhookEvent.objects.create(payload={'note': 'x'}, event='old')
+        migration.backfill_keys(apps, None)
+
+        keyed.refresh_from_db()
+        bare.refresh_from_db()
+        self.assertEqual((keyed.gw_order_id, keyed.gw_txn_id, keyed.event), ('TXN1', '', 'CHARGED'))
+        self.assertEqual(bare.event, inbox.event_key(inbox.parse(bare.payload), bare.payload)['event'])
+
+    def test_gateway_txn_id_is_indexed_for_later_lookups(self):
+        donation = Donation.objects.create(donor=self.donor, amount=100, txn_id='TXN1', order_id='GW1')
+        self._post({'order': {'id': 'TXN1', 'status': 'PENDING'}, 'transaction': {'id': 'BANKTXN9'}})
+        inbox.drain()
+
+        with self.assertNumQueries(1):
+            self.assertEqual(references.find_donation('BANKTXN9'), donation)
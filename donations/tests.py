@@ -1,7 +1,26 @@
+import io
+import smtplib
+from unittest import mock, skipUnless
+
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from payments import reconcile, status_cache
+from payments.integrations.hdfc import AsyncHdfcClient
+from payments.models import Order
 
-from .models import Donor
-from .services import get_or_create_donor
+from . import campaigns, rollups, summary
+from .models import (Campaign, CampaignDelivery, DailyDonationRollup, Donor, Donation, DonorPurposeSummary, DonorSummary,
+                     MonthlyDonationRollup, Receipt)
+from .reconcile import DonationSource
+from .services import get_or_create_donor, giving_totals, mark_paid_and_receipt
 
 
 class GetOrCreateDonorTests(TestCase):
@@ -20,3 +39,444 @@ class GetOrCreateDonorTests(TestCase):
         donor.refresh_from_db()
 
         self.assertEqual(donor.name, "Robert")
+
+
+class DonationReconcileTests(TestCase):
+    def setUp(self):
+        self.donor = Donor.objects.create(name="Alice", email="alice@example.com", email_norm="alice@example.com")
+
+    def test_paid_and_failed_donations_are_applied(self):
+        paid = Donation.objects.create(donor=self.donor, amount=100, txn_id="TXNPAID", order_id="GW1")
+        failed = Donation.objects.create(donor=self.donor, amount=100, txn_id="TXNFAIL", order_id="GW2")
+        pending = Donation.objects.create(donor=self.donor, amount=100, txn_id="TXNWAIT", order_id="GW3")
+        statuses = {"TXNPAID": "CHARGED", "TXNFAIL": "FAILED", "TXNWAIT": "PENDING"}
+        Donation.objects.update(next_check_at=timezone.now())
+
+        def status(order_id, customer_id):
+            return {"ok": True, "data": {"status": statuses[order_id], "payment_method": "UPI"}}
+
+        with mock.patch("payments.reconcile.get_order_status", side_effect=status), \
+             mock.patch("donations.reconcile.send_receipt_email"):
+            stats = reconcile.run(DonationSource(minutes=0), limit=10, workers=2, qps=0)
+
+        self.assertEqual((stats.checked, stats.updated), (3, 2))
+        paid.refresh_from_db(); failed.refresh_from_db(); pending.refresh_from_db()
+        self.assertEqual(paid.status, "SUCCESS")
+        self.assertTrue(Receipt.objects.filter(donation=paid).exists())
+        self.assertEqual(failed.status, "FAILED")
+        self.assertEqual(pending.status, "PENDING")
+        self.assertEqual(pending.check_count, 1)
+        self.assertGreater(pending.next_check_at, timezone.now())
+        self.assertIsNone(paid.next_check_at)
+
+
+    def test_apply_query_count_does_not_grow_with_batch(self):
+        for i in range(10):
+            Donation.objects.create(donor=self.donor, amount=100, txn_id=f"TXNQ{i}", order_id=f"GWQ{i}")
+        Donation.objects.update(next_check_at=timezone.now())
+        source = DonationSource()
+        rows = list(source.candidates())
+        results = [(d, {"status": "FAILED" if i % 2 else "PENDING"}) for i, d in enumerate(rows)]
+        with self.assertNumQueries(7):
+            source.apply(results, lambda *a: None)
+
+    def test_overdue_donations_get_a_last_check_before_expiring(self):
+        late = Donation.objects.create(donor=self.donor, amount=100, txn_id="TXNLATE", order_id="GW1")
+        stale = Donation.objects.create(donor=self.donor, amount=100, txn_id="TXNSTALE", order_id="GW2")
+        Donation.objects.update(created_at=timezone.now() - timezone.timedelta(days=30), next_check_at=None)
+        statuses = {"TXNLATE": "CHARGED", "TXNSTALE": "PENDING"}
+
+        def status(order_id, customer_id):
+            return {"ok": True, "data": {"status": statuses[order_id]}}
+
+        with mock.patch("payments.reconcile.get_order_status", side_effect=status) as gw, \
+             mock.patch("donations.reconcile.send_receipt_email"):
+            stats = reconcile.run(DonationSource(), limit=10, qps=0)
+
+        self.assertEqual(gw.call_count, 2)
+        self.assertEqual((stats.updated, stats.expired), (1, 1))
+        late.refresh_from_db(); stale.refresh_from_db()
+        self.assertEqual((late.status, stale.status), ("SUCCESS", "EXPIRED"))
+
+    def test_command_skips_pass_when_nothing_is_due(self):
+        Donation.objects.create(donor=self.donor, amount=100, txn_id="TXNLATER", order_id="GW1",
+                                next_check_at=timezone.now() + timezone.timedelta(minutes=5))
+        out = io.StringIO()
+        with mock.patch("payments.reconcile.run") as run:
+            call_command("reconcile_pending_donations", stdout=out)
+        run.assert_not_called()
+        self.assertIn("No pending donations to reconcile.", out.getvalue())
+
+
+class ThankYouTests(TestCase):
+    def test_settled_donation_skips_gateway(self):
+        donor = Donor.objects.create(email="a@example.com", email_norm="a@example.com")
+        Donation.objects.create(donor=donor, amount=100, txn_id="TXN1", order_id="GW1", status="SUCCESS")
+        gateway = mock.AsyncMock()
+        with mock.patch("payments.status_cache.aget_order_status", gateway):
+            resp = self.client.get(reverse("donations:thank_you"), {"txn_id": "TXN1"})
+
+        gateway.assert_not_called()
+        self.assertTrue(resp.context["is_paid"])
+
+
+class AsyncCheckoutTests(TestCase):
+    """donate_checkout and thank_you against a mocked AsyncHdfcClient."""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_checkout_creates_pending_donation_and_redirects(self):
+        session = mock.AsyncMock(return_value={"ok": True, "status_code": 200, "data": {
+            "id": "bank-7", "payment_links": {"web": "https://pay.example.com/p/7"}}})
+        with mock.patch.object(AsyncHdfcClient, "create_session", session):
+            resp = self.client.post(reverse("donations:donate_checkout"), {
+                "name": "Asha Devi", "email": "asha@example.com", "phone": "9876543210",
+                "amount": "₹1,001", "purpose": "Annadaan"})
+
+        self.assertEqual((resp.status_code, resp["Location"]), (302, "https://pay.example.com/p/7"))
+        donation = Donation.objects.get()
+        self.assertEqual((donation.status, donation.order_id, donation.amount), ("PENDING", "bank-7", 1001))
+        self.assertEqual(session.call_args.kwargs["order_id"], donation.txn_id)
+        self.assertEqual(session.call_args.kwargs["customer_id"], "asha@example.com")
+        self.assertEqual(resp.cookies["hdfc_last_order_id"].value, donation.txn_id)
+
+    def test_paid_return_issues_receipt_and_caches_paid_status(self):
+        donor = Donor.objects.create(email="a@example.com", email_norm="a@example.com")
+        donation = Donation.objects.create(donor=donor, amount=100, txn_id="TXN1", order_id="GW1")
+        gateway = mock.AsyncMock(return_value={"ok": True, "status_code": 200,
+                                               "data": {"status": "CHARGED", "payment_method_type": "UPI"}})
+        with mock.patch.object(AsyncHdfcClient, "get_order_status", gateway):
+            resp = self.client.get(reverse("donations:thank_you"), {"txn_id": "TXN1"})
+
+        gateway.assert_awaited_once_with("TXN1", "a@example.com")
+        self.assertTrue(resp.context["is_paid"])
+        donation.refresh_from_db()
+        self.assertEqual((donation.status, donation.mode), ("SUCCESS", "UPI"))
+        self.assertTrue(Receipt.objects.filter(donation=donation, number=donation.issued_receipt_no).exists())
+        # Later status reads see the paid state, not an earlier pending one
+        cached = cache.get(status_cache._key("TXN1", "a@example.com"))
+        self.assertEqual(cached["data"]["status"], "CHARGED")
+
+
+    def test_live_status_token_only_for_the_donor(self):
+        donor = Donor.objects.create(email="a@example.com", email_norm="a@example.com")
+        Donation.objects.create(donor=donor, amount=100, txn_id="TXN2", order_id="GW2")
+        gateway = mock.AsyncMock(return_value={"ok": True, "status_code": 200, "data": {"status": "PENDING"}})
+        with mock.patch("payments.status_cache.aget_order_status", gateway):
+            owner = self.client.get(reverse("donations:thank_you"), {"txn_id": "TXN2", "customer_id": "a@example.com"})
+            self.client.cookies.clear()
+            stranger = self.client.get(reverse("donations:thank_you"), {"txn_id": "TXN2"})
+
+        self.assertContains(owner, reverse("payments:payment_status_events", args=["TXN2"]) + "?token=")
+        self.assertNotContains(stranger, "EventSource")
+
+
+class CampaignTests(TestCase):
+    def setUp(self):
+        for i, name in enumerate(["Asha", "Bhima", "Chitra", "Damodar"]):
+            Donor.objects.create(name=name, email=f"d{i}@example.com", email_norm=f"d{i}@example.com")
+        Donor.objects.create(name="Opted out", email="out@example.com", email_norm="out@example.com",
+                             newsletter_opt_out=True)
+        Donor.objects.create(name="Phone only", phone_e164="+911234567890")
+        self.campaign = Campaign.objects.create(
+            name="Tula Daan", subject="Tula Daan, {{ donor.name }}",
+            text_body="Hare Krishna {{ donor.name }}", html_body="<style>p { color: red }</style><p>{{ donor.name }}</p>",
+        )
+
+    def _send(self, **kwargs):
+        return campaigns.send(self.campaign, rate_per_minute=60000, connections=2, batch_size=2, **kwargs)
+
+    def test_sends_once_per_donor_and_records_outcomes(self):
+        stats = self._send()
+
+        self.assertEqual((stats.sent, stats.failed), (4, 0))
+        self.assertEqual(sorted(m.subject for m in mail.outbox),
+                         ["Tula Daan, Asha", "Tula Daan, Bhima", "Tula Daan, Chitra", "Tula Daan, Damodar"])
+        self.assertIn('<p style="color:red">Asha</p>', [m for m in mail.outbox if "Asha" in m.subject][0].alternatives[0][0])
+        self.campaign.refresh_from_db()
+        self.assertEqual((self.campaign.status, self.campaign.sent_count), ("DONE", 4))
+        self.assertEqual(CampaignDelivery.objects.filter(status="SENT").count(), 4)
+
+    def test_resumes_from_checkpoint(self):
+        self._send(limit=2)
+        self.campaign.refresh_from_db()
+        self.assertEqual((self.campaign.status, len(mail.outbox)), ("SENDING", 2))
+
+        self._send()
+        self.campaign.refresh_from_db()
+        self.assertEqual(self.campaign.status, "DONE")
+        self.assertEqual(len({m.to[0] for m in mail.outbox}), len(mail.outbox))
+        self.assertEqual(CampaignDelivery.objects.count(), 4)
+
+    def test_failed_recipient_is_recorded_and_run_continues(self):
+        from django.core.mail.backends.locmem import EmailBackend
+        real = EmailBackend.send_messages
+
+        def send_messages(backend, messages):
+            if messages[0].to == ["d1@example.com"]:
+                raise OSError("mailbox unavailable")
+            return real(backend, messages)
+
+        with mock.patch.object(EmailBackend, "send_messages", send_messages):
+            stats = self._send()
+
+        self.assertEqual((stats.sent, stats.failed), (3, 1))
+        failed = CampaignDelivery.objects.get(status="FAILED")
+        self.assertEqual(failed.email, "d1@example.com")
+        self.assertIn("mailbox unavailable", failed.error)
+
+    def test_dropped_connection_is_replaced_and_message_retried(self):
+        from django.core.mail.backends.locmem import EmailBackend
+        real = EmailBackend.send_messages
+        dead = set()
+
+        def send_messages(backend, messages):
+            if messages[0].to == ["d1@example.com"] and not dead:
+                dead.add(backend)
+            if backend in dead:
+                raise smtplib.SMTPServerDisconnected("Connection unexpectedly closed")
+            return real(backend, messages)
+
+        with mock.patch.object(EmailBackend, "send_messages", send_messages):
+            stats = self._send()
+
+        self.assertEqual((stats.sent, stats.failed), (4, 0))
+        self.assertEqual(CampaignDelivery.objects.filter(status="SENT").count(), 4)
+
+    def test_batch_where_every_send_failed_keeps_the_checkpoint(self):
+        from django.core.mail.backends.locmem import EmailBackend
+        real = EmailBackend.send_messages
+        first_two = list(Donor.objects.order_by("pk").values_list("pk", flat=True)[:2])
+
+        def send_messages(backend, messages):
+            if messages[0].to[0] in ("d2@example.com", "d3@example.com"):
+                raise smtplib.SMTPAuthenticationError(535, "authentication failed")
+            return real(backend, messages)
+
+        with mock.patch.object(EmailBackend, "send_messages", send_messages):
+            stats = self._send()
+
+        self.assertEqual((stats.sent, stats.failed), (2, 0))
+        self.campaign.refresh_from_db()
+        self.assertEqual((self.campaign.status, self.campaign.last_donor_id), ("SENDING", first_two[-1]))
+        self.assertFalse(CampaignDelivery.objects.filter(status="FAILED").exists())
+
+        self._send()
+        self.campaign.refresh_from_db()
+        self.assertEqual((self.campaign.status, self.campaign.sent_count), ("DONE", 4))
+
+
+
+class DonorDashboardTests(TestCase):
+    def setUp(self):
+        self.donor = Donor.objects.create(name="Asha", email="asha@example.com", email_norm="asha@example.com")
+        for i in range(23):
+            Donation.objects.create(donor=self.donor, amount=101 + i, txn_id=f"TXNDASH{i}", order_id=f"ORDDASH{i}",
+                                    status="SUCCESS")
+        Receipt.objects.create(donation=Donation.objects.get(txn_id="TXNDASH22"), number="R-22")
+        self.client.force_login(User.objects.create_user("asha@example.com", password="x"))
+
+    def test_pages_through_history(self):
+        first = self.client.get(reverse("donations:donor_dashboard_json")).json()
+        self.assertEqual(len(first["donations"]), 20)
+        self.assertEqual(first["donations"][0]["receipt_no"], "R-22")
+        rest = self.client.get(reverse("donations:donor_dashboard_json"), {"cursor": first["next_cursor"]}).json()
+        self.assertEqual([d["txn_id"] for d in rest["donations"]], ["TXNDASH2", "TXNDASH1", "TXNDASH0"])
+        self.assertIsNone(rest["next_cursor"])
+
+        resp = self.client.get(reverse("donations:donor_dashboard"))
+        self.assertContains(resp, "Older")
+        self.assertNotContains(resp, "Newer")
+
+    def test_query_count_does_not_grow_with_history(self):
+        def queries():
+            with CaptureQueriesContext(connection) as ctx:
+                self.client.get(reverse("donations:donor_dashboard"))
+            return len(ctx.captured_queries)
+
+        for d in Donation.objects.filter(donor=self.donor).exclude(txn_id="TXNDASH22"):
+            Receipt.objects.create(donation=d, number=f"RN-{d.pk}")
+        full_page = queries()
+
+        newcomer = Donor.objects.create(name="Bhima", email="bhima@example.com", email_norm="bhima@example.com")
+        Donation.objects.create(donor=newcomer, amount=51, txn_id="TXNNEW", order_id="ORDNEW", status="SUCCESS")
+        self.client.force_login(User.objects.create_user("bhima@example.com", password="x"))
+        self.assertEqual(full_page, queries())
+
+    def test_totals_per_financial_year_and_purpose(self):
+        Donation.objects.filter(donor=self.donor).update(paid_at=timezone.make_aware(timezone.datetime(2025, 3, 31, 12)))
+        Donation.objects.filter(txn_id__in=["TXNDASH0", "TXNDASH1"]).update(
+            paid_at=timezone.make_aware(timezone.datetime(2025, 4, 1, 12)), purpose="Annadaan")
+        Donation.objects.filter(txn_id="TXNDASH2").update(status="FAILED")
+
+        totals = giving_totals(self.donor)
+
+        self.assertEqual(totals["count"], 22)
+        self.assertEqual([(y["label"], y["count"], y["total"]) for y in totals["years"]],
+                         [("FY 2025-26", 2, 203), ("FY 2024-25", 20, sum(101 + i for i in range(3, 23)))])
+        self.assertEqual({p["purpose"]: p["count"] for p in totals["purposes"]}, {"General": 20, "Annadaan": 2})
+
+
+
+class DonorSummaryTests(TestCase):
+    def setUp(self):
+        self.donor = Donor.objects.create(name="Asha", email="asha@example.com", email_norm="asha@example.com")
+
+    def _pay(self, txn, amount, purpose="General"):
+        donation = Donation.objects.create(donor=self.donor, amount=amount, txn_id=txn, order_id=f"ORD{txn}",
+                                           purpose=purpose)
+        mark_paid_and_receipt(donation, "UPI", {})
+        return donation
+
+    def test_payments_update_summary_once(self):
+        self._pay("S1", 101)
+        last = self._pay("S2", 501, purpose="Annadaan")
+        # A second caller with a stale PENDING copy must not count the payment again
+        stale = Donation.objects.get(pk=last.pk)
+        stale.status = "PENDING"
+        mark_paid_and_receipt(stale, "UPI", {})
+
+        s = DonorSummary.objects.get(donor=self.donor)
+        self.assertEqual((s.total_amount, s.donation_count, s.last_amount), (602, 2, 501))
+        self.assertEqual(s.last_donation_at, Donation.objects.get(pk=last.pk).paid_at)
+        self.assertEqual(
+            dict(DonorPurposeSummary.objects.filter(donor=self.donor).values_list("purpose", "donation_count")),
+            {"General": 1, "Annadaan": 1},
+        )
+        self.assertEqual(summary.check(), [])
+
+    def test_check_reports_drift_and_rebuild_repairs_it(self):
+        self._pay("S1", 101)
+        self._pay("S2", 251)
+        other = Donor.objects.create(name="Bhima")
+        Donation.objects.create(donor=other, amount=51, txn_id="S3", order_id="ORDS3", status="SUCCESS",
+                                paid_at=timezone.now())  # paid before summaries existed
+        DonorSummary.objects.filter(donor=self.donor).update(total_amount=1)
+
+        with self.assertRaises(CommandError):
+            call_command("rebuild_donor_summaries", "--check", stdout=io.StringIO())
+        self.assertIn(f"donor #{other.pk}: missing", summary.check())
+
+        call_command("rebuild_donor_summaries", "--chunk-size", "1", stdout=io.StringIO())
+
+        self.assertEqual(summary.check(), [])
+        self.assertEqual(DonorSummary.objects.get(donor=self.donor).total_amount, 352)
+        self.assertEqual(DonorSummary.objects.get(donor=other).last_amount, 51)
+
+
+
+class DonationRollupTests(TestCase):
+    def setUp(self):
+        self.donor = Donor.objects.create(name="Asha")
+        self.day1 = timezone.make_aware(timezone.datetime(2026, 9, 30, 10))
+        self.day2 = timezone.make_aware(timezone.datetime(2026, 10, 1, 23, 30))  # still 1 Oct in Asia/Kolkata
+        self._donation("R1", 101, "UPI", self.day1)
+        self._donation("R2", 201, "UPI", self.day1)
+        self._donation("R3", 51, "CARD", self.day2, purpose="Annadaan")
+        self._donation("R4", 999, "UPI", self.day2, status="FAILED")
+        order = Order.objects.create(order_id="ORDROLL1", amount=500, customer_id="c", status="CHARGED",
+                                     customer_email="a@example.com", customer_phone="+911234567890",
+                                     payment_method_type="NB", amount_refunded=100,
+                                     metadata={"description": "Tula Daan"})
+        Order.objects.filter(pk=order.pk).update(created_at=self.day2, updated_at=self.day2)
+
+    def _donation(self, txn, amount, mode, paid_at, purpose="General", status="SUCCESS"):
+        return Donation.objects.create(donor=self.donor, amount=amount, txn_id=txn, order_id=f"ORD{txn}",
+                                       mode=mode, purpose=purpose, status=status, paid_at=paid_at)
+
+    def _daily(self):
+        return {(r.day.isoformat(), r.source, r.purpose, r.mode): (r.count, r.total_amount, r.refunded_amount)
+                for r in DailyDonationRollup.objects.all()}
+
+    def test_rolls_up_by_day_purpose_and_mode(self):
+        self.assertEqual(rollups.run(now=timezone.now()), {"donation": 2, "order": 1})
+
+        self.assertEqual(self._daily(), {
+            ("2026-09-30", "donation", "General", "UPI"): (2, 302, 0),
+            ("2026-10-01", "donation", "Annadaan", "CARD"): (1, 51, 0),
+            ("2026-10-01", "order", "Tula Daan", "NB"): (1, 500, 100),
+        })
+        october = MonthlyDonationRollup.objects.get(month="2026-10-01", source="donation")
+        self.assertEqual((october.count, october.total_amount), (1, 51))
+
+    def test_rerun_only_touches_new_days_and_is_idempotent(self):
+        first = timezone.now()
+        rollups.run(now=first)
+        self.assertEqual(rollups.run(now=first + timezone.timedelta(hours=1)), {"donation": 0, "order": 0})
+
+        paid = first + timezone.timedelta(minutes=90)
+        self._donation("R5", 10, "UPI", paid)
+        Donation.objects.filter(txn_id="R3").update(mode="UPI")  # not past the watermark: left alone
+        rollups.run(["donation"], now=first + timezone.timedelta(hours=2))
+        self.assertEqual(self._daily()[(timezone.localdate(paid).isoformat(), "donation", "General", "UPI")], (1, 10, 0))
+        self.assertIn(("2026-10-01", "donation", "Annadaan", "CARD"), self._daily())
+
+        call_command("rollup_donations", "--full", stdout=io.StringIO())
+        daily = self._daily()
+        self.assertNotIn(("2026-10-01", "donation", "Annadaan", "CARD"), daily)
+        self.assertEqual(daily[("2026-10-01", "donation", "Annadaan", "UPI")], (1, 51, 0))
+        self.assertEqual(DailyDonationRollup.objects.filter(day="2026-09-30").count(), 1)
+
+    def test_payment_that_stops_counting_as_paid_recomputes_its_day(self):
+        first = timezone.now()
+        rollups.run(now=first)
+        later = first + timezone.timedelta(hours=1)
+        Order.objects.filter(order_id="ORDROLL1").update(status="REFUNDED", updated_at=later)
+
+        self.assertEqual(rollups.run(now=later + timezone.timedelta(minutes=1)), {"donation": 0, "order": 1})
+        self.assertNotIn(("2026-10-01", "order", "Tula Daan", "NB"), self._daily())
+        self.assertFalse(MonthlyDonationRollup.objects.filter(source="order").exists())
+
+    def test_staff_json_report(self):
+        rollups.run(now=timezone.now())
+        url = reverse("donations:donation_rollups")
+        self.assertEqual(self.client.get(url).status_code, 302)  # staff only
+        self.client.force_login(User.objects.create_user("finance", password="x", is_staff=True))
+
+        resp = self.client.get(url, {"from": "2026-09-01", "to": "2026-10-31", "period": "month", "group": "source"})
+        self.assertEqual(resp.json()["rows"], [
+            {"month": "2026-09-01", "source": "donation", "count": 2, "total_amount": "302.00", "refunded_amount": "0.00"},
+            {"month": "2026-10-01", "source": "donation", "count": 1, "total_amount": "51.00", "refunded_amount": "0.00"},
+            {"month": "2026-10-01", "source": "order", "count": 1, "total_amount": "500.00", "refunded_amount": "100.00"},
+        ])
+        self.assertEqual(self.client.get(url, {"group": "donor"}).status_code, 400)
+
+
+@skipUnless(connection.vendor == "postgresql", "EXPLAIN plans are checked on PostgreSQL only")
+class IndexUsageTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        donors = Donor.objects.bulk_create(
+            Donor(name=f"Donor {i}", email=f"d{i}@example.com", email_norm=f"d{i}@example.com",
+                  phone_e164=f"+9190000{i:05d}")
+            for i in range(200)
+        )
+        Donation.objects.bulk_create(
+            Donation(donor=donors[i % 200], amount=101, txn_id=f"TXNIDX{i}", order_id=f"ORDIDX{i}",
+                     status="PENDING" if i % 10 == 0 else "SUCCESS")
+            for i in range(2000)
+        )
+        User.objects.bulk_create(User(username=f"user{i}", email=f"User{i}@Example.com") for i in range(200))
+        with connection.cursor() as cursor:
+            for table in ("donations_donor", "donations_donation", "auth_user"):
+                cursor.execute(f"ANALYZE {table}")
+        cls.donor = donors[7]
+
+    def assertUsesIndex(self, qs, index):
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+        self.assertIn(index, qs.explain())
+
+    def test_pending_donations_by_age(self):
+        qs = Donation.objects.filter(status="PENDING", created_at__lt=timezone.now()).order_by("created_at")
+        self.assertUsesIndex(qs, "donation_status_created_idx")
+
+    def test_donor_history_newest_first(self):
+        self.assertUsesIndex(self.donor.donations.order_by("-created_at")[:20], "donation_donor_created_idx")
+
+    def test_donor_by_phone(self):
+        self.assertUsesIndex(Donor.objects.filter(phone_e164="+919000000042"), "phone_e164")
+
+    def test_user_by_email_case_insensitive(self):
+        self.assertUsesIndex(User.objects.filter(email__iexact="user42@example.com"), "auth_user_email_upper_idx")
@@ -18,6 +18,8 @@ urlpatterns = [
     # donor claim + dashboard (hybrid flow)
     path("donor/claim", views.donor_claim_redirect, name="donor_claim"),
     path("donor/dashboard", views.donor_dashboard, name="donor_dashboard"),
+    path("donor/dashboard.json", views.donor_dashboard, {"as_json": True}, name="donor_dashboard_json"),
+    path("reports/rollups", views.donation_rollups_view, name="donation_rollups"),
 
     # webhook lives here
     path("payments/webhook", webhook.hdfc_webhook, name="hdfc_webhook"),
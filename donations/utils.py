@@ -1,6 +1,10 @@
 import secrets, string, datetime
 from django.utils import timezone
 
+def gateway_customer_id(donor) -> str:
+    """customer_id we send HDFC for a donor (sessions and status lookups must agree)."""
+    return donor.email or donor.phone_e164 or f"donor-{donor.pk}"
+
 def normalize_email(email: str | None) -> str | None:
     return email.strip().lower() if email else None
 
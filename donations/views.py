@@ -1,24 +1,32 @@
 from django.shortcuts import render, redirect
-from django.http import HttpResponseBadRequest, HttpResponse
+from django.http import HttpResponseBadRequest, HttpResponse, JsonResponse
 from django.views.decorators.http import require_POST, require_GET
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.views.decorators.csrf import csrf_exempt, csrf_protect
 from decimal import Decimal, InvalidOperation   
 import re
 from django.urls import reverse, NoReverseMatch
 from django.conf import settings
 
-from .services import get_or_create_donor, issue_magic_link, issue_email_otp, mark_paid_and_receipt
+from . import rollups
+from .services import get_or_create_donor, giving_totals, issue_magic_link, issue_email_otp, mark_paid_and_receipt
 from .models import Donation, MagicLinkToken, OtpCode
-from .utils import gen_txn_id
+from .utils import gen_txn_id, gateway_customer_id
 from .emails import send_magic_link_email, send_otp_email
 from .auth import login_donor
 from payments.integrations.hdfc import (
-    create_session as hdfc_create_session,
+    acreate_session as hdfc_create_session,
     HdfcError,
-    get_order_status,
+    SUCCESS_STATUSES,
+    extract_status,
 )
+from payments import live, pagination, references
+from payments.context import gateway_avoided, settled_status, wants_refresh
+from payments.status_cache import aorder_status
 from django.utils import timezone
+from django.utils.dateparse import parse_date
+from asgiref.sync import sync_to_async
 
 
 @require_GET
@@ -49,7 +57,7 @@ def donate_choose(request):
 
 @require_POST
 @csrf_protect
-def donate_checkout(request):
+async def donate_checkout(request):
     # --- collect + basic validation ---
     name = (request.POST.get("name") or "").strip()
     email = (request.POST.get("email") or "").strip()
@@ -81,7 +89,7 @@ def donate_checkout(request):
             country=(request.POST.get("country") or "IN").strip(),
         )
 
-    donor = get_or_create_donor(name, email, phone, pan, addr)
+    donor = await sync_to_async(get_or_create_donor)(name, email, phone, pan, addr)
     txn_id = gen_txn_id()
 
     # --- create HDFC session using the tested integration ---
@@ -89,10 +97,10 @@ def donate_checkout(request):
     first_name = (donor.name or "Devotee").split(" ")[0]
     last_name = ""
     try:
-        result = hdfc_create_session(
+        result = await hdfc_create_session(
             order_id=txn_id,
             amount=str(amount),
-            customer_id=donor.email or donor.phone_e164 or f"donor-{donor.id}",
+            customer_id=gateway_customer_id(donor),
             customer_email=donor.email or "",
             customer_phone=donor.phone_e164 or "",
             first_name=first_name,
@@ -111,7 +119,7 @@ def donate_checkout(request):
         return HttpResponseBadRequest("Gateway did not return a payment link")
 
     # --- persist donation with real order id from gateway ---
-    donation = Donation.objects.create(
+    donation = await Donation.objects.acreate(
         donor=donor,
         amount=amount,
         purpose=purpose,
@@ -119,13 +127,14 @@ def donate_checkout(request):
         order_id=bank_id,   # <-- HDFC session/order id
         status="PENDING",
     )
+    await sync_to_async(references.link)(txn_id, bank_id, donation=donation)
 
     # --- send donor to HDFC hosted payment page ---
     # Set short-lived cookies so return page can auto-reconcile even if gateway doesn't append params
     resp = redirect(redirect_url)
     try:
         resp.set_cookie("hdfc_last_order_id", txn_id, max_age=1800, secure=True, samesite="Lax")
-        cust_id = donor.email or donor.phone_e164 or f"donor-{donor.id}"
+        cust_id = gateway_customer_id(donor)
         resp.set_cookie("hdfc_customer_id", cust_id, max_age=1800, secure=True, samesite="Lax")
     except Exception:
         pass
@@ -134,7 +143,7 @@ def donate_checkout(request):
 
 # --- thank you page (return URL) ---
 @require_GET
-def thank_you(request):
+async def thank_you(request):
     txn_id = (
         request.GET.get("txn_id")
         or request.GET.get("order_id")
@@ -146,43 +155,40 @@ def thank_you(request):
 
     donation = None
     if txn_id:
-        donation = Donation.objects.filter(txn_id=txn_id).select_related("donor").first()
+        donation = await Donation.objects.filter(txn_id=txn_id).select_related("donor").afirst()
+        if donation and customer_id and customer_id == gateway_customer_id(donation.donor):
+            # Only the paying customer may follow the donation's live status
+            ctx["live_token"] = live.stream_token(txn_id)
         if donation and not customer_id:
             donor = donation.donor
-            customer_id = donor.email or donor.phone_e164 or f"donor-{donor.id}"
-
-    if txn_id and customer_id:
+            customer_id = gateway_customer_id(donor)
+
+    settled = settled_status(donation=donation)
+    refresh = await wants_refresh(request)
+    if settled and not refresh:
+        # Webhook/reconciler already settled it; skip the gateway round trip
+        gateway_avoided()
+        ctx.update({"status": settled, "is_paid": settled == "SUCCESS", "server_checked": True})
+    elif txn_id and customer_id:
         try:
-            result = get_order_status(txn_id, customer_id)
+            result = await aorder_status(txn_id, customer_id, force=refresh)
             data = result.get("data") or {}
 
-            def _extract_status(d: dict) -> str:
-                s = (
-                    (d or {}).get("status")
-                    or (d or {}).get("order", {}).get("status")
-                    or (d or {}).get("payment", {}).get("status")
-                    or (d or {}).get("transaction", {}).get("status")
-                    or (d or {}).get("result", {}).get("status")
-                    or ""
-                )
-                return str(s).upper()
-
-            norm_status = _extract_status(data)
-            success_statuses = {"CHARGED", "SUCCESS", "SUCCESSFUL", "PAID", "CAPTURED", "COMPLETED", "SETTLED"}
-            is_paid = norm_status in success_statuses
+            norm_status = extract_status(data)
+            is_paid = norm_status in SUCCESS_STATUSES
 
             ctx.update({"status": norm_status, "is_paid": is_paid, "server_checked": True})
 
             if is_paid and donation and donation.status != "SUCCESS":
                 mode = data.get("payment_method") or data.get("payment_method_type") or ""
                 try:
-                    mark_paid_and_receipt(donation, mode, data)
+                    await sync_to_async(mark_paid_and_receipt)(donation, mode, data)
                 except Exception:
                     pass
         except HdfcError:
             ctx.update({"status": "ERROR", "server_checked": True})
 
-    resp = render(request, "donations/thank_you.html", ctx)
+    resp = await sync_to_async(render)(request, "donations/thank_you.html", ctx)
     if txn_id:
         resp.set_cookie("hdfc_last_order_id", txn_id, max_age=1800, secure=True, samesite="Lax")
     if customer_id:
@@ -287,9 +293,24 @@ def donor_claim_redirect(request):
     return magic_claim(request, token)
 
 
+DASHBOARD_PAGE_SIZE = 20
+
+
+def _donation_json(d):
+    receipt = d.receipt if hasattr(d, "receipt") else None
+    return {
+        "txn_id": d.txn_id,
+        "created_at": d.created_at.isoformat(),
+        "purpose": d.purpose,
+        "amount": str(d.amount),
+        "status": d.status,
+        "receipt_no": receipt.number if receipt else None,
+    }
+
+
 @login_required
-def donor_dashboard(request):
-    """Simple donor dashboard: list your donations and receipts."""
+def donor_dashboard(request, as_json=False):
+    """Simple donor dashboard: your donations and receipts, newest first (``?cursor=`` pages)."""
     from .models import Donor
     u = request.user
     # Resolve donor by username heuristic used in ensure_user_for_donor
@@ -307,7 +328,57 @@ def donor_dashboard(request):
     if donor is None and u.email:
         donor = Donor.objects.filter(email_norm=u.email.lower()).first()
     if donor is None:
+        if as_json:
+            return JsonResponse({"donor": None, "donations": [], "next_cursor": None, "prev_cursor": None})
         return render(request, "donations/dashboard.html", {"donations": [], "donor": None})
 
-    donations = donor.donations.order_by("-created_at").all()
-    return render(request, "donations/dashboard.html", {"donations": donations, "donor": donor})
+    # Receipts come in the same query; the gateway payload is never shown
+    donations = donor.donations.select_related("receipt").defer("gateway_meta")
+    try:
+        page = pagination.paginate(donations, request.GET.get("cursor"), DASHBOARD_PAGE_SIZE)
+    except pagination.InvalidCursor:
+        if as_json:
+            return HttpResponseBadRequest("Invalid cursor")
+        page = pagination.paginate(donations, None, DASHBOARD_PAGE_SIZE)
+    totals = giving_totals(donor)
+
+    if as_json:
+        return JsonResponse({
+            "donor": {"name": donor.name, "email": donor.email},
+            "donations": [_donation_json(d) for d in page.items],
+            "totals": {
+                "total": str(totals["total"]),
+                "count": totals["count"],
+                "years": [{**y, "total": str(y["total"])} for y in totals["years"]],
+                "purposes": [{**p, "total": str(p["total"])} for p in totals["purposes"]],
+            },
+            "next_cursor": page.next_cursor,
+            "prev_cursor": page.prev_cursor,
+        })
+    return render(request, "donations/dashboard.html", {"donations": page.items, "donor": donor, "page": page, "totals": totals})
+
+
+@staff_member_required
+@require_GET
+def donation_rollups_view(request):
+    """Finance totals from the rollup tables: ?from=&to= (YYYY-MM-DD), period=day|month, source=, group=purpose,mode."""
+    today = timezone.localdate()
+    start = parse_date(request.GET.get("from") or "") or today.replace(day=1)
+    end = parse_date(request.GET.get("to") or "") or today
+    period = request.GET.get("period") or "day"
+    source = request.GET.get("source") or None
+    group_by = [g for g in (request.GET.get("group") or "purpose,mode").split(",") if g]
+    if period not in ("day", "month") or (source and source not in rollups.SOURCES) \
+            or any(g not in rollups.GROUP_FIELDS for g in group_by):
+        return HttpResponseBadRequest("Invalid period, source or group")
+    rows = rollups.totals(start, end, period=period, source=source, group_by=group_by)
+    field = "month" if period == "month" else "day"
+    return JsonResponse({
+        "from": start.isoformat(), "to": end.isoformat(), "period": period,
+        "rows": [
+            {**row, field: row[field].isoformat(), "total_amount": f"{row['total_amount']:.2f}",
+             "refunded_amount": f"{row['refunded_amount']:.2f}"}
+            for row in rows
+        ],
+    })
+
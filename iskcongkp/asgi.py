@@ -11,6 +11,12 @@ import os
 
 from django.core.asgi import get_asgi_application
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'iskcongkp.settings')
+if "ENVIRONMENT_NAME" in os.environ:
+    environment_name = os.environ['ENVIRONMENT_NAME']
+    environment_settings_file = "iskcongkp.settings."+environment_name
+else:
+    environment_settings_file = "iskcongkp.settings.base"
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", environment_settings_file)
 
 application = get_asgi_application()
@@ -1,15 +1,24 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
 from django.conf import settings
 from django.shortcuts import redirect
 from django.urls import reverse
 
 
 class MaintenanceModeMiddleware:
-    """Redirect all requests to the maintenance page when enabled."""
+    """Redirect all requests to the maintenance page when enabled.
+
+    Sync and async capable so async views are not forced back onto a thread under ASGI.
+    """
+
+    sync_capable = True
+    async_capable = True
 
     def __init__(self, get_response):
         self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
 
-    def __call__(self, request):
+    def _maintenance_redirect(self, request):
         if getattr(settings, "MAINTENANCE_MODE", False):
             maintenance_url = reverse("maintenance")
             excluded_paths = [maintenance_url, "/admin/"]
@@ -21,4 +30,12 @@ class MaintenanceModeMiddleware:
                 and not request.path.startswith(media_prefix)
             ):
                 return redirect(maintenance_url)
-        return self.get_response(request)
+        return None
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self._maintenance_redirect(request) or self.get_response(request)
+
+    async def __acall__(self, request):
+        return self._maintenance_redirect(request) or await self.get_response(request)
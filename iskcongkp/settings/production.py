@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 import os
 import os.path
+from decimal import Decimal
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -27,6 +28,51 @@ HDFC_CLIENT_ID   = os.getenv("HDFC_CLIENT_ID", HDFC_MERCHANT_ID)
 # Webhook auth you configure in SmartGateway Dashboard
 HDFC_WEBHOOK_BASIC_USER = os.getenv("WEBHOOK_BASIC_USER")     # Dashboard > Webhooks (if you set Basic Auth)
 HDFC_WEBHOOK_BASIC_PASS = os.getenv("HDFC_WEBHOOK_BASIC_PASS") # often empty is allowed, but supported here
+# Order-status cache (seconds): settled orders vs. orders still in flight
+HDFC_STATUS_CACHE_TERMINAL_TTL = int(os.getenv("HDFC_STATUS_CACHE_TERMINAL_TTL", "3600"))
+HDFC_STATUS_CACHE_PENDING_TTL  = int(os.getenv("HDFC_STATUS_CACHE_PENDING_TTL", "5"))
+# Set REDIS_URL to share the order-status cache between processes, so the webhook worker's
+# invalidations reach the web processes. Without it each process keeps its own in-memory cache;
+# a stale pending status then lives at most HDFC_STATUS_CACHE_PENDING_TTL seconds.
+if os.getenv("REDIS_URL"):
+    CACHES = {"default": {"BACKEND": "django.core.cache.backends.redis.RedisCache", "LOCATION": os.getenv("REDIS_URL")}}
+else:
+    CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+# Reconcilers: gateway status calls per second allowed by HDFC, concurrent calls, rows per batch
+HDFC_STATUS_QPS      = float(os.getenv("HDFC_STATUS_QPS", "10"))
+RECONCILE_WORKERS    = int(os.getenv("RECONCILE_WORKERS", "8"))
+RECONCILE_CHUNK_SIZE = int(os.getenv("RECONCILE_CHUNK_SIZE", "200"))
+# Batch status API: ids per request and concurrent gateway calls per request
+HDFC_BATCH_MAX_IDS     = int(os.getenv("HDFC_BATCH_MAX_IDS", "100"))
+HDFC_BATCH_CONCURRENCY = int(os.getenv("HDFC_BATCH_CONCURRENCY", "5"))
+# Per-order polling schedule: first gap and cap (seconds, doubling per check), polling window
+# for orders without a gateway expiry (hours), and grace before bulk-expiring unchecked orders
+RECONCILE_BACKOFF_BASE  = int(os.getenv("RECONCILE_BACKOFF_BASE", "60"))
+RECONCILE_BACKOFF_MAX   = int(os.getenv("RECONCILE_BACKOFF_MAX", "21600"))
+RECONCILE_MAX_AGE_HOURS = int(os.getenv("RECONCILE_MAX_AGE_HOURS", "72"))
+RECONCILE_EXPIRY_GRACE  = int(os.getenv("RECONCILE_EXPIRY_GRACE", "3600"))
+# Webhook inbox worker: events per batch, first retry delay (seconds, doubling),
+# attempts before an event is parked as POISON, and how long a claimed batch stays leased
+WEBHOOK_INBOX_BATCH   = int(os.getenv("WEBHOOK_INBOX_BATCH", "50"))
+WEBHOOK_RETRY_BASE    = int(os.getenv("WEBHOOK_RETRY_BASE", "30"))
+WEBHOOK_MAX_ATTEMPTS  = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "8"))
+WEBHOOK_LEASE_SECONDS = int(os.getenv("WEBHOOK_LEASE_SECONDS", "300"))
+# Email outbox worker (process_email_outbox): queue instead of sending inline, emails per batch,
+# first retry delay (seconds, doubling), attempts before FAILED, and lease on a claimed batch
+EMAIL_OUTBOX_ENABLED       = os.getenv("EMAIL_OUTBOX_ENABLED", "true").lower() in ("1", "true", "yes")
+EMAIL_OUTBOX_BATCH         = int(os.getenv("EMAIL_OUTBOX_BATCH", "50"))
+EMAIL_OUTBOX_RETRY_BASE    = int(os.getenv("EMAIL_OUTBOX_RETRY_BASE", "60"))
+EMAIL_OUTBOX_MAX_ATTEMPTS  = int(os.getenv("EMAIL_OUTBOX_MAX_ATTEMPTS", "6"))
+EMAIL_OUTBOX_LEASE_SECONDS = int(os.getenv("EMAIL_OUTBOX_LEASE_SECONDS", "300"))
+# Pooled SMTP connections per process: idle connections kept, NOOP-probe after / replace after
+# this many idle seconds, and messages per connection before reconnecting
+SMTP_POOL_SIZE         = int(os.getenv("SMTP_POOL_SIZE", "2"))
+SMTP_POOL_PROBE_AFTER  = int(os.getenv("SMTP_POOL_PROBE_AFTER", "15"))
+SMTP_POOL_MAX_IDLE     = int(os.getenv("SMTP_POOL_MAX_IDLE", "240"))
+SMTP_POOL_MAX_MESSAGES = int(os.getenv("SMTP_POOL_MAX_MESSAGES", "100"))
+# Live status stream (SSE): re-read interval when no change notification arrives, and max stream length
+LIVE_STATUS_POLL_SECONDS = float(os.getenv("LIVE_STATUS_POLL_SECONDS", "15"))
+LIVE_STATUS_MAX_SECONDS  = float(os.getenv("LIVE_STATUS_MAX_SECONDS", "300"))
 
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -184,10 +230,30 @@ DEFAULT_FROM_EMAIL = os.getenv("DEFAULT_FROM_EMAIL", EMAIL_HOST_USER)
 EMAIL_TIMEOUT = int(os.getenv("EMAIL_TIMEOUT", "20"))
 EMAIL_FAIL_SILENTLY = os.getenv("EMAIL_FAIL_SILENTLY", "true").lower() == "true"
 DONATIONS_FROM_EMAIL = DEFAULT_FROM_EMAIL
+# HTML email templates with inlined CSS, built by `manage.py compile_email_templates` at deploy;
+# stale or missing output falls back to the source templates
+EMAIL_COMPILED_DIR = os.getenv("EMAIL_COMPILED_DIR", os.path.join(BASE_DIR, "templates", "emails", "compiled"))
+EMAIL_USE_COMPILED_TEMPLATES = os.getenv("EMAIL_USE_COMPILED_TEMPLATES", "true").lower() in ("1", "true", "yes")
 
 # Payments notifications
 # Comma-separated list of admin recipients for payment notifications
 PAYMENTS_ADMIN_EMAILS = os.getenv("PAYMENTS_ADMIN_EMAILS", "vipul57612@gmail.com")
+# Admins get a periodic digest (`manage.py send_payment_digest`, e.g. daily from cron) instead of
+# one email per paid order; orders of at least PAYMENTS_ADMIN_INSTANT_MIN_AMOUNT still email at once
+PAYMENTS_ADMIN_DIGEST = os.getenv("PAYMENTS_ADMIN_DIGEST", "true").lower() in ("1", "true", "yes")
+PAYMENTS_ADMIN_INSTANT_MIN_AMOUNT = (
+    Decimal(os.getenv("PAYMENTS_ADMIN_INSTANT_MIN_AMOUNT")) if os.getenv("PAYMENTS_ADMIN_INSTANT_MIN_AMOUNT") else None
+)
+PAYMENTS_DIGEST_MAX_ROWS = int(os.getenv("PAYMENTS_DIGEST_MAX_ROWS", "500"))
+PAYMENTS_DIGEST_LOOKBACK_HOURS = int(os.getenv("PAYMENTS_DIGEST_LOOKBACK_HOURS", "24"))
+# Campaign mailings (`manage.py send_campaign`): overall send rate, parallel SMTP connections,
+# and donors per checkpoint/bulk insert
+CAMPAIGN_RATE_PER_MINUTE = float(os.getenv("CAMPAIGN_RATE_PER_MINUTE", "300"))
+CAMPAIGN_CONNECTIONS     = int(os.getenv("CAMPAIGN_CONNECTIONS", "3"))
+CAMPAIGN_BATCH_SIZE      = int(os.getenv("CAMPAIGN_BATCH_SIZE", "200"))
+# Donation rollups (`manage.py rollup_donations`): minutes re-read before the watermark, for rows
+# that were paid before it but committed after the previous run
+ROLLUP_OVERLAP_MINUTES = int(os.getenv("ROLLUP_OVERLAP_MINUTES", "10"))
 
 # Cookies and proxy security
 SESSION_COOKIE_SECURE = True
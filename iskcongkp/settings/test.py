@@ -12,3 +12,6 @@ DATABASES = {
 }
 
 ALLOWED_HOSTS = ['testserver']
+
+# Per-process cache in tests (base settings use Redis or the database cache)
+CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Order
+from .models import AdminDigest, EmailOutbox, Order
 
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
@@ -7,3 +7,23 @@ class OrderAdmin(admin.ModelAdmin):
     search_fields = ("order_id", "bank_order_id", "customer_id", "customer_email", "txn_id")
     list_filter = ("status", "currency", "refunded", "created_at")
     readonly_fields = ("created_at", "updated_at", "last_status_payload", "sdk_payload")
+
+
+@admin.register(EmailOutbox)
+class EmailOutboxAdmin(admin.ModelAdmin):
+    list_display = ("id", "kind", "subject", "status", "attempts", "created_at", "sent_at", "latency_ms")
+    list_filter = ("status", "kind")
+    search_fields = ("subject", "to")
+    readonly_fields = ("created_at", "sent_at", "latency_ms", "last_error")
+    actions = ["requeue"]
+
+    @admin.action(description="Requeue selected emails")
+    def requeue(self, request, queryset):
+        from django.utils import timezone
+        queryset.exclude(status="SENT").update(status="PENDING", attempts=0, next_attempt_at=timezone.now())
+
+
+@admin.register(AdminDigest)
+class AdminDigestAdmin(admin.ModelAdmin):
+    list_display = ("id", "period_start", "period_end", "order_count", "created_at")
+    readonly_fields = ("period_start", "period_end", "order_count", "created_at")
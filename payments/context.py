@@ -0,0 +1,159 @@
+"""Request-scoped loader for everything a payment page shows.
+
+``PaymentContext`` fetches the Order with its Donation, Donor and Receipt in
+one ``select_related`` query and memoizes them, so building the return page
+no longer repeats Order/Donation lookups at every step.
+
+``settled_status`` lets status pages answer from the DB once the webhook or a
+reconciler has settled a payment; only pending payments (or a staff
+``?refresh=1``) reach the gateway. Skipped calls are counted as
+``status.gateway_avoided`` in ``payments.metrics``.
+"""
+from functools import cached_property
+
+from .integrations.hdfc import _sanitize_order_id
+from .models import Order
+from .status_cache import TERMINAL_STATUSES
+from . import metrics, references
+
+SETTLED_DONATION_STATUSES = {"SUCCESS", "FAILED"}
+
+
+def settled_status(order=None, donation=None) -> str:
+    """Terminal status already recorded locally, or "" if the gateway must be asked.
+
+    An order counts as settled only once its donation (if any) is settled too,
+    so a CHARGED order still reconciles a donation the webhook missed.
+    EXPIRED is our own give-up marker, not the gateway's word, so it is not final.
+    """
+    if order is not None:
+        status = (order.status or "").upper()
+        if status not in TERMINAL_STATUSES:
+            return ""
+        if donation is not None and donation.status not in SETTLED_DONATION_STATUSES:
+            return ""
+        return status
+    if donation is not None and donation.status in SETTLED_DONATION_STATUSES:
+        return donation.status
+    return ""
+
+
+def gateway_avoided() -> None:
+    metrics.incr("status.gateway_avoided")
+
+
+async def wants_refresh(request) -> bool:
+    """``?refresh=1`` from staff: bypass local state and the status cache."""
+    if request.GET.get("refresh") not in ("1", "true", "yes"):
+        return False
+    user = await request.auser()
+    return bool(user.is_staff)
+
+
+def fill_from_order(ctx: dict, o: Order) -> None:
+    try:
+        if not o:
+            return
+        ctx["amount"] = getattr(o, "amount", None)
+        ctx["currency"] = getattr(o, "currency", None)
+        ctx["customer_email"] = getattr(o, "customer_email", "") or ""
+        ctx["customer_phone"] = getattr(o, "customer_phone", "") or ""
+        # purpose/description stored in metadata during create_session
+        meta = getattr(o, "metadata", None) or {}
+        purpose = meta.get("description") or meta.get("purpose") or ""
+        if purpose:
+            ctx["purpose"] = purpose
+        # method details if already known
+        ctx["payment_method_type"] = getattr(o, "payment_method_type", "") or ""
+        ctx["payment_method"] = getattr(o, "payment_method", "") or ""
+    except Exception:
+        pass
+
+
+def fill_from_donation(ctx: dict, d) -> None:
+    """Enrich with donor name/purpose and fill details the Order lacked."""
+    if not d:
+        return
+    ctx["donor_name"] = getattr(d.donor, "name", "") or ctx.get("donor_name", "")
+    if not ctx.get("purpose"):
+        ctx["purpose"] = getattr(d, "purpose", "") or ctx.get("purpose", "")
+    if ctx.get("amount") is None:
+        ctx["amount"] = d.amount
+    if not ctx.get("currency"):
+        ctx["currency"] = "INR"
+    if not ctx.get("customer_email"):
+        ctx["customer_email"] = getattr(d.donor, "email", "") or ""
+    if not ctx.get("customer_phone"):
+        ctx["customer_phone"] = getattr(d.donor, "phone_e164", "") or ""
+    receipt = getattr(d, "receipt", None) if d.status == "SUCCESS" else None
+    if receipt is not None:
+        ctx["receipt_no"] = receipt.number
+
+
+class PaymentContext:
+    """Order, Donation, Donor and Receipt for one order id, each loaded at most once."""
+
+    def __init__(self, order_id: str):
+        self.order_id = order_id or ""
+        self.oid = _sanitize_order_id(self.order_id)
+        self._refs = []
+
+    @cached_property
+    def order(self) -> Order | None:
+        if not self.oid:
+            return None
+        return (
+            Order.objects.select_related("donation__donor", "donation__receipt")
+            .filter(order_id=self.oid)
+            .first()
+        )
+
+    @cached_property
+    def donation(self):
+        o = self.order
+        if o is not None and o.donation_id:
+            return o.donation
+        refs = [self.order_id, self.oid, getattr(o, "bank_order_id", ""), *self._refs]
+        donation = references.find_donation(*refs)
+        if o is not None and donation is not None:
+            o.donation = donation
+            Order.objects.filter(pk=o.pk, donation__isnull=True).update(donation=donation)
+        return donation
+
+    @classmethod
+    def preloaded(cls, order_id: str, order=None, donation=None) -> "PaymentContext":
+        """Context for rows the caller already fetched (e.g. in a batch query)."""
+        pc = cls(order_id)
+        pc.__dict__["order"] = order
+        if donation is not None or (order is not None and order.donation_id):
+            pc.__dict__["donation"] = donation or order.donation
+        return pc
+
+    def add_refs(self, *refs) -> None:
+        """More ids for this payment (e.g. from the gateway); retries the donation lookup if it missed."""
+        self._refs.extend(r for r in refs if r)
+        if self.__dict__.get("donation", False) is None:
+            del self.__dict__["donation"]
+
+    @property
+    def donor(self):
+        return self.donation.donor if self.donation else None
+
+    @property
+    def customer_id(self) -> str:
+        return getattr(self.order, "customer_id", "") or ""
+
+    @property
+    def gateway_customer_id(self) -> str:
+        """customer_id the gateway knows this payment by; "" if there is no order or donor."""
+        if self.customer_id:
+            return self.customer_id
+        from donations.utils import gateway_customer_id
+        return gateway_customer_id(self.donor) if self.donor is not None else ""
+
+    def settled_status(self) -> str:
+        return settled_status(self.order, self.donation)
+
+    def fill(self, ctx: dict) -> None:
+        fill_from_order(ctx, self.order)
+        fill_from_donation(ctx, self.donation)
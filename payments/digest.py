@@ -0,0 +1,120 @@
+"""Periodic admin digest of paid orders.
+
+With ``PAYMENTS_ADMIN_DIGEST`` on, ``send_payment_confirmation`` no longer
+emails the admins for every paid order (only for orders of at least
+``PAYMENTS_ADMIN_INSTANT_MIN_AMOUNT``, if set). ``send_digest()``, run from
+cron via ``send_payment_digest``, instead:
+
+* claims every paid order no digest has reported yet with one UPDATE that
+  points ``Order.admin_digest`` at a new ``AdminDigest`` row, so two runs
+  never report the same order. The claim reaches back to the first digest,
+  not just to the previous one, so an order whose ``updated_at`` predates
+  the previous run (its transaction committed late) is still reported; a
+  partial index keeps that to the unreported rows;
+* reads the order table together with per-purpose/currency totals in one
+  query (window aggregates over the claimed rows);
+* queues one email in the same transaction, so a failed run reports its
+  orders again next time.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Sum, TextField, Value, Window
+from django.db.models.fields.json import KT
+from django.db.models.functions import Coalesce, NullIf
+from django.utils import timezone
+
+from . import mail_templates, outbox
+from .emails import _admin_recipients
+from .integrations.hdfc import SUCCESS_STATUSES
+from .models import AdminDigest, Order
+
+
+def order_purpose():
+    # Same fallback chain as the confirmation email and the return page
+    return Coalesce(
+        NullIf(KT("metadata__description"), Value("")),
+        NullIf(KT("metadata__purpose"), Value("")),
+        Value("Donation"),
+        output_field=TextField(),
+    )
+
+
+def _window(now):
+    """(start of this digest's period, oldest ``updated_at`` it may claim)."""
+    first = AdminDigest.objects.order_by("period_start").values_list("period_start", flat=True).first()
+    if first is None:
+        first = now - timedelta(hours=getattr(settings, "PAYMENTS_DIGEST_LOOKBACK_HOURS", 24))
+        return first, first
+    last = AdminDigest.objects.order_by("-period_end").values_list("period_end", flat=True).first()
+    return last, first
+
+
+def summary(digest: AdminDigest, max_rows: int | None = None) -> dict:
+    """Template context for ``digest``: per-purpose totals, currency totals and the first ``max_rows`` orders."""
+    max_rows = max_rows or getattr(settings, "PAYMENTS_DIGEST_MAX_ROWS", 500)
+    group = [order_purpose(), F("currency")]
+    rows = (
+        Order.objects.filter(admin_digest=digest)
+        .annotate(
+            purpose=order_purpose(),
+            purpose_total=Window(Sum("amount"), partition_by=group),
+            purpose_count=Window(Count("pk"), partition_by=group),
+        )
+        .order_by("purpose", "currency", "created_at", "pk")
+        .values("order_id", "amount", "currency", "customer_email", "customer_id", "status",
+                "created_at", "purpose", "purpose_total", "purpose_count")
+    )
+    purposes, orders, count = {}, [], 0
+    for row in rows.iterator(chunk_size=1000):
+        purposes.setdefault((row["purpose"], row["currency"]), {
+            "purpose": row["purpose"], "currency": row["currency"],
+            "total": row["purpose_total"], "count": row["purpose_count"],
+        })
+        if len(orders) < max_rows:
+            orders.append(row)
+        count += 1
+    totals = {}
+    for p in purposes.values():
+        totals[p["currency"]] = totals.get(p["currency"], Decimal("0")) + p["total"]
+    return {
+        "digest": digest,
+        "purposes": list(purposes.values()),
+        "totals": [{"currency": c, "total": t} for c, t in sorted(totals.items())],
+        "orders": orders,
+        "order_count": count,
+        "more": count - len(orders),
+    }
+
+
+def send_digest(now=None) -> AdminDigest | None:
+    """Report paid orders not yet in a digest; None if there were none (or no admin recipients)."""
+    admins = _admin_recipients()
+    if not admins:
+        return None
+    now = now or timezone.now()
+    since, floor = _window(now)
+    with transaction.atomic():
+        digest = AdminDigest.objects.create(period_start=since, period_end=now)
+        claimed = Order.objects.filter(
+            admin_digest__isnull=True, status__in=sorted(SUCCESS_STATUSES),
+            updated_at__gte=floor, updated_at__lte=now,
+        ).update(admin_digest=digest)
+        if not claimed:
+            transaction.set_rollback(True)
+            return None
+        ctx = summary(digest)
+        digest.order_count = ctx["order_count"]
+        digest.save(update_fields=["order_count"])
+        subject = (f"Payments digest {since:%d %b %H:%M} – {now:%d %b %H:%M}: {ctx['order_count']} payments, "
+                   + ", ".join(f"{t['currency']} {t['total']}" for t in ctx["totals"]))
+        from_email = getattr(settings, "DEFAULT_FROM_EMAIL", None) or getattr(settings, "EMAIL_HOST_USER", None)
+        msg = mail_templates.message(
+            subject, admins, context=ctx, from_email=from_email,
+            text_template="emails/payment_digest_admin.txt",
+            html_template="emails/payment_digest_admin.html",
+        )
+        outbox.enqueue(msg, kind="payment_digest", fail_silently=False)
+    return digest
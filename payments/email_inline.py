@@ -0,0 +1,288 @@
+"""Build-time CSS inlining and minification for HTML email templates.
+
+Mail clients ignore or strip ``<style>`` blocks, so ``compile_email_templates``
+rewrites each ``emails/*.html`` template at deploy time: rules from its
+``<style>`` blocks are copied into ``style=""`` attributes (by specificity,
+existing inline styles last) and the markup is minified. Django template
+tags pass through untouched, so the output is still a template and a send
+only substitutes variables.
+
+The inliner handles what these templates use: type, ``.class`` and ``#id``
+selectors, compounds of those, descendant combinators and selector lists.
+Rules it cannot apply (pseudo-classes, ``@media``, other combinators) stay in
+a ``<style>`` block. Template tags inside a tag's attribute list are not
+supported.
+
+Every output is recorded in ``manifest.json`` with the hash of its source
+(plus ``VERSION``) and of the output itself. ``mail_templates`` only uses a
+compiled template whose hashes still match, and ``--check`` lists stale ones.
+"""
+import hashlib
+import json
+import os
+import re
+from html.parser import HTMLParser
+
+from django.conf import settings
+
+# Bump when the inliner's output changes so existing builds count as stale
+VERSION = "1"
+MANIFEST = "manifest.json"
+
+_VOID = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+_BLOCK = ("html|head|body|title|meta|style|div|p|table|thead|tbody|tr|th|td|h[1-6]|ul|ol|li|br|hr")
+_COMPOUND = re.compile(r"^(\*|[a-zA-Z][\w-]*)?((?:[.#][\w-]+)*)$")
+
+
+def output_dir() -> str:
+    return getattr(settings, "EMAIL_COMPILED_DIR", None) or os.path.join(
+        settings.BASE_DIR, "templates", "emails", "compiled")
+
+
+def fingerprint(text: str) -> str:
+    return hashlib.sha256(f"{VERSION}\0{text}".encode("utf-8")).hexdigest()
+
+
+class _Rule:
+    def __init__(self, compounds, declarations, order):
+        self.compounds = compounds  # [(tag or None, classes, id or None)], outermost first
+        self.declarations = declarations
+        ids = sum(1 for _, _, i in compounds if i)
+        classes = sum(len(c) for _, c, _ in compounds)
+        tags = sum(1 for t, _, _ in compounds if t)
+        self.key = (ids, classes, tags, order)
+
+    def matches(self, element, ancestors) -> bool:
+        if not _compound_matches(self.compounds[-1], element):
+            return False
+        pending = self.compounds[:-1]
+        for ancestor in reversed(ancestors):
+            if not pending:
+                break
+            if _compound_matches(pending[-1], ancestor):
+                pending = pending[:-1]
+        return not pending
+
+
+def _compound_matches(compound, element) -> bool:
+    tag, classes, id_ = compound
+    etag, eclasses, eid = element
+    return (tag is None or tag == etag) and classes <= eclasses and (id_ is None or id_ == eid)
+
+
+def _parse_selector(selector: str):
+    compounds = []
+    for part in selector.split():
+        m = _COMPOUND.match(part)
+        if not m or not part:
+            return None
+        tag = m.group(1) if m.group(1) not in (None, "*") else None
+        rest = re.findall(r"([.#])([\w-]+)", m.group(2))
+        ids = [v for k, v in rest if k == "#"]
+        if len(ids) > 1:
+            return None
+        compounds.append(((tag or "").lower() or None, frozenset(v for k, v in rest if k == "."),
+                          ids[0] if ids else None))
+    return compounds or None
+
+
+def _declarations(block: str) -> list[tuple[str, str]]:
+    out = []
+    for decl in block.split(";"):
+        if ":" in decl:
+            prop, value = decl.split(":", 1)
+            if prop.strip() and value.strip():
+                out.append((prop.strip().lower(), " ".join(value.split()).replace('"', "'")))
+    return out
+
+
+def parse_css(css: str) -> tuple[list[_Rule], str]:
+    """Inlinable rules and the CSS that has to stay in a ``<style>`` block."""
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    rules, residual, order, pos = [], [], 0, 0
+    while pos < len(css):
+        brace = css.find("{", pos)
+        if brace < 0:
+            break
+        prelude = css[pos:brace].strip()
+        if prelude.startswith("@"):
+            # Keep at-rules (with their nested blocks) verbatim
+            depth, end = 0, brace
+            while end < len(css):
+                depth += {"{": 1, "}": -1}.get(css[end], 0)
+                end += 1
+                if depth == 0:
+                    break
+            residual.append(" ".join(css[pos:end].split()))
+            pos = end
+            continue
+        close = css.find("}", brace)
+        close = len(css) if close < 0 else close
+        decls = _declarations(css[brace + 1:close])
+        kept = []
+        for selector in prelude.split(","):
+            compounds = _parse_selector(selector.strip())
+            if compounds is None:
+                kept.append(selector.strip())
+            else:
+                rules.append(_Rule(compounds, decls, order))
+                order += 1
+        if kept and decls:
+            residual.append(f"{','.join(kept)}{{{';'.join(f'{p}:{v}' for p, v in decls)}}}")
+        pos = close + 1
+    return rules, "".join(residual)
+
+
+class _Inliner(HTMLParser):
+    def __init__(self, rules, residual_css):
+        super().__init__(convert_charrefs=False)
+        self.rules = sorted(rules, key=lambda r: r.key)
+        self.residual_css = residual_css
+        self.out = []
+        self.stack = []  # (tag, classes, id) of open elements
+        self.in_style = False
+        self.style_written = False
+
+    def handle_decl(self, decl):
+        self.out.append(f"<!{decl}>")
+
+    def handle_starttag(self, tag, attrs, self_closing=False):
+        raw = self.get_starttag_text()
+        if tag == "style":
+            self.in_style = True
+            return
+        attrs = dict(attrs)
+        element = (tag, frozenset((attrs.get("class") or "").split()), attrs.get("id"))
+        if tag in ("head", "html") or not self.rules:
+            self.out.append(raw)
+        else:
+            self.out.append(self._with_style(raw, element, attrs.get("style")))
+        if tag not in _VOID and not self_closing:
+            self.stack.append(element)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs, self_closing=True)
+
+    def _with_style(self, raw, element, inline):
+        merged = {}
+        for rule in self.rules:
+            if rule.matches(element, self.stack):
+                for prop, value in rule.declarations:
+                    merged.pop(prop, None)
+                    merged[prop] = value
+        if not merged:
+            return raw
+        for prop, value in _declarations(inline or ""):
+            merged.pop(prop, None)
+            merged[prop] = value
+        style = ";".join(f"{p}:{v}" for p, v in merged.items())
+        if inline is not None:
+            return re.sub(r"""\sstyle\s*=\s*(".*?"|'.*?'|[^\s>]+)""", lambda m: f' style="{style}"', raw,
+                          count=1, flags=re.I | re.S)
+        return re.sub(r"\s*(/?)>$", lambda m: f' style="{style}"{m.group(1)}>', raw, count=1)
+
+    def handle_endtag(self, tag):
+        if tag == "style":
+            self.in_style = False
+            if self.residual_css and not self.style_written:
+                self.out.append(f"<style>{self.residual_css}</style>")
+                self.style_written = True
+            return
+        if tag == "head" and self.residual_css and not self.style_written:
+            self.out.append(f"<style>{self.residual_css}</style>")
+            self.style_written = True
+        for i in range(len(self.stack) - 1, -1, -1):
+            if self.stack[i][0] == tag:
+                del self.stack[i:]
+                break
+        self.out.append(f"</{tag}>")
+
+    def handle_data(self, data):
+        if not self.in_style:
+            self.out.append(re.sub(r"\s+", " ", data))
+
+    def handle_entityref(self, name):
+        self.out.append(f"&{name};")
+
+    def handle_charref(self, name):
+        self.out.append(f"&#{name};")
+
+    def handle_comment(self, data):
+        if data.startswith("[if"):
+            self.out.append(f"<!--{data}-->")  # Outlook conditional comments must survive
+
+
+def inline_css(source: str) -> str:
+    """Inline the ``<style>`` rules of an HTML template into its elements and minify it."""
+    css = "".join(re.findall(r"<style[^>]*>(.*?)</style>", source, flags=re.S | re.I))
+    rules, residual = parse_css(css)
+    inliner = _Inliner(rules, residual)
+    inliner.feed(source)
+    inliner.close()
+    html = "".join(inliner.out)
+    # Whitespace next to block-level tags never renders
+    html = re.sub(rf"\s*(</?(?:{_BLOCK})\b[^>]*>)\s*", r"\1", html, flags=re.I)
+    return html.strip()
+
+
+def sources() -> dict[str, str]:
+    """``emails/*.html`` template name -> source path, from the project template dirs."""
+    found = {}
+    for entry in settings.TEMPLATES:
+        for directory in entry.get("DIRS", []):
+            emails = os.path.join(directory, "emails")
+            if not os.path.isdir(emails):
+                continue
+            for filename in sorted(os.listdir(emails)):
+                if filename.endswith(".html"):
+                    found.setdefault(f"emails/{filename}", os.path.join(emails, filename))
+    return found
+
+
+def _read(path: str) -> str:
+    with open(path, encoding="utf-8") as fh:
+        return fh.read()
+
+
+def load_manifest(directory: str | None = None) -> dict:
+    try:
+        return json.loads(_read(os.path.join(directory or output_dir(), MANIFEST)))
+    except (OSError, ValueError):
+        return {}
+
+
+def compile_all(directory: str | None = None) -> dict:
+    """Write the inlined variant of every email template and the manifest; returns the manifest."""
+    directory = directory or output_dir()
+    os.makedirs(directory, exist_ok=True)
+    manifest = {}
+    for name, path in sources().items():
+        source = _read(path)
+        output = inline_css(source)
+        filename = name.split("/", 1)[1]
+        with open(os.path.join(directory, filename), "w", encoding="utf-8") as fh:
+            fh.write(output)
+        manifest[name] = {"file": filename, "source": fingerprint(source), "output": fingerprint(output)}
+    with open(os.path.join(directory, MANIFEST), "w", encoding="utf-8") as fh:
+        json.dump(manifest, fh, indent=2, sort_keys=True)
+    return manifest
+
+
+def compiled(name: str, source_path: str, manifest: dict, directory: str | None = None) -> str | None:
+    """The compiled text for template ``name`` if it is current, else None."""
+    entry = manifest.get(name)
+    if not entry:
+        return None
+    try:
+        if fingerprint(_read(source_path)) != entry["source"]:
+            return None
+        output = _read(os.path.join(directory or output_dir(), entry["file"]))
+    except (OSError, KeyError):
+        return None
+    return output if fingerprint(output) == entry["output"] else None
+
+
+def stale(directory: str | None = None) -> list[str]:
+    """Email templates whose compiled variant is missing or out of date."""
+    manifest = load_manifest(directory)
+    return [name for name, path in sources().items() if compiled(name, path, manifest, directory) is None]
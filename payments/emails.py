@@ -2,8 +2,7 @@ import logging
 from typing import Iterable, List
 
 from django.conf import settings
-from django.core.mail import EmailMultiAlternatives
-from django.template.loader import render_to_string
+from . import mail_templates, outbox
 
 logger = logging.getLogger(__name__)
 
@@ -31,6 +30,14 @@ def _admin_recipients() -> List[str]:
     return uniq
 
 
+def _notify_admins_now(order) -> bool:
+    """Per-payment admin email? Only without the digest, or for orders at/above the instant threshold."""
+    if not getattr(settings, "PAYMENTS_ADMIN_DIGEST", False):
+        return True
+    threshold = getattr(settings, "PAYMENTS_ADMIN_INSTANT_MIN_AMOUNT", None)
+    return threshold is not None and order.amount is not None and order.amount >= threshold
+
+
 def send_payment_confirmation(*, order) -> None:
     """Send a receipt to the customer and a notification to admins for a paid order.
 
@@ -57,24 +64,26 @@ def send_payment_confirmation(*, order) -> None:
         try:
             if order.customer_email:
                 cust_subject = f"Payment received: {order.order_id} – {order.currency} {order.amount}"
-                cust_html = render_to_string("emails/payment_receipt_customer.html", context)
-                cust_text = render_to_string("emails/payment_receipt_customer.txt", context)
-                msg = EmailMultiAlternatives(cust_subject, cust_text, from_email, [order.customer_email])
-                msg.attach_alternative(cust_html, "text/html")
-                msg.send(fail_silently=_fail_silently())
+                msg = mail_templates.message(
+                    cust_subject, [order.customer_email], context=context, from_email=from_email,
+                    text_template="emails/payment_receipt_customer.txt",
+                    html_template="emails/payment_receipt_customer.html",
+                )
+                outbox.enqueue(msg, kind="payment_confirmation", fail_silently=_fail_silently())
         except Exception:
             logger.exception("Failed to send payment receipt to %s", order.customer_email)
 
-        # Admin notification
+        # Admin notification (otherwise the order is reported by send_payment_digest)
         try:
-            admins = _admin_recipients()
+            admins = _admin_recipients() if _notify_admins_now(order) else []
             if admins:
                 admin_subject = f"New payment: {order.order_id} – {order.currency} {order.amount} ({order.status})"
-                admin_html = render_to_string("emails/payment_notification_admin.html", context)
-                admin_text = render_to_string("emails/payment_notification_admin.txt", context)
-                msg = EmailMultiAlternatives(admin_subject, admin_text, from_email, admins)
-                msg.attach_alternative(admin_html, "text/html")
-                msg.send(fail_silently=_fail_silently())
+                msg = mail_templates.message(
+                    admin_subject, admins, context=context, from_email=from_email,
+                    text_template="emails/payment_notification_admin.txt",
+                    html_template="emails/payment_notification_admin.html",
+                )
+                outbox.enqueue(msg, kind="payment_admin", fail_silently=_fail_silently())
         except Exception:
             logger.exception("Failed to send payment admin notification for %s", order.order_id)
 
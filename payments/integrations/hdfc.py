@@ -1,10 +1,13 @@
 from dotenv import load_dotenv
 load_dotenv()
 
-import os, re, json, base64
+import os, re, json, base64, threading, asyncio, weakref
+from abc import ABC, abstractmethod
 from decimal import Decimal, ROUND_HALF_UP
+import httpx
 import requests
 from requests import RequestException
+from requests.adapters import HTTPAdapter
 
 HDFC_BASE_URL    = os.getenv("HDFC_BASE_URL", "https://smartgateway.hdfcbank.com")
 HDFC_API_KEY     = os.getenv("HDFC_API_KEY", "")
@@ -14,6 +17,12 @@ HDFC_RETURN_URL  = os.getenv("HDFC_RETURN_URL", "")
 HDFC_APPEND_COLON = os.getenv("HDFC_APPEND_COLON", "false").lower() in ("1", "true", "yes")
 # UAT override: set HDFC_CLIENT_ID=hdfcmaster in .env; PROD: omit -> defaults to MID
 HDFC_CLIENT_ID   = os.getenv("HDFC_CLIENT_ID", HDFC_MERCHANT_ID)
+# Connection pool + per-endpoint timeouts (seconds). Read timeouts are split so a
+# slow /session never holds a status poll hostage for the full 30s.
+HDFC_POOL_SIZE          = int(os.getenv("HDFC_POOL_SIZE", "10"))
+HDFC_CONNECT_TIMEOUT    = float(os.getenv("HDFC_CONNECT_TIMEOUT", "5"))
+HDFC_SESSION_TIMEOUT    = float(os.getenv("HDFC_SESSION_TIMEOUT", "30"))
+HDFC_STATUS_TIMEOUT     = float(os.getenv("HDFC_STATUS_TIMEOUT", "15"))
 
 class HdfcError(Exception): pass
 
@@ -22,15 +31,6 @@ def _encode_api_key() -> str:
     raw = HDFC_API_KEY + (":" if HDFC_APPEND_COLON else "")
     return base64.b64encode(raw.encode("utf-8")).decode("utf-8")
 
-def _headers(customer_id: str) -> dict:
-    return {
-        "Authorization": f"Basic {_encode_api_key()}",
-        "Content-Type": "application/json",
-        "x-merchantid": HDFC_MERCHANT_ID,
-        "x-customerid": customer_id,
-        "x-resellerid": HDFC_RESELLER_ID,
-    }
-
 def _sanitize_order_id(order_id: str) -> str:
     return (re.sub(r"[^A-Za-z0-9]", "", order_id or ""))[:20]  # <21 alnum
 
@@ -42,12 +42,27 @@ def _amount_str(amount) -> str:
     except Exception:
         raise HdfcError("Invalid amount value")
 
-def create_session(*, order_id, amount, customer_id, customer_email, customer_phone,
-                   first_name="", last_name="", description="", currency="INR") -> dict:
+SUCCESS_STATUSES = {"CHARGED", "SUCCESS", "SUCCESSFUL", "PAID", "CAPTURED", "COMPLETED", "SETTLED"}
+
+def extract_status(data: dict) -> str:
+    """Normalized (upper-case) status from the various keys the gateway may use."""
+    if not isinstance(data, dict):
+        return ""
+    s = (data.get("status") or
+         (data.get("order") or {}).get("status") or
+         (data.get("payment") or {}).get("status") or
+         (data.get("transaction") or {}).get("status") or
+         (data.get("result") or {}).get("status") or
+         "")
+    return str(s).upper()
+
+def _session_payload(*, order_id, amount, customer_id, customer_email, customer_phone,
+                     first_name="", last_name="", description="", currency="INR", return_url=None) -> dict:
+    return_url = return_url or HDFC_RETURN_URL
     if not HDFC_MERCHANT_ID: raise HdfcError("Missing HDFC_MERCHANT_ID")
-    if not HDFC_RETURN_URL or not HDFC_RETURN_URL.startswith("https://") or "?" in HDFC_RETURN_URL:
+    if not return_url or not return_url.startswith("https://") or "?" in return_url:
         raise HdfcError("Invalid HDFC_RETURN_URL (must be HTTPS, no query params)")
-    payload = {
+    return {
         "order_id": _sanitize_order_id(order_id),
         "amount": _amount_str(amount),
         "customer_id": customer_id,
@@ -55,37 +70,204 @@ def create_session(*, order_id, amount, customer_id, customer_email, customer_ph
         "customer_phone": customer_phone,
         "payment_page_client_id": HDFC_CLIENT_ID,
         "action": "paymentPage",
-        "return_url": HDFC_RETURN_URL,
+        "return_url": return_url,
         "description": description or "Complete your payment",
         "first_name": first_name or "",
         "last_name": last_name or "",
         "currency": currency or "INR",
     }
-    url = f"{HDFC_BASE_URL}/session"
-    try:
-        resp = requests.post(url, headers=_headers(customer_id), json=payload, timeout=30)
-    except RequestException as e:
-        raise HdfcError(f"Gateway request failed: {e}")
+
+def _parse_response(resp, *, label: str, auth_hint: str, bad_request_hint: str) -> dict:
+    status_code = resp.status_code
     try: data = resp.json()
     except Exception: data = {"raw": resp.text}
-    if resp.status_code == 200: return {"ok": True, "status_code": 200, "data": data}
-    if resp.status_code == 401: hint="Check Authorization (Basic base64(API_KEY)). Toggle APPEND_COLON only if bank requires."
-    elif resp.status_code == 400: hint="Bad request: order_id/amount/return_url/client_id."
-    elif resp.status_code in (404,500): hint=f"Gateway error {resp.status_code}."
-    else: hint=f"HTTP {resp.status_code}"
-    raise HdfcError(f"Create session failed: {hint}. Response: {json.dumps(data)[:800]}")
+    if status_code == 200: return {"ok": True, "status_code": 200, "data": data}
+    if status_code == 401: hint=auth_hint
+    elif status_code == 400: hint=bad_request_hint
+    elif status_code in (404,500): hint=f"Gateway error {status_code}."
+    else: hint=f"HTTP {status_code}"
+    raise HdfcError(f"{label} failed: {hint}. Response: {json.dumps(data)[:800]}")
 
-def get_order_status(order_id: str, customer_id: str) -> dict:
-    url = f"{HDFC_BASE_URL}/orders/{_sanitize_order_id(order_id)}"
+
+class _HdfcClientBase(ABC):
+    """Settings, headers and timeouts shared by the sync and async clients."""
+
+    def __init__(self, *, base_url=None, pool_size=None, connect_timeout=None,
+                 session_timeout=None, status_timeout=None):
+        self.base_url = (base_url or HDFC_BASE_URL).rstrip("/")
+        self.pool_size = pool_size or HDFC_POOL_SIZE
+        self.connect_timeout = connect_timeout or HDFC_CONNECT_TIMEOUT
+        self.session_timeout = session_timeout or HDFC_SESSION_TIMEOUT
+        self.status_timeout = status_timeout or HDFC_STATUS_TIMEOUT
+        self._authorization = None
+        self.http = self._build_http()
+
+    def _base_headers(self) -> dict:
+        return {
+            "Content-Type": "application/json",
+            "x-merchantid": HDFC_MERCHANT_ID,
+            "x-resellerid": HDFC_RESELLER_ID,
+        }
+
+    @abstractmethod
+    def _build_http(self):
+        """The pooled HTTP client this class sends requests with."""
+
+    def _headers(self, customer_id: str) -> dict:
+        if self._authorization is None:
+            self._authorization = f"Basic {_encode_api_key()}"
+        return {"Authorization": self._authorization, "x-customerid": customer_id}
+
+
+class HdfcClient(_HdfcClientBase):
+    """Keep-alive SmartGateway client.
+
+    Holds one pooled ``requests.Session`` so repeated /session and /orders calls
+    reuse TCP+TLS connections, and builds the Basic auth header once.
+    Use ``get_client()`` for the per-process instance instead of constructing one per call.
+    """
+
+    def _build_http(self):
+        http = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        http.mount("https://", adapter)
+        http.mount("http://", adapter)
+        http.headers.update(self._base_headers())
+        return http
+
+    def create_session(self, *, order_id, amount, customer_id, customer_email, customer_phone,
+                       first_name="", last_name="", description="", currency="INR", return_url=None) -> dict:
+        payload = _session_payload(
+            order_id=order_id, amount=amount, customer_id=customer_id,
+            customer_email=customer_email, customer_phone=customer_phone,
+            first_name=first_name, last_name=last_name, description=description,
+            currency=currency, return_url=return_url,
+        )
+        try:
+            resp = self.http.post(f"{self.base_url}/session", headers=self._headers(customer_id), json=payload,
+                                  timeout=(self.connect_timeout, self.session_timeout))
+        except RequestException as e:
+            raise HdfcError(f"Gateway request failed: {e}")
+        return _parse_response(
+            resp, label="Create session",
+            auth_hint="Check Authorization (Basic base64(API_KEY)). Toggle APPEND_COLON only if bank requires.",
+            bad_request_hint="Bad request: order_id/amount/return_url/client_id.",
+        )
+
+    def get_order_status(self, order_id: str, customer_id: str) -> dict:
+        url = f"{self.base_url}/orders/{_sanitize_order_id(order_id)}"
+        try:
+            resp = self.http.get(url, headers=self._headers(customer_id),
+                                 timeout=(self.connect_timeout, self.status_timeout))
+        except RequestException as e:
+            raise HdfcError(f"Gateway request failed: {e}")
+        return _parse_response(
+            resp, label="Order status",
+            auth_hint="Check Authorization.",
+            bad_request_hint="Bad request: order_id/customer_id/headers.",
+        )
+
+    def close(self) -> None:
+        self.http.close()
+
+
+class AsyncHdfcClient(_HdfcClientBase):
+    """Non-blocking counterpart of ``HdfcClient`` built on ``httpx.AsyncClient``.
+
+    Lets an ASGI worker keep many gateway calls in flight on one event loop.
+    Bound to the loop it was created on; use ``get_async_client()``.
+    """
+
+    def _build_http(self):
+        return httpx.AsyncClient(
+            headers=self._base_headers(),
+            limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size),
+        )
+
+    def _timeout(self, read: float) -> httpx.Timeout:
+        return httpx.Timeout(read, connect=self.connect_timeout)
+
+    async def create_session(self, *, order_id, amount, customer_id, customer_email, customer_phone,
+                             first_name="", last_name="", description="", currency="INR", return_url=None) -> dict:
+        payload = _session_payload(
+            order_id=order_id, amount=amount, customer_id=customer_id,
+            customer_email=customer_email, customer_phone=customer_phone,
+            first_name=first_name, last_name=last_name, description=description,
+            currency=currency, return_url=return_url,
+        )
+        try:
+            resp = await self.http.post(f"{self.base_url}/session", headers=self._headers(customer_id), json=payload,
+                                        timeout=self._timeout(self.session_timeout))
+        except httpx.HTTPError as e:
+            raise HdfcError(f"Gateway request failed: {e}")
+        return _parse_response(
+            resp, label="Create session",
+            auth_hint="Check Authorization (Basic base64(API_KEY)). Toggle APPEND_COLON only if bank requires.",
+            bad_request_hint="Bad request: order_id/amount/return_url/client_id.",
+        )
+
+    async def get_order_status(self, order_id: str, customer_id: str) -> dict:
+        url = f"{self.base_url}/orders/{_sanitize_order_id(order_id)}"
+        try:
+            resp = await self.http.get(url, headers=self._headers(customer_id),
+                                       timeout=self._timeout(self.status_timeout))
+        except httpx.HTTPError as e:
+            raise HdfcError(f"Gateway request failed: {e}")
+        return _parse_response(
+            resp, label="Order status",
+            auth_hint="Check Authorization.",
+            bad_request_hint="Bad request: order_id/customer_id/headers.",
+        )
+
+    async def aclose(self) -> None:
+        await self.http.aclose()
+
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+def get_client() -> HdfcClient:
+    """Return the shared client for this worker process (rebuilt after fork)."""
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client is None or _client_pid != pid:
+        with _client_lock:
+            if _client is None or _client_pid != pid:
+                _client = HdfcClient()
+                _client_pid = pid
+    return _client
+
+# httpx connections belong to the loop that opened them, so async clients are per loop.
+# Under ASGI that is one client per worker process. Anything that runs a loop per
+# call (async views under WSGI, async_to_sync) gets a client per call, closed with
+# the loop, so pooling across requests needs ASGI.
+_async_clients = weakref.WeakKeyDictionary()
+
+async def _close_with_loop(client: AsyncHdfcClient) -> None:
     try:
-        resp = requests.get(url, headers=_headers(customer_id), timeout=30)
-    except RequestException as e:
-        raise HdfcError(f"Gateway request failed: {e}")
-    try: data = resp.json()
-    except Exception: data = {"raw": resp.text}
-    if resp.status_code == 200: return {"ok": True, "status_code": 200, "data": data}
-    if resp.status_code == 401: hint="Check Authorization."
-    elif resp.status_code == 400: hint="Bad request: order_id/customer_id/headers."
-    elif resp.status_code in (404,500): hint=f"Gateway error {resp.status_code}."
-    else: hint=f"HTTP {resp.status_code}"
-    raise HdfcError(f"Order status failed: {hint}. Response: {json.dumps(data)[:800]}")
+        await asyncio.get_running_loop().create_future()  # never set
+    finally:
+        # asyncio.run() cancels leftover tasks before closing its loop
+        await client.aclose()
+
+def get_async_client() -> AsyncHdfcClient:
+    """Return the async client for the running event loop."""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = _async_clients[loop] = AsyncHdfcClient()
+        client.closer = loop.create_task(_close_with_loop(client))  # tasks are only weakly held by the loop
+    return client
+
+def create_session(**kwargs) -> dict:
+    return get_client().create_session(**kwargs)
+
+def get_order_status(order_id: str, customer_id: str) -> dict:
+    return get_client().get_order_status(order_id, customer_id)
+
+async def acreate_session(**kwargs) -> dict:
+    return await get_async_client().create_session(**kwargs)
+
+async def aget_order_status(order_id: str, customer_id: str) -> dict:
+    return await get_async_client().get_order_status(order_id, customer_id)
@@ -0,0 +1,238 @@
+"""Live payment status for waiting browsers (Server-Sent Events).
+
+Writers (webhook inbox, reconcilers, status/return views) call
+``publish(order_id, ...)`` after changing a payment. On Postgres that becomes
+a ``NOTIFY payment_status`` once the transaction commits; every ASGI process
+keeps one ``LISTEN`` connection registered with its event loop and wakes the
+streams waiting on that id. A waiting client is just a parked coroutine: each
+wake reads the row on a pooled executor thread with a connection that is
+closed right after, so no thread or DB connection is held per client.
+
+Without Postgres (or if the listener drops) streams still see publishes made
+in their own process and otherwise re-read the row every
+``LIVE_STATUS_POLL_SECONDS``.
+
+A stream is only served with the signed ``stream_token()`` that the return
+and thank-you pages hand out to the customer the payment belongs to.
+"""
+import asyncio
+import json
+import logging
+import threading
+import weakref
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core import signing
+from django.db import connection, transaction
+
+from .integrations.hdfc import SUCCESS_STATUSES, _sanitize_order_id
+from .models import Order
+from .status_cache import TERMINAL_STATUSES
+
+log = logging.getLogger(__name__)
+
+CHANNEL = "payment_status"
+FINAL_STATUSES = TERMINAL_STATUSES | {"EXPIRED"}
+_TOKEN_SALT = "payments.live"
+
+
+def _key(order_id: str) -> str:
+    return _sanitize_order_id(order_id)
+
+
+def stream_token(order_id: str) -> str:
+    """Signed token letting a page subscribe to ``order_id``'s stream."""
+    return signing.dumps(_key(order_id), salt=_TOKEN_SALT, compress=True)
+
+
+def check_token(token: str, order_id: str) -> bool:
+    max_age = getattr(settings, "LIVE_STATUS_TOKEN_MAX_AGE", 24 * 3600)
+    try:
+        return signing.loads(token, salt=_TOKEN_SALT, max_age=max_age) == _key(order_id)
+    except signing.BadSignature:
+        return False
+
+
+class _Hub:
+    """Waiters for one event loop, keyed by sanitized order id."""
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.waiters: dict[str, set] = {}
+        self.listener = None
+        self.listener_tried = False
+
+    def wake(self, key: str) -> None:
+        for fut in self.waiters.pop(key, ()):
+            if not fut.done():
+                fut.set_result(True)
+
+    def subscribe(self, key: str):
+        fut = self.loop.create_future()
+        self.waiters.setdefault(key, set()).add(fut)
+        return fut
+
+    def discard(self, key: str, fut) -> None:
+        waiters = self.waiters.get(key)
+        if waiters is not None:
+            waiters.discard(fut)
+            if not waiters:
+                self.waiters.pop(key, None)
+
+    async def wait(self, key: str, fut, timeout: float) -> bool:
+        try:
+            return await asyncio.wait_for(fut, timeout)
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self.discard(key, fut)
+
+
+class _PgListener:
+    """One autocommit psycopg2 connection LISTENing on ``CHANNEL``, driven by the loop's reader callback."""
+
+    def __init__(self, hub: _Hub, conn):
+        self.hub = hub
+        self.conn = conn
+        hub.loop.add_reader(conn.fileno(), self._readable)
+
+    @classmethod
+    def connect(cls, params: dict):
+        import psycopg2
+        import psycopg2.extensions
+
+        conn = psycopg2.connect(**params)
+        conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        with conn.cursor() as cur:
+            cur.execute(f"LISTEN {CHANNEL}")
+        return conn
+
+    def _readable(self) -> None:
+        try:
+            self.conn.poll()
+        except Exception as e:
+            log.warning("payment status listener lost: %s", e)
+            self.close()
+            return
+        while self.conn.notifies:
+            self.hub.wake(self.conn.notifies.pop(0).payload)
+
+    def close(self) -> None:
+        try:
+            self.hub.loop.remove_reader(self.conn.fileno())
+            self.conn.close()
+        except Exception:
+            pass
+        self.hub.listener = None
+        self.hub.listener_tried = False
+
+
+_hubs = weakref.WeakKeyDictionary()
+_hubs_lock = threading.Lock()
+
+
+async def _hub() -> _Hub:
+    loop = asyncio.get_running_loop()
+    with _hubs_lock:
+        hub = _hubs.get(loop)
+        if hub is None:
+            hub = _hubs[loop] = _Hub(loop)
+    if not hub.listener_tried and connection.vendor == "postgresql":
+        hub.listener_tried = True
+        try:
+            conn = await loop.run_in_executor(None, _PgListener.connect, connection.get_connection_params())
+            hub.listener = _PgListener(hub, conn)
+        except Exception as e:
+            log.warning("payment status listener unavailable, polling instead: %s", e)
+    return hub
+
+
+def _notify(keys: list[str]) -> None:
+    with connection.cursor() as cur:
+        for key in keys:
+            cur.execute("SELECT pg_notify(%s, %s)", [CHANNEL, key])
+
+
+def publish(*order_ids) -> None:
+    """Wake streams waiting on any of ``order_ids`` (after the current transaction commits)."""
+    keys = sorted({_key(o) for o in order_ids if o})
+    if not keys:
+        return
+
+    def deliver():
+        with _hubs_lock:
+            hubs = list(_hubs.values())
+        for hub in hubs:
+            for key in keys:
+                try:
+                    hub.loop.call_soon_threadsafe(hub.wake, key)
+                except RuntimeError:
+                    pass  # loop already closed
+        if connection.vendor == "postgresql":
+            try:
+                _notify(keys)
+            except Exception as e:
+                log.warning("payment status notify failed: %s", e)
+
+    transaction.on_commit(deliver)
+
+
+def _read_status(order_id: str) -> str:
+    from donations.models import Donation
+
+    try:
+        status = Order.objects.filter(order_id=_key(order_id)).values_list("status", flat=True).first()
+        if status is None:
+            status = Donation.objects.filter(txn_id=order_id).values_list("status", flat=True).first()
+        return status or ""
+    finally:
+        # The stream may wait minutes before the next read; don't keep a connection for it
+        if not connection.in_atomic_block:
+            connection.close()
+
+
+async def current_status(order_id: str) -> dict:
+    """Local status of an Order (or a Donation by txn_id) as the stream reports it.
+
+    The read runs on the shared executor (not the request's thread-sensitive
+    thread) and closes its connection, so a waiting stream holds neither.
+    """
+    status = (await sync_to_async(_read_status, thread_sensitive=False)(order_id)).upper()
+    return {"order_id": order_id, "status": status, "is_paid": status in SUCCESS_STATUSES,
+            "final": status in FINAL_STATUSES}
+
+
+def _event(name: str, data: dict) -> str:
+    return f"event: {name}\ndata: {json.dumps(data)}\n\n"
+
+
+async def status_stream(order_id: str, *, poll: float | None = None, max_seconds: float | None = None):
+    """SSE lines: the current status, then each change, until it is final or ``max_seconds`` pass (``end`` event)."""
+    poll = poll or getattr(settings, "LIVE_STATUS_POLL_SECONDS", 15)
+    max_seconds = max_seconds or getattr(settings, "LIVE_STATUS_MAX_SECONDS", 300)
+    hub = await _hub()
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + max_seconds
+    key = _key(order_id)
+    last = None
+    yield f"retry: {int(poll * 1000)}\n\n"
+    while True:
+        # Subscribe before reading so a change landing in between still wakes us
+        fut = hub.subscribe(key)
+        try:
+            state = await current_status(order_id)
+            if state != last:
+                yield _event("status", state)
+                last = state
+            remaining = deadline - loop.time()
+            if state["final"]:
+                return
+            if remaining <= 0:
+                # Tell the browser to stop rather than let EventSource reconnect forever
+                yield _event("end", {"order_id": order_id})
+                return
+            if not await hub.wait(key, fut, min(poll, remaining)):
+                yield ": keepalive\n\n"
+        finally:
+            hub.discard(key, fut)
@@ -0,0 +1,112 @@
+"""Email rendering with templates resolved once per process.
+
+Each email helper used to probe ``engines["django"].get_template()`` to see
+whether an optional template exists and then load it again through
+``render_to_string``. ``get_template()`` here resolves and compiles a name at
+most once per process, remembering misses too (``email_receipt.html`` does
+not exist, so every receipt paid for a failed lookup). ``message()`` renders a
+text/HTML pair from those cached templates, each once, into one multipart
+``EmailMultiAlternatives``.
+
+HTML templates are taken from the ``compile_email_templates`` output (CSS
+inlined, minified; see ``payments.email_inline``) when its fingerprint still
+matches the source, and from the source template otherwise.
+
+The cache is cleared when ``TEMPLATES`` changes and, under ``runserver``,
+whenever the autoreloader sees a file change.
+"""
+import logging
+import threading
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.template import TemplateDoesNotExist, engines
+from django.utils.autoreload import file_changed
+
+from . import email_inline
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+_cache: dict = {}
+_manifest: dict = {}
+_lock = threading.Lock()
+
+
+def _load(name: str):
+    engine = engines["django"]
+    template = engine.get_template(name)
+    if not name.endswith(".html") or not getattr(settings, "EMAIL_USE_COMPILED_TEMPLATES", True):
+        return template
+    if "manifest" not in _manifest:
+        _manifest["manifest"] = email_inline.load_manifest()
+    manifest = _manifest["manifest"]
+    text = email_inline.compiled(name, template.origin.name, manifest)
+    if text is not None:
+        return engine.from_string(text)
+    if name in manifest:
+        logger.warning("Compiled %s is stale; using the source template (run compile_email_templates)", name)
+    return template
+
+
+def get_template(name: str):
+    """Template ``name`` ready to render, or None if it does not exist; both outcomes are cached."""
+    template = _cache.get(name)
+    if template is None:
+        try:
+            template = _load(name)
+        except TemplateDoesNotExist:
+            template = _MISSING
+        with _lock:
+            template = _cache.setdefault(name, template)
+    return None if template is _MISSING else template
+
+
+def exists(name: str) -> bool:
+    return get_template(name) is not None
+
+
+def render(name: str, context: dict) -> str:
+    template = get_template(name)
+    if template is None:
+        raise TemplateDoesNotExist(name)
+    return template.render(context)
+
+
+def message(subject: str, to: list, *, context: dict, text_template: str | None = None,
+            html_template: str | None = None, text: str | None = None,
+            from_email: str | None = None) -> EmailMultiAlternatives:
+    """Multipart message from a text/HTML template pair.
+
+    The text part comes from ``text_template`` or, if that template does not
+    exist, the literal ``text``. The HTML part is optional: a missing
+    template or a render error leaves a text-only message.
+    """
+    if text_template and (text is None or exists(text_template)):
+        text = render(text_template, context)
+    msg = EmailMultiAlternatives(subject, text or "", from_email, to)
+    if html_template and exists(html_template):
+        try:
+            msg.attach_alternative(render(html_template, context), "text/html")
+        except Exception:
+            logger.exception("Failed to render %s; sending text-only", html_template)
+    return msg
+
+
+def clear() -> None:
+    with _lock:
+        _cache.clear()
+        _manifest.clear()
+
+
+@receiver(setting_changed)
+def _templates_changed(*, setting, **kwargs):
+    if setting in ("TEMPLATES", "EMAIL_COMPILED_DIR", "EMAIL_USE_COMPILED_TEMPLATES"):
+        clear()
+
+
+@receiver(file_changed, dispatch_uid="payments.mail_templates")
+def _file_changed(**kwargs):
+    clear()
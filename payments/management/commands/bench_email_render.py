@@ -0,0 +1,69 @@
+import time
+from decimal import Decimal
+from types import SimpleNamespace
+
+from django.core.mail import EmailMultiAlternatives
+from django.core.management.base import BaseCommand
+from django.template import engines
+from django.template.loader import render_to_string
+
+from payments import mail_templates
+
+# (text template, html template) pairs as the email helpers use them
+PAIRS = {
+    "receipt": ("emails/email_receipt.txt", "emails/email_receipt.html"),
+    "payment": ("emails/payment_receipt_customer.txt", "emails/payment_receipt_customer.html"),
+}
+
+
+def _context():
+    donor = SimpleNamespace(name="Bench Devotee", email="bench@example.com")
+    donation = SimpleNamespace(amount=Decimal("1001.00"), purpose="Annadaan", issued_receipt_no="BENCH-0001",
+                               donor=donor)
+    return {
+        "donation": donation, "donor": donor, "magic_link_url": "https://example.com/claim/token",
+        "order_id": "ORDBENCH", "bank_order_id": "GW1", "amount": Decimal("1001.00"), "currency": "INR",
+        "status": "CHARGED", "customer_id": "cust", "customer_email": "bench@example.com",
+        "customer_phone": "+911234567890", "description": "Annadaan",
+    }
+
+
+def _exists(name):
+    try:
+        engines["django"].get_template(name)
+        return True
+    except Exception:
+        return False
+
+
+def _uncached(text_template, html_template, ctx):
+    # The former per-email path: probe for each template, then load it again to render
+    text = render_to_string(text_template, ctx)
+    msg = EmailMultiAlternatives("Bench", text, "from@example.com", ["bench@example.com"])
+    if _exists(html_template):
+        msg.attach_alternative(render_to_string(html_template, ctx), "text/html")
+    return msg
+
+
+def _cached(text_template, html_template, ctx):
+    return mail_templates.message("Bench", ["bench@example.com"], context=ctx, from_email="from@example.com",
+                                  text_template=text_template, html_template=html_template)
+
+
+class Command(BaseCommand):
+    help = "Micro-benchmark: emails rendered per second, per-call template lookup vs. the cached renderer"
+
+    def add_arguments(self, parser):
+        parser.add_argument("-n", "--number", type=int, default=2000, help="Emails rendered per measurement")
+
+    def handle(self, *args, **opts):
+        n = opts["number"]
+        ctx = _context()
+        for name, (text_template, html_template) in PAIRS.items():
+            for label, build in (("per-call lookup", _uncached), ("cached", _cached)):
+                build(text_template, html_template, ctx)  # warm up, fail fast on template errors
+                started = time.perf_counter()
+                for _ in range(n):
+                    build(text_template, html_template, ctx)
+                elapsed = time.perf_counter() - started
+                self.stdout.write(f"{name:8} {label:16} {n / elapsed:10.0f} emails/s")
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from payments import email_inline
+
+
+class Command(BaseCommand):
+    help = "Precompile emails/*.html templates with inlined CSS and minified markup (run at deploy)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--check", action="store_true", help="Only report templates whose compiled output is stale; exit 1 if any")
+        parser.add_argument("--output", default=None, help="Output directory (default: EMAIL_COMPILED_DIR)")
+
+    def handle(self, *args, **opts):
+        if opts["check"]:
+            stale = email_inline.stale(opts["output"])
+            for name in stale:
+                self.stdout.write(self.style.WARNING(f"stale: {name}"))
+            if stale:
+                raise CommandError(f"{len(stale)} email templates need compile_email_templates")
+            self.stdout.write(self.style.SUCCESS("Compiled email templates are up to date."))
+            return
+        manifest = email_inline.compile_all(opts["output"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Compiled {len(manifest)} email templates into {opts['output'] or email_inline.output_dir()}."))
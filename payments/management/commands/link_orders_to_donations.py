@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from payments.models import Order
+from payments.references import attach_donations
+
+
+class Command(BaseCommand):
+    help = "Backfill Order.donation for existing orders by matching txn/gateway ids, in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500, help="Orders examined per batch")
+        parser.add_argument("--dry-run", action="store_true", help="Count matches without writing")
+
+    def handle(self, *args, **opts):
+        batch_size = opts["batch_size"]
+        qs = Order.objects.filter(donation__isnull=True).only("pk", "order_id", "bank_order_id", "donation").order_by("pk")
+        last_pk = 0
+        examined = linked = 0
+        while True:
+            batch = list(qs.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            examined += len(batch)
+            changed = attach_donations(batch)
+            if changed and not opts["dry_run"]:
+                with transaction.atomic():
+                    Order.objects.bulk_update(changed, ["donation"])
+            linked += len(changed)
+        verb = "Would link" if opts["dry_run"] else "Linked"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {linked} of {examined} unlinked orders."))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from payments import outbox, reconcile
+
+
+class Command(BaseCommand):
+    help = "Send queued emails from the outbox (retrying failures with backoff)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--max", type=int, default=1000, help="Max emails to send per pass")
+        parser.add_argument("--batch", type=int, default=None, help="Emails claimed per batch (default: EMAIL_OUTBOX_BATCH)")
+        parser.add_argument("--loop", action="store_true", help="Keep running, draining every --interval seconds until SIGTERM")
+        parser.add_argument("--interval", type=float, default=2, help="Seconds between passes with --loop")
+
+    def handle(self, *args, **opts):
+        log = reconcile.command_log(self)
+
+        def drain():
+            stats = outbox.drain(batch=opts["batch"], limit=opts["max"], log=log)
+            if stats.sent or stats.retried or stats.failed or not opts["loop"]:
+                log(stats.summary(), "success")
+
+        if opts["loop"]:
+            reconcile.run_loop(drain, name="process_email_outbox", interval=opts["interval"], log=log)
+        else:
+            drain()
@@ -1,43 +1,27 @@
-import time
+import argparse
+
 from django.core.management.base import BaseCommand
-from django.utils import timezone
-from payments.models import Order
-from payments.integrations.hdfc import get_order_status, HdfcError
+
+from payments import reconcile
+
 
 class Command(BaseCommand):
     help = "Poll HDFC Order Status for pending orders and update local DB"
 
     def add_arguments(self, parser):
         parser.add_argument("--max", type=int, default=50)
-        parser.add_argument("--sleep", type=float, default=0.5)
         parser.add_argument("--older-than-minutes", type=int, default=1)
+        parser.add_argument("--workers", type=int, default=None, help="Concurrent gateway calls (default: RECONCILE_WORKERS)")
+        parser.add_argument("--qps", type=float, default=None, help="Max gateway calls per second (default: HDFC_STATUS_QPS)")
+        parser.add_argument("--chunk-size", type=int, default=None, help="Rows fetched and bulk-updated per batch")
+        parser.add_argument("--loop", action="store_true", help="Keep running, reconciling every --interval seconds until SIGTERM")
+        parser.add_argument("--interval", type=float, default=30, help="Seconds between passes with --loop")
+        # Legacy: per-call sleep from the sequential version; mapped onto --qps
+        parser.add_argument("--sleep", type=float, default=None, help=argparse.SUPPRESS)
 
     def handle(self, *args, **opts):
-        cutoff = timezone.now() - timezone.timedelta(minutes=opts["older_than_minutes"])
-        qs = Order.objects.filter(status__in=["NEW", "PENDING", "AUTHORIZED"]).filter(updated_at__lt=cutoff).order_by("updated_at")[:opts["max"]]
-
-        if not qs.exists():
-            self.stdout.write(self.style.SUCCESS("No pending orders to reconcile."))
-            return
-
-        for o in qs:
-            try:
-                result = get_order_status(o.order_id, o.customer_id)
-                data = result["data"]
-                o.status = str(data.get("status", o.status or ""))
-                o.bank_order_id = data.get("id", o.bank_order_id or "")
-                o.txn_id = data.get("txn_id", o.txn_id or "")
-                o.payment_method_type = data.get("payment_method_type", o.payment_method_type or "")
-                o.payment_method = data.get("payment_method", o.payment_method or "")
-                o.auth_type = data.get("auth_type", o.auth_type or "")
-                o.refunded = bool(data.get("refunded", o.refunded))
-                try:
-                    o.amount_refunded = data.get("amount_refunded", o.amount_refunded)
-                except Exception:
-                    pass
-                o.last_status_payload = data
-                o.save()
-                self.stdout.write(self.style.SUCCESS(f"Updated {o.order_id} -> {o.status}"))
-            except HdfcError as e:
-                self.stdout.write(self.style.WARNING(f"{o.order_id}: {e}"))
-            time.sleep(opts["sleep"])
+        qps = opts["qps"]
+        if qps is None and opts["sleep"]:
+            qps = 1 / opts["sleep"]
+        source = reconcile.OrderSource(older_than_minutes=opts["older_than_minutes"])
+        reconcile.run_command(self, source, opts, lock_name="reconcile_hdfc_orders", noun="orders", qps=qps)
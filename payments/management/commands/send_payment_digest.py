@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from payments import digest
+
+
+class Command(BaseCommand):
+    help = "Email admins one summary of the paid orders not yet reported (run from cron, e.g. daily)"
+
+    def handle(self, *args, **opts):
+        sent = digest.send_digest()
+        if sent is None:
+            self.stdout.write("No new paid orders (or no admin recipients); nothing sent.")
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Queued digest #{sent.pk} covering {sent.order_count} orders."))
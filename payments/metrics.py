@@ -0,0 +1,26 @@
+"""In-process counters for the payment paths.
+
+Counters are per worker process and reset on restart; they are meant for
+quick operational checks (e.g. how many gateway calls a cache saves), not
+as a durable metrics store.
+"""
+import threading
+from collections import Counter
+
+_lock = threading.Lock()
+_counters = Counter()
+
+
+def incr(name: str, n: int = 1) -> None:
+    with _lock:
+        _counters[name] += n
+
+
+def snapshot() -> dict:
+    with _lock:
+        return dict(_counters)
+
+
+def reset() -> None:
+    with _lock:
+        _counters.clear()
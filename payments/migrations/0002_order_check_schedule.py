@@ -0,0 +1,28 @@
+# Generated by Django 5.2.4 on 2026-10-17 23:29
+
+import payments.utils
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='check_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='next_check_at',
+            field=models.DateTimeField(blank=True, default=payments.utils.first_check_at, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', 'next_check_at'], name='order_due_check_idx'),
+        ),
+    ]
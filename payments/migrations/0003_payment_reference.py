@@ -0,0 +1,64 @@
+# Generated by Django 5.2.4 on 2026-10-17 23:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def _refs(model, columns):
+    for row in model.objects.values_list("pk", *columns).iterator(chunk_size=2000):
+        for ref in {r[:128] for r in row[1:] if r}:
+            yield ref, row[0]
+
+
+def backfill(apps, schema_editor):
+    PaymentReference = apps.get_model("payments", "PaymentReference")
+    Order = apps.get_model("payments", "Order")
+    Donation = apps.get_model("donations", "Donation")
+
+    batch = []
+    for ref, pk in _refs(Order, ("order_id", "bank_order_id", "txn_id")):
+        batch.append(PaymentReference(ref=ref, order_id=pk))
+        if len(batch) >= 2000:
+            PaymentReference.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    PaymentReference.objects.bulk_create(batch, ignore_conflicts=True)
+
+    def add_donations(donations):
+        # A ref an order already claimed gets the donation too, so it points at both rows
+        shared = list(PaymentReference.objects.filter(ref__in=donations, donation__isnull=True))
+        for r in shared:
+            r.donation_id = donations[r.ref]
+        PaymentReference.objects.bulk_update(shared, ["donation"], batch_size=2000)
+        PaymentReference.objects.bulk_create(
+            [PaymentReference(ref=ref, donation_id=pk) for ref, pk in donations.items()], ignore_conflicts=True,
+        )
+
+    donations = {}
+    for ref, pk in _refs(Donation, ("txn_id", "order_id")):
+        donations.setdefault(ref, pk)
+        if len(donations) >= 2000:
+            add_donations(donations)
+            donations = {}
+    add_donations(donations)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('donations', '0001_initial'),
+        ('payments', '0002_order_check_schedule'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentReference',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ref', models.CharField(max_length=128, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('donation', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='payment_references', to='donations.donation')),
+                ('order', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='references', to='payments.order')),
+            ],
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.4 on 2026-10-17 23:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('donations', '0004_webhook_event_ledger'),
+        ('payments', '0003_payment_reference'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='donation',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='orders', to='donations.donation'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-18 00:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0008_order_updated_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('admin_digest__isnull', True), ('status__in', ['CAPTURED', 'CHARGED', 'COMPLETED', 'PAID', 'SETTLED', 'SUCCESS', 'SUCCESSFUL'])), fields=['updated_at'], name='order_undigested_idx'),
+        ),
+    ]
@@ -1,4 +1,8 @@
 from django.db import models
+from django.utils import timezone
+
+from .integrations.hdfc import SUCCESS_STATUSES
+from .utils import first_check_at
 
 class Order(models.Model):
     order_id = models.CharField(max_length=20, unique=True, db_index=True)  # your alnum id
@@ -25,14 +29,95 @@ class Order(models.Model):
     amount_refunded = models.DecimalField(max_digits=12, decimal_places=2, default=0)
 
     metadata = models.JSONField(blank=True, null=True)
+    # Donation this order pays for (set when the two are matched; see link_orders_to_donations)
+    donation = models.ForeignKey("donations.Donation", null=True, blank=True, on_delete=models.SET_NULL,
+                                 related_name="orders")
     order_expiry = models.DateTimeField(blank=True, null=True)
+    # Admin digest that reported this paid order (NULL = not reported yet; see send_payment_digest)
+    admin_digest = models.ForeignKey("AdminDigest", null=True, blank=True, on_delete=models.SET_NULL,
+                                     related_name="orders")
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Reconciler schedule: when to poll the gateway next (NULL = settled/expired, stop polling)
+    next_check_at = models.DateTimeField(blank=True, null=True, default=first_check_at)
+    check_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "next_check_at"], name="order_due_check_idx"),
+            # my_payments_view: a customer's orders, newest first
+            models.Index(fields=["customer_id", "created_at"], name="order_customer_created_idx"),
+            # Reconciler cutoff: status__in + updated_at range
+            models.Index(fields=["status", "updated_at"], name="order_status_updated_idx"),
+            # rollup_donations: orders updated since the watermark, in any status
+            models.Index(fields=["updated_at"], name="order_updated_idx"),
+            # send_payment_digest: paid orders no digest has reported yet
+            models.Index(fields=["updated_at"], name="order_undigested_idx",
+                         condition=models.Q(admin_digest__isnull=True, status__in=sorted(SUCCESS_STATUSES))),
+        ]
+
     @property
     def is_paid(self) -> bool:
         return (self.status or "").upper() == "CHARGED"
 
     def __str__(self):
         return f"{self.order_id} ({self.status})"
+
+
+class AdminDigest(models.Model):
+    """One periodic summary of paid orders emailed to PAYMENTS_ADMIN_EMAILS."""
+    period_start = models.DateTimeField()
+    period_end = models.DateTimeField()
+    order_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Digest {self.period_start:%Y-%m-%d %H:%M} - {self.period_end:%Y-%m-%d %H:%M} ({self.order_count})"
+
+
+class PaymentReference(models.Model):
+    """Any identifier seen for a payment (our order/txn id, HDFC order id, HDFC txn id) -> its rows.
+
+    Lets a gateway callback resolve its Order/Donation with one indexed lookup
+    whichever id it carries. Maintained by ``payments.references``.
+    """
+    ref = models.CharField(max_length=128, unique=True)
+    order = models.ForeignKey(Order, null=True, blank=True, on_delete=models.CASCADE, related_name="references")
+    donation = models.ForeignKey("donations.Donation", null=True, blank=True, on_delete=models.CASCADE,
+                                 related_name="payment_references")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.ref
+
+
+class EmailOutbox(models.Model):
+    """A rendered email waiting for ``process_email_outbox``; written in the sender's transaction."""
+    STATUS_CHOICES = [
+        ("PENDING","PENDING"),
+        ("SENT","SENT"),
+        ("FAILED","FAILED"),  # gave up after EMAIL_OUTBOX_MAX_ATTEMPTS
+    ]
+    kind = models.CharField(max_length=32, blank=True, default="")  # receipt, welcome, payment_confirmation, ...
+    subject = models.CharField(max_length=255)
+    body = models.TextField(blank=True, default="")
+    html = models.TextField(blank=True, default="")
+    from_email = models.CharField(max_length=254, blank=True, default="")
+    to = models.JSONField(default=list)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default="PENDING")
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True, default="")
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    latency_ms = models.PositiveIntegerField(null=True, blank=True)  # queued -> accepted by SMTP
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "next_attempt_at"], name="email_outbox_due_idx"),
+        ]
+
+    def __str__(self):
+        return f"Email#{self.pk} {self.kind} {self.status}"
@@ -0,0 +1,150 @@
+"""Transactional email outbox.
+
+Senders still build an ``EmailMultiAlternatives`` but hand it to ``enqueue()``
+instead of calling ``send()``: the rendered message is stored as an
+``EmailOutbox`` row in the caller's transaction, so an email exists exactly
+when the state change behind it commits and no request waits on SMTP.
+
+``drain()`` (``process_email_outbox``) claims due rows with
+``SELECT ... FOR UPDATE SKIP LOCKED`` under a lease, sends each batch over one
+pooled SMTP connection (``payments.smtp``), retries failures with exponential backoff and marks a row
+FAILED after ``EMAIL_OUTBOX_MAX_ATTEMPTS``. Queue-to-SMTP latency is stored
+per row; ``email.sent``/``email.failed``/``email.latency_ms`` go to
+``payments.metrics``.
+
+With ``EMAIL_OUTBOX_ENABLED = False`` messages are sent inline as before.
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives
+from django.db import transaction
+from django.utils import timezone
+
+from . import metrics, smtp
+from .models import EmailOutbox
+
+
+def enabled() -> bool:
+    return getattr(settings, "EMAIL_OUTBOX_ENABLED", True)
+
+
+def enqueue(msg: EmailMultiAlternatives, kind: str = "", fail_silently: bool = True):
+    """Queue ``msg`` in the current transaction (or send it now when the outbox is disabled)."""
+    if not msg.recipients():
+        return None
+    if not enabled():
+        return smtp.send(msg, fail_silently=fail_silently)
+    html = next((content for content, mimetype in getattr(msg, "alternatives", []) if mimetype == "text/html"), "")
+    # Savepoint: callers swallow email errors, which must not break their transaction
+    with transaction.atomic():
+        return EmailOutbox.objects.create(
+            kind=kind, subject=msg.subject[:255], body=msg.body, html=html,
+            from_email=msg.from_email or "", to=list(msg.to) + list(msg.cc) + list(msg.bcc),
+        )
+
+
+def message(row: EmailOutbox) -> EmailMultiAlternatives:
+    msg = EmailMultiAlternatives(row.subject, row.body, row.from_email or None, row.to)
+    if row.html:
+        msg.attach_alternative(row.html, "text/html")
+    return msg
+
+
+def retry_delay(attempts: int) -> timedelta:
+    base = getattr(settings, "EMAIL_OUTBOX_RETRY_BASE", 60)
+    return timedelta(seconds=min(6 * 3600, base * 2 ** min(attempts - 1, 20)))
+
+
+class OutboxStats:
+    def __init__(self):
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+        self.latency_ms = 0
+        self.started = time.monotonic()
+
+    def summary(self) -> str:
+        avg = self.latency_ms / self.sent if self.sent else 0
+        return (
+            f"Sent {self.sent} emails (avg {avg / 1000:.1f}s after queueing), {self.retried} to retry, "
+            f"{self.failed} failed in {time.monotonic() - self.started:.1f}s."
+        )
+
+
+def _claim(batch: int) -> list[EmailOutbox]:
+    now = timezone.now()
+    lease = timedelta(seconds=getattr(settings, "EMAIL_OUTBOX_LEASE_SECONDS", 300))
+    with transaction.atomic():
+        rows = list(
+            EmailOutbox.objects.select_for_update(skip_locked=True)
+            .filter(status="PENDING", next_attempt_at__lte=now)
+            .order_by("next_attempt_at", "pk")[:batch]
+        )
+        EmailOutbox.objects.filter(pk__in=[r.pk for r in rows]).update(next_attempt_at=now + lease)
+    return rows
+
+
+_SAVE_FIELDS = ["status", "attempts", "last_error", "next_attempt_at", "sent_at", "latency_ms"]
+
+
+def _failed(row: EmailOutbox, error: Exception, stats: OutboxStats, log) -> None:
+    row.attempts += 1
+    row.last_error = f"{type(error).__name__}: {error}"[:4000]
+    if row.attempts >= getattr(settings, "EMAIL_OUTBOX_MAX_ATTEMPTS", 6):
+        row.status = "FAILED"
+        stats.failed += 1
+        metrics.incr("email.failed")
+        log(f"Email#{row.pk} ({row.kind}) failed after {row.attempts} attempts: {error}", "error")
+    else:
+        row.next_attempt_at = timezone.now() + retry_delay(row.attempts)
+        stats.retried += 1
+        log(f"Email#{row.pk} ({row.kind}) failed (attempt {row.attempts}): {error}", "warning")
+
+
+def _deliver(row: EmailOutbox, connection: smtp.PooledConnection, stats: OutboxStats, log) -> None:
+    try:
+        connection.send([message(row)])
+    except Exception as e:
+        _failed(row, e, stats, log)
+    else:
+        row.attempts += 1
+        row.status = "SENT"
+        row.sent_at = timezone.now()
+        row.latency_ms = max(0, int((row.sent_at - row.created_at).total_seconds() * 1000))
+        row.last_error = ""
+        stats.sent += 1
+        stats.latency_ms += row.latency_ms
+        metrics.incr("email.sent")
+        metrics.incr("email.latency_ms", row.latency_ms)
+    row.save(update_fields=_SAVE_FIELDS)
+
+
+def drain(*, batch: int | None = None, limit: int = 1000, log=None) -> OutboxStats:
+    """Send up to ``limit`` due emails, ``batch`` at a time over one pooled SMTP connection each."""
+    batch = batch or getattr(settings, "EMAIL_OUTBOX_BATCH", 50)
+    log = log or (lambda message, level="info": None)
+    stats = OutboxStats()
+    remaining = limit
+    while remaining > 0:
+        rows = _claim(min(batch, remaining))
+        if not rows:
+            break
+        remaining -= len(rows)
+        try:
+            connection = smtp.acquire()
+        except Exception as e:
+            # SMTP unreachable: every row in the batch counts a failed attempt
+            log(f"SMTP connection failed: {e}", "error")
+            for row in rows:
+                _failed(row, e, stats, log)
+                row.save(update_fields=_SAVE_FIELDS)
+            continue
+        try:
+            for row in rows:
+                _deliver(row, connection, stats, log)
+        finally:
+            smtp.release(connection)
+    return stats
+
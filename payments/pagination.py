@@ -0,0 +1,87 @@
+"""Keyset ("cursor") pagination over ``(created_at, pk)``, newest first.
+
+OFFSET pagination reads and throws away every row before the page and needs
+a COUNT(*) to know whether there is a next page; both grow with the length of
+the history. Here each page continues strictly after (or before) the last row
+the client saw, which the ``(owner, created_at)`` indexes answer directly, and
+one extra row is fetched to tell whether there is a further page.
+
+Cursors are opaque, signed tokens: clients hand back ``next_cursor`` or
+``prev_cursor`` unchanged. A tampered or malformed cursor raises
+``InvalidCursor``.
+"""
+from dataclasses import dataclass
+
+from django.core import signing
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+_SALT = "payments.pagination"
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+@dataclass
+class KeysetPage:
+    items: list
+    next_cursor: str | None = None
+    prev_cursor: str | None = None
+
+    @property
+    def has_next(self) -> bool:
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self) -> bool:
+        return self.prev_cursor is not None
+
+
+def encode_cursor(obj, direction: str) -> str:
+    return signing.dumps([obj.created_at.isoformat(), obj.pk, direction], salt=_SALT)
+
+
+def decode_cursor(cursor: str):
+    """``(created_at, pk, direction)`` from a cursor made by ``encode_cursor``."""
+    try:
+        created, pk, direction = signing.loads(cursor, salt=_SALT)
+        created = parse_datetime(created)
+    except (signing.BadSignature, TypeError, ValueError) as e:
+        raise InvalidCursor("Invalid cursor") from e
+    if created is None or not isinstance(pk, int) or direction not in ("next", "prev"):
+        raise InvalidCursor("Invalid cursor")
+    return created, pk, direction
+
+
+def paginate(qs, cursor: str | None, page_size: int) -> KeysetPage:
+    """One page of ``qs`` (newest first) starting at ``cursor``; None/"" means the first page."""
+    if not cursor:
+        rows = list(qs.order_by("-created_at", "-pk")[:page_size + 1])
+        items = rows[:page_size]
+        return KeysetPage(items, next_cursor=_cursor(items, len(rows) > page_size, "next"))
+
+    created, pk, direction = decode_cursor(cursor)
+    if direction == "next":
+        rows = list(
+            qs.filter(created_at__lte=created).filter(Q(created_at__lt=created) | Q(pk__lt=pk))
+            .order_by("-created_at", "-pk")[:page_size + 1]
+        )
+        items = rows[:page_size]
+        return KeysetPage(items, next_cursor=_cursor(items, len(rows) > page_size, "next"),
+                          prev_cursor=_cursor(items, True, "prev"))
+
+    # Walking back towards newer rows: read them oldest first, then flip
+    rows = list(
+        qs.filter(created_at__gte=created).filter(Q(created_at__gt=created) | Q(pk__gt=pk))
+        .order_by("created_at", "pk")[:page_size + 1]
+    )
+    items = rows[:page_size][::-1]
+    return KeysetPage(items, next_cursor=_cursor(items, True, "next"),
+                      prev_cursor=_cursor(items, len(rows) > page_size, "prev"))
+
+
+def _cursor(items, more: bool, direction: str) -> str | None:
+    if not items or not more:
+        return None
+    return encode_cursor(items[-1] if direction == "next" else items[0], direction)
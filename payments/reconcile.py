@@ -0,0 +1,368 @@
+"""Concurrent, rate-limited reconciliation of pending payments against HDFC.
+
+A *source* describes what to reconcile (Orders, Donations, ...): which rows
+are candidates, how to ask the gateway about one, and how to apply a batch of
+results. ``run()`` walks candidates in keyset-paginated chunks, checks status
+through a bounded thread pool throttled by a token bucket (HDFC's allowed
+QPS), and hands each chunk's results back to the source to write in bulk.
+
+Each row carries its own schedule (``next_check_at``/``check_count``): only
+rows that are due are fetched, the gap between checks doubles with every
+check, and polling stops at the order's expiry, after which still-pending
+rows are marked EXPIRED. Orders long past expiry are expired in bulk;
+overdue donations get one last gateway check first.
+
+Only gateway calls run in worker threads (straight to the client, not
+through the status cache, which may live in the DB); all ORM work stays on
+the calling thread, and rows settled meanwhile by the webhook or a return
+page are left alone.
+
+``run_command()`` is the ``handle()`` of both reconcile commands: a pass
+with nothing due or overdue returns before taking the lock or starting
+workers. ``run_loop()`` keeps a reconciler resident (warm DB connection and gateway
+session, no per-run Django start-up) and takes a Postgres advisory lock
+around every pass so two nodes never work the same batch concurrently.
+"""
+import signal
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import live, references
+from .integrations.hdfc import HdfcError, get_order_status
+from .models import Order
+
+PENDING_ORDER_STATUSES = ["NEW", "PENDING", "AUTHORIZED"]
+
+
+def max_age() -> timedelta:
+    """How long an order without a gateway expiry is polled at all."""
+    return timedelta(hours=getattr(settings, "RECONCILE_MAX_AGE_HOURS", 72))
+
+
+def expiry_grace() -> timedelta:
+    return timedelta(seconds=getattr(settings, "RECONCILE_EXPIRY_GRACE", 3600))
+
+
+def schedule_next_check(check_count: int, now, expires_at=None):
+    """Due time after ``check_count`` checks: base delay doubling per check, capped, never past expiry."""
+    base = getattr(settings, "RECONCILE_BACKOFF_BASE", 60)
+    cap = getattr(settings, "RECONCILE_BACKOFF_MAX", 6 * 3600)
+    due = now + timedelta(seconds=min(cap, base * 2 ** min(check_count, 20)))
+    if expires_at is not None and due > expires_at:
+        due = max(expires_at, now)
+    return due
+
+
+class TokenBucket:
+    """Thread-safe token bucket; ``acquire()`` blocks until a token is available."""
+
+    def __init__(self, rate: float, burst: int | None = None):
+        self.rate = float(rate)
+        self.capacity = float(burst or max(1, int(rate)))
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class ReconcileStats:
+    def __init__(self):
+        self.checked = 0
+        self.updated = 0
+        self.expired = 0
+        self.errors = 0
+        self.started = time.monotonic()
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    @property
+    def rate(self) -> float:
+        return self.checked / self.elapsed if self.elapsed > 0 else 0.0
+
+    def summary(self, noun: str = "orders") -> str:
+        return (
+            f"Checked {self.checked}, updated {self.updated} {noun}, expired {self.expired}, {self.errors} errors "
+            f"in {self.elapsed:.1f}s ({self.rate:.1f}/s)."
+        )
+
+
+def _keyset_chunks(qs, order_field: str, chunk_size: int, limit: int):
+    """Yield lists of rows ordered by (order_field, pk) without OFFSET scans."""
+    qs = qs.order_by(order_field, "pk")
+    last = None
+    remaining = limit
+    while remaining > 0:
+        page = qs
+        if last is not None:
+            value, pk = last
+            page = page.filter(Q(**{f"{order_field}__gt": value}) | Q(**{order_field: value, "pk__gt": pk}))
+        rows = list(page[: min(chunk_size, remaining)])
+        if not rows:
+            return
+        # Take the cursor before yielding: the caller may rewrite order_field
+        last = (getattr(rows[-1], order_field), rows[-1].pk)
+        remaining -= len(rows)
+        yield rows
+
+
+def run(source, *, limit: int, chunk_size: int | None = None, workers: int | None = None,
+        qps: float | None = None, log=None) -> ReconcileStats:
+    """Reconcile up to ``limit`` candidates from ``source``; returns throughput stats.
+
+    ``log(message, level)`` receives per-row outcomes; level is one of
+    "success", "warning", "error" or "info".
+    """
+    chunk_size = chunk_size or getattr(settings, "RECONCILE_CHUNK_SIZE", 200)
+    workers = workers or getattr(settings, "RECONCILE_WORKERS", 8)
+    qps = getattr(settings, "HDFC_STATUS_QPS", 10) if qps is None else qps
+    log = log or (lambda message, level="info": None)
+
+    stats = ReconcileStats()
+    bucket = TokenBucket(qps)
+    # Rows long past expiry never need a gateway call; retire them in one UPDATE
+    stats.expired += source.expire_overdue(timezone.now())
+
+    def check(obj):
+        bucket.acquire()
+        return get_order_status(*source.identity(obj))
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="reconcile") as pool:
+        for chunk in _keyset_chunks(source.candidates(), source.order_field, chunk_size, limit):
+            futures = {pool.submit(check, obj): obj for obj in chunk}
+            results = []
+            for fut in as_completed(futures):
+                obj = futures[fut]
+                stats.checked += 1
+                try:
+                    results.append((obj, fut.result().get("data") or {}))
+                except HdfcError as e:
+                    stats.errors += 1
+                    log(f"{source.label(obj)}: {e}", "warning")
+                except Exception as e:
+                    stats.errors += 1
+                    log(f"{source.label(obj)}: error {e}", "error")
+            if results:
+                updated, expired = source.apply(results, log)
+                stats.updated += updated
+                stats.expired += expired
+    return stats
+
+
+@contextmanager
+def advisory_lock(name: str):
+    """Postgres session advisory lock; yields False when another process holds it.
+
+    Other database backends have no advisory locks and always yield True.
+    """
+    if connection.vendor != "postgresql":
+        yield True
+        return
+    key = zlib.crc32(name.encode("utf-8"))
+    with connection.cursor() as cur:
+        cur.execute("SELECT pg_try_advisory_lock(%s)", [key])
+        acquired = cur.fetchone()[0]
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            with connection.cursor() as cur:
+                cur.execute("SELECT pg_advisory_unlock(%s)", [key])
+
+
+def _drop_broken_connections() -> None:
+    # Keep healthy connections open between passes; only discard ones that died
+    for conn in connections.all(initialized_only=True):
+        if conn.connection is not None and not conn.is_usable():
+            conn.close()
+
+
+@contextmanager
+def _stop_on_signals(stop: threading.Event):
+    if threading.current_thread() is not threading.main_thread():
+        yield
+        return
+    previous = {sig: signal.getsignal(sig) for sig in (signal.SIGTERM, signal.SIGINT)}
+    for sig in previous:
+        signal.signal(sig, lambda signum, frame: stop.set())
+    try:
+        yield
+    finally:
+        for sig, handler in previous.items():
+            signal.signal(sig, handler)
+
+
+def run_locked(source, *, lock_name: str, noun: str, log, **run_kwargs) -> ReconcileStats | None:
+    """One reconcile pass under ``advisory_lock(lock_name)``; None if another node holds it."""
+    with advisory_lock(lock_name) as acquired:
+        if not acquired:
+            log(f"Another {lock_name} is running; skipping this pass.", "warning")
+            return None
+        stats = run(source, log=log, **run_kwargs)
+    log(stats.summary(noun), "success")
+    return stats
+
+
+def run_loop(pass_fn, *, name: str, interval: float, log, stop=None) -> None:
+    """Call ``pass_fn()`` every ``interval`` seconds until SIGTERM/SIGINT (or ``stop`` is set).
+
+    A signal lets the current pass finish before the loop exits. A failing
+    pass is logged and the loop carries on with fresh DB connections.
+    """
+    stop = stop or threading.Event()
+    with _stop_on_signals(stop):
+        log(f"{name}: looping every {interval:g}s", "info")
+        while not stop.is_set():
+            _drop_broken_connections()
+            try:
+                pass_fn()
+            except Exception as e:
+                log(f"{name} pass failed: {e}", "error")
+                connections.close_all()
+            stop.wait(interval)
+        log(f"{name}: stopped", "info")
+
+
+def has_work(source, now) -> bool:
+    """Whether a pass would do anything: rows due for a check, or overdue rows to retire."""
+    return source.candidates().exists() or source.overdue(now).exists()
+
+
+def run_command(command, source, opts, *, lock_name: str, noun: str, qps: float | None = None) -> None:
+    """One reconcile pass for a management command, or one every ``--interval`` seconds with ``--loop``."""
+    log = command_log(command)
+    run_kwargs = dict(
+        lock_name=lock_name, noun=noun, log=log, limit=opts["max"], chunk_size=opts["chunk_size"],
+        workers=opts["workers"], qps=opts["qps"] if qps is None else qps,
+    )
+
+    def one_pass(quiet=False):
+        if not has_work(source, timezone.now()):
+            if not quiet:
+                log(f"No pending {noun} to reconcile.", "success")
+            return None
+        return run_locked(source, **run_kwargs)
+
+    if opts["loop"]:
+        run_loop(lambda: one_pass(quiet=True), name=lock_name, interval=opts["interval"], log=log)
+    else:
+        one_pass()
+
+
+def command_log(command):
+    """``log`` callback writing styled lines to a management command's stdout."""
+    styles = {"success": command.style.SUCCESS, "warning": command.style.WARNING, "error": command.style.ERROR}
+
+    def log(message, level="info"):
+        style = styles.get(level)
+        command.stdout.write(style(message) if style else message)
+    return log
+
+
+class OrderSource:
+    """Pending ``payments.Order`` rows that are due and not touched for ``older_than_minutes``."""
+
+    order_field = "next_check_at"
+    fields = [
+        "status", "bank_order_id", "txn_id", "payment_method_type", "payment_method",
+        "auth_type", "refunded", "amount_refunded", "last_status_payload", "updated_at",
+        "next_check_at", "check_count", "donation",
+    ]
+
+    def __init__(self, older_than_minutes: int = 1):
+        self.older_than_minutes = older_than_minutes
+
+    def candidates(self):
+        now = timezone.now()
+        cutoff = now - timezone.timedelta(minutes=self.older_than_minutes)
+        return (
+            Order.objects.filter(status__in=PENDING_ORDER_STATUSES, next_check_at__lte=now, updated_at__lt=cutoff)
+            .only("order_id", "customer_id", "created_at", "order_expiry",
+                  *[f for f in self.fields if f != "last_status_payload"])
+        )
+
+    def expires_at(self, o):
+        return o.order_expiry or (o.created_at + max_age())
+
+    def overdue(self, now):
+        stale = now - expiry_grace()
+        return (
+            Order.objects.filter(status__in=PENDING_ORDER_STATUSES)
+            .filter(Q(order_expiry__lt=stale) | Q(order_expiry__isnull=True, created_at__lt=stale - max_age()))
+        )
+
+    def expire_overdue(self, now) -> int:
+        return self.overdue(now).update(status="EXPIRED", next_check_at=None, updated_at=now)
+
+    def identity(self, o):
+        return o.order_id, o.customer_id
+
+    def label(self, o):
+        return o.order_id
+
+    def apply(self, results, log) -> tuple[int, int]:
+        now = timezone.now()
+        expired = set()
+        previous = {o.pk: o.status for o, _ in results}
+        for o, data in results:
+            o.status = str(data.get("status", o.status or ""))
+            o.bank_order_id = data.get("id", o.bank_order_id or "")
+            o.txn_id = data.get("txn_id", o.txn_id or "")
+            o.payment_method_type = data.get("payment_method_type", o.payment_method_type or "")
+            o.payment_method = data.get("payment_method", o.payment_method or "")
+            o.auth_type = data.get("auth_type", o.auth_type or "")
+            o.refunded = bool(data.get("refunded", o.refunded))
+            if data.get("amount_refunded") is not None:
+                o.amount_refunded = data["amount_refunded"]
+            o.last_status_payload = data
+            o.updated_at = now  # bulk_update skips auto_now
+            o.check_count += 1
+            if o.status not in PENDING_ORDER_STATUSES:
+                o.next_check_at = None
+            elif now >= self.expires_at(o):
+                o.status, o.next_check_at = "EXPIRED", None
+                expired.add(o.pk)
+            else:
+                o.next_check_at = schedule_next_check(o.check_count, now, self.expires_at(o))
+        references.attach_donations([o for o, _ in results])
+        with transaction.atomic():
+            # Only touch rows still pending; the webhook or a return page may have settled them meanwhile
+            still_pending = set(
+                Order.objects.select_for_update()
+                .filter(pk__in=list(previous), status__in=PENDING_ORDER_STATUSES)
+                .values_list("pk", flat=True)
+            )
+            orders = [o for o, _ in results if o.pk in still_pending]
+            Order.objects.bulk_update(orders, self.fields)
+        live.publish(*[o.order_id for o in orders if o.status != previous[o.pk]])
+        references.index(((o.order_id, o.bank_order_id, o.txn_id), o, None) for o, _ in results)
+        for o, _ in results:
+            if o.pk in still_pending:
+                log(f"Updated {o.order_id} -> {o.status}", "success")
+            else:
+                log(f"{o.order_id}: settled meanwhile, left as is", "info")
+        expired &= still_pending
+        return len(orders) - len(expired), len(expired)
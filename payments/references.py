@@ -0,0 +1,138 @@
+"""Single-query resolution of payment identifiers to Order/Donation rows.
+
+Gateway callbacks and return pages may carry our txn id, the HDFC order id or
+the HDFC txn id. Every id we learn is written to ``PaymentReference`` so
+``find_donation``/``find_order`` need one indexed ``ref IN (...)`` query
+instead of probing ``txn_id`` and ``order_id`` column by column.
+
+Rows created before the index existed (or by code that does not call
+``link``) are found by one fallback query on the id columns and indexed on
+the spot.
+"""
+from django.db.models import Q
+
+from .models import Order, PaymentReference
+
+
+def _clean(refs) -> list[str]:
+    seen = []
+    for ref in refs:
+        ref = str(ref or "").strip()[:128]
+        if ref and ref not in seen:
+            seen.append(ref)
+    return seen
+
+
+def index(entries) -> None:
+    """Record ``(refs, order, donation)`` entries in bulk; either row may be None."""
+    rows = {}
+    for refs, order, donation in entries:
+        for ref in _clean(refs):
+            rows[ref] = (order, donation)
+    if not rows:
+        return
+    existing = {r.ref: r for r in PaymentReference.objects.filter(ref__in=list(rows))}
+    new, changed = [], []
+    for ref, (order, donation) in rows.items():
+        r = existing.get(ref)
+        if r is None:
+            new.append(PaymentReference(ref=ref, order=order, donation=donation))
+            continue
+        dirty = False
+        if order is not None and r.order_id != order.pk:
+            r.order, dirty = order, True
+        if donation is not None and r.donation_id != donation.pk:
+            r.donation, dirty = donation, True
+        if dirty:
+            changed.append(r)
+    if new:
+        PaymentReference.objects.bulk_create(new, ignore_conflicts=True)
+    if changed:
+        PaymentReference.objects.bulk_update(changed, ["order", "donation"])
+
+
+def link(*refs, order=None, donation=None) -> None:
+    """Map each of ``refs`` to ``order`` and/or ``donation``."""
+    index([(refs, order, donation)])
+
+
+def _resolve(refs: list[str], field: str, related: tuple):
+    hits = {
+        r.ref: getattr(r, field)
+        for r in PaymentReference.objects.filter(ref__in=refs, **{f"{field}__isnull": False})
+        .select_related(*related)
+    }
+    for ref in refs:
+        if ref in hits:
+            return hits[ref]
+    return None
+
+
+def _rank(obj, refs: list[str], columns: tuple[str, ...]) -> tuple:
+    # Earlier refs win; within a ref, earlier columns win (same priority as the old lookup chains)
+    return min(
+        (i, j) for i, ref in enumerate(refs) for j, col in enumerate(columns) if getattr(obj, col) == ref
+    )
+
+
+def find_donation(*refs):
+    """Donation (with donor and receipt) for the first of ``refs`` that identifies one, else None."""
+    from donations.models import Donation
+
+    refs = _clean(refs)
+    if not refs:
+        return None
+    donation = _resolve(refs, "donation", ("donation__donor", "donation__receipt"))
+    if donation is None:
+        columns = ("txn_id", "order_id")
+        matches = list(
+            Donation.objects.filter(Q(txn_id__in=refs) | Q(order_id__in=refs)).select_related("donor", "receipt")
+        )
+        if matches:
+            donation = min(matches, key=lambda d: _rank(d, refs, columns))
+            link(donation.txn_id, donation.order_id, donation=donation)
+    return donation
+
+
+def find_order(*refs):
+    """Order for the first of ``refs`` that identifies one, else None."""
+    refs = _clean(refs)
+    if not refs:
+        return None
+    order = _resolve(refs, "order", ("order",))
+    if order is None:
+        columns = ("order_id", "bank_order_id", "txn_id")
+        matches = list(Order.objects.filter(Q(order_id__in=refs) | Q(bank_order_id__in=refs) | Q(txn_id__in=refs)))
+        if matches:
+            order = min(matches, key=lambda o: _rank(o, refs, columns))
+            link(order.order_id, order.bank_order_id, order.txn_id, order=order)
+    return order
+
+
+def attach_donations(orders) -> list:
+    """Set ``Order.donation`` for unlinked orders from id matches; returns the orders changed (not saved).
+
+    An order pays for the donation whose txn_id is its order_id (we send the
+    txn_id as the gateway order id) or whose gateway id is its bank_order_id.
+    """
+    from donations.models import Donation
+
+    orders = [o for o in orders if o.donation_id is None]
+    order_ids = [o.order_id for o in orders if o.order_id]
+    bank_ids = [o.bank_order_id for o in orders if o.bank_order_id]
+    if not orders:
+        return []
+    by_txn, by_gateway = {}, {}
+    for pk, txn_id, gateway_id in Donation.objects.filter(
+        Q(txn_id__in=order_ids) | Q(order_id__in=bank_ids)
+    ).values_list("pk", "txn_id", "order_id"):
+        by_txn[txn_id] = pk
+        if gateway_id:
+            by_gateway.setdefault(gateway_id, pk)
+    changed = []
+    for o in orders:
+        pk = by_txn.get(o.order_id) or (by_gateway.get(o.bank_order_id) if o.bank_order_id else None)
+        if pk:
+            o.donation_id = pk
+            changed.append(o)
+    return changed
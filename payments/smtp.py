@@ -0,0 +1,163 @@
+"""Per-process pool of warm, authenticated SMTP connections.
+
+``msg.send()`` opens a connection, logs in, sends one message and quits. The
+pool keeps up to ``SMTP_POOL_SIZE`` backends from ``get_connection()`` open
+between sends, so the outbox worker and the inline senders (OTP codes, or
+everything with ``EMAIL_OUTBOX_ENABLED = False``) pay the TCP/TLS/AUTH
+handshake once per connection, not once per message.
+
+A connection idle for more than ``SMTP_POOL_PROBE_AFTER`` seconds is checked
+with ``NOOP`` before reuse; one idle longer than ``SMTP_POOL_MAX_IDLE`` (servers
+drop quiet sessions) or that has sent ``SMTP_POOL_MAX_MESSAGES`` is replaced.
+A send that finds the socket dropped reconnects and retries that message once.
+"""
+import atexit
+import logging
+import os
+import smtplib
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.mail import get_connection
+
+log = logging.getLogger(__name__)
+
+# Errors meaning the server went away before taking the message: safe to resend
+_DROPPED = (smtplib.SMTPServerDisconnected, ConnectionResetError, BrokenPipeError)
+
+
+class PooledConnection:
+    """One email backend kept open across sends."""
+
+    def __init__(self):
+        self.backend_path = settings.EMAIL_BACKEND
+        self.backend = get_connection(fail_silently=False)
+        self.last_used = time.monotonic()
+        self.sent = 0
+
+    @property
+    def _smtp(self):
+        # Only SMTP backends hold a socket; console/locmem backends have nothing to keep warm
+        return getattr(self.backend, "connection", None)
+
+    def _alive(self) -> bool:
+        try:
+            return self._smtp.noop()[0] == 250
+        except Exception:
+            return False
+
+    def reconnect(self) -> None:
+        try:
+            self.backend.close()
+        except Exception:
+            pass
+        if hasattr(self.backend, "connection"):
+            self.backend.connection = None
+        self.backend.open()
+        self.sent = 0
+
+    def ensure_open(self) -> None:
+        idle = time.monotonic() - self.last_used
+        if self._smtp is None:
+            self.backend.open()
+        elif idle > getattr(settings, "SMTP_POOL_MAX_IDLE", 240):
+            self.reconnect()
+        elif idle > getattr(settings, "SMTP_POOL_PROBE_AFTER", 15) and not self._alive():
+            log.info("SMTP connection went stale; reconnecting")
+            self.reconnect()
+
+    def send(self, messages) -> int:
+        """Send ``messages`` on this connection, reconnecting once if the server dropped it."""
+        try:
+            sent = self.backend.send_messages(messages)
+        except _DROPPED:
+            self.reconnect()
+            sent = self.backend.send_messages(messages)
+        self.sent += sent or 0
+        self.last_used = time.monotonic()
+        return sent
+
+    def close(self) -> None:
+        try:
+            self.backend.close()
+        except Exception:
+            pass
+
+
+class SmtpPool:
+    def __init__(self):
+        self._idle: list[PooledConnection] = []
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def acquire(self) -> PooledConnection:
+        with self._lock:
+            if self._pid != os.getpid():
+                # Forked worker: never share the parent's sockets
+                self._idle, self._pid = [], os.getpid()
+            conn = self._idle.pop() if self._idle else None
+        if conn is not None and conn.backend_path != settings.EMAIL_BACKEND:
+            conn.close()
+            conn = None
+        conn = conn or PooledConnection()
+        conn.ensure_open()
+        return conn
+
+    def release(self, conn: PooledConnection) -> None:
+        if conn.sent < getattr(settings, "SMTP_POOL_MAX_MESSAGES", 100):
+            with self._lock:
+                if len(self._idle) < getattr(settings, "SMTP_POOL_SIZE", 2):
+                    self._idle.append(conn)
+                    return
+        conn.close()
+
+    def close_all(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+_pool = SmtpPool()
+atexit.register(_pool.close_all)
+
+
+def acquire() -> PooledConnection:
+    """A warm connection for a batch of sends; hand it back with ``release()``."""
+    return _pool.acquire()
+
+
+def release(conn: PooledConnection) -> None:
+    _pool.release(conn)
+
+
+@contextmanager
+def connection():
+    """``acquire()``/``release()`` as a block; the connection is dropped instead if the block raises."""
+    conn = _pool.acquire()
+    try:
+        yield conn
+    except BaseException:
+        conn.close()
+        raise
+    _pool.release(conn)
+
+
+def send(msg, fail_silently: bool = False) -> int:
+    """``msg.send()`` over a pooled connection."""
+    if not msg.recipients():
+        return 0
+    try:
+        with connection() as conn:
+            return conn.send([msg])
+    except Exception:
+        if not fail_silently:
+            raise
+        log.exception("Failed to send email %r", msg.subject)
+        return 0
+
+
+def close_all() -> None:
+    _pool.close_all()
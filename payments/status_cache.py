@@ -0,0 +1,147 @@
+"""Short-TTL cache in front of HDFC order status with single-flight coalescing.
+
+The return page, the status API and the thank-you page all ask the gateway
+about the same order within seconds (reconcilers go to the gateway directly). Results are cached per
+sanitized order_id and customer id (the gateway only answers for the
+customer the order belongs to, so a result fetched for one customer is never
+served to a caller passing another): settled orders (CHARGED/FAILED) for a
+long time, anything still in flight for a few seconds. Concurrent misses for
+one order inside a process share a single gateway request.
+
+The cache is ``CACHES["default"]``: Redis when ``REDIS_URL`` is set, so
+``invalidate()`` from the webhook worker reaches every web process, otherwise
+a per-process memory cache where only the short pending TTL bounds staleness.
+
+Counters (``status_cache.hit``, ``.miss``, ``.coalesced``) go to ``payments.metrics``.
+"""
+import asyncio
+import hashlib
+import threading
+import weakref
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import metrics
+from .integrations.hdfc import (
+    SUCCESS_STATUSES,
+    _sanitize_order_id,
+    aget_order_status,
+    extract_status,
+    get_order_status,
+)
+
+TERMINAL_STATUSES = SUCCESS_STATUSES | {"FAILED"}
+
+_KEY_PREFIX = "hdfc:status:"
+
+
+def _key(order_id: str, customer_id: str) -> str:
+    # Customer ids are emails/phones: hash them to keep keys short and backend-safe
+    customer = hashlib.sha256((customer_id or "").encode("utf-8")).hexdigest()[:16]
+    return f"{_KEY_PREFIX}{_sanitize_order_id(order_id)}:{customer}"
+
+
+def _ttl(result: dict) -> int:
+    if extract_status(result.get("data") or {}) in TERMINAL_STATUSES:
+        return getattr(settings, "HDFC_STATUS_CACHE_TERMINAL_TTL", 3600)
+    return getattr(settings, "HDFC_STATUS_CACHE_PENDING_TTL", 5)
+
+
+def _store(key: str, result: dict) -> None:
+    ttl = _ttl(result)
+    if ttl > 0:
+        cache.set(key, result, ttl)
+
+
+def invalidate(order_id: str, customer_id: str) -> None:
+    """Drop a cached status, e.g. after a webhook changed the order."""
+    cache.delete(_key(order_id, customer_id))
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+_flights: dict = {}
+_flights_lock = threading.Lock()
+# asyncio tasks are loop-bound, so in-flight async fetches are tracked per loop
+_async_flights = weakref.WeakKeyDictionary()
+
+
+def order_status(order_id: str, customer_id: str, *, force: bool = False) -> dict:
+    """Cached ``get_order_status``; ``force`` skips the cache read but still refreshes it."""
+    key = _key(order_id, customer_id)
+    if not force:
+        cached = cache.get(key)
+        if cached is not None:
+            metrics.incr("status_cache.hit")
+            return dict(cached)
+
+    with _flights_lock:
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _flights[key] = _Flight()
+
+    if not leader:
+        metrics.incr("status_cache.coalesced")
+        flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return dict(flight.result)
+
+    metrics.incr("status_cache.miss")
+    try:
+        flight.result = get_order_status(order_id, customer_id)
+        _store(key, flight.result)
+        return dict(flight.result)
+    except Exception as e:
+        flight.error = e
+        raise
+    finally:
+        with _flights_lock:
+            _flights.pop(key, None)
+        flight.done.set()
+
+
+async def aorder_status(order_id: str, customer_id: str, *, force: bool = False) -> dict:
+    """Async ``order_status``; coalesces concurrent misses on the running loop."""
+    key = _key(order_id, customer_id)
+    if not force:
+        cached = await cache.aget(key)
+        if cached is not None:
+            metrics.incr("status_cache.hit")
+            return dict(cached)
+
+    loop = asyncio.get_running_loop()
+    inflight = _async_flights.setdefault(loop, {})
+    task = inflight.get(key)
+    if task is not None:
+        metrics.incr("status_cache.coalesced")
+        return dict(await asyncio.shield(task))
+
+    async def _fetch():
+        try:
+            result = await aget_order_status(order_id, customer_id)
+            ttl = _ttl(result)
+            if ttl > 0:
+                await cache.aset(key, result, ttl)
+            return result
+        finally:
+            inflight.pop(key, None)
+
+    metrics.incr("status_cache.miss")
+    task = inflight[key] = loop.create_task(_fetch())
+    return dict(await asyncio.shield(task))
+
+
+def stats() -> dict:
+    counters = metrics.snapshot()
+    return {
+        name: counters.get(f"status_cache.{name}", 0)
+        for name in ("hit", "miss", "coalesced")
+    }
@@ -1,3 +1,941 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import os
+import smtplib
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import httpx
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail import EmailMultiAlternatives
+from django.core.management import CommandError, call_command
+from django.db import connection, connections
+from asgiref.sync import async_to_sync, sync_to_async
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import digest, email_inline, live, mail_templates, metrics, outbox, reconcile, references, smtp, status_cache
+from .integrations import hdfc
+from .models import AdminDigest, EmailOutbox, Order, PaymentReference
+
+
+class _FakeResponse:
+    def __init__(self, status_code=200, data=None):
+        self.status_code = status_code
+        self._data = data if data is not None else {}
+        self.text = ""
+
+    def json(self):
+        return self._data
+
+
+@mock.patch.object(hdfc, "HDFC_API_KEY", "key")
+@mock.patch.object(hdfc, "HDFC_MERCHANT_ID", "MID")
+@mock.patch.object(hdfc, "HDFC_RETURN_URL", "https://example.com/payments/return")
+class HdfcClientTests(SimpleTestCase):
+    def test_session_and_auth_header_reused_across_calls(self):
+        client = hdfc.HdfcClient(connect_timeout=2, status_timeout=7)
+        with mock.patch.object(client.http, "get", return_value=_FakeResponse(data={"status": "NEW"})) as get, \
+             mock.patch.object(hdfc, "_encode_api_key", wraps=hdfc._encode_api_key) as encode:
+            client.get_order_status("ORD-1", "cust")
+            client.get_order_status("ORD-2", "cust")
+
+        self.assertEqual(encode.call_count, 1)
+        self.assertEqual(get.call_count, 2)
+        self.assertEqual(get.call_args.kwargs["timeout"], (2, 7))
+        self.assertTrue(get.call_args.args[0].endswith("/orders/ORD2"))
+
+    def test_create_session_uses_session_timeout(self):
+        client = hdfc.HdfcClient(connect_timeout=2, session_timeout=25)
+        with mock.patch.object(client.http, "post", return_value=_FakeResponse(data={"id": "X"})) as post:
+            result = client.create_session(
+                order_id="ORD1", amount="501.00", customer_id="c",
+                customer_email="a@example.com", customer_phone="+911234567890",
+            )
+
+        self.assertEqual(result["data"], {"id": "X"})
+        self.assertEqual(post.call_args.kwargs["timeout"], (2, 25))
+        self.assertEqual(post.call_args.kwargs["json"]["amount"], "501")
+
+    def test_error_status_raises_hdfc_error(self):
+        client = hdfc.HdfcClient()
+        with mock.patch.object(client.http, "get", return_value=_FakeResponse(status_code=401)):
+            with self.assertRaises(hdfc.HdfcError):
+                client.get_order_status("ORD1", "c")
+
+    def test_get_client_is_shared(self):
+        self.assertIs(hdfc.get_client(), hdfc.get_client())
+
+    def test_async_client_uses_pooled_httpx_client(self):
+        seen = []
+
+        def handler(request):
+            seen.append(request)
+            return httpx.Response(200, json={"status": "CHARGED"})
+
+        async def run():
+            client = hdfc.AsyncHdfcClient(status_timeout=9)
+            client.http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+            first = await client.get_order_status("ORD1", "c")
+            second = await client.get_order_status("ORD1", "c")
+            await client.aclose()
+            return first, second
+
+        first, second = asyncio.run(run())
+        self.assertEqual(first["data"]["status"], "CHARGED")
+        self.assertEqual(len(seen), 2)
+        self.assertEqual(seen[0].headers["x-customerid"], "c")
+        self.assertEqual(seen[0].extensions["timeout"]["read"], 9)
+
+    def test_async_client_is_closed_with_its_loop(self):
+        # Under WSGI each async view runs on its own loop: its client must not outlive it
+        clients = []
+        real = hdfc.get_async_client
+
+        def tracking():
+            client = real()
+            clients.append(client)
+            return client
+
+        def build(client):
+            return httpx.AsyncClient(transport=httpx.MockTransport(lambda r: httpx.Response(200, json={})))
+
+        with mock.patch.object(hdfc.AsyncHdfcClient, "_build_http", build), \
+             mock.patch.object(hdfc, "get_async_client", tracking):
+            for _ in range(3):
+                async_to_sync(hdfc.aget_order_status)("ORD1", "c")
+
+        self.assertEqual(len({id(c) for c in clients}), 3)
+        self.assertTrue(all(c.http.is_closed for c in clients))
+        self.assertFalse(issubclass(hdfc.AsyncHdfcClient, hdfc.HdfcClient))
+        with self.assertRaises(TypeError):
+            hdfc._HdfcClientBase()  # each client must build its own transport
+
+
+class OrderStatusViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_status_view_awaits_gateway_and_persists(self):
+        Order.objects.create(order_id="ORD1", amount=501, customer_id="c",
+                             customer_email="a@example.com", customer_phone="+911234567890")
+        gateway = mock.AsyncMock(return_value={"ok": True, "status_code": 200,
+                                               "data": {"status": "PENDING", "id": "bank-1"}})
+        with mock.patch("payments.status_cache.aget_order_status", gateway):
+            resp = self.client.get(reverse("payments:hdfc_order_status", args=["ORD1"]), {"customer_id": "c"})
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertFalse(resp.json()["is_paid"])
+        order = Order.objects.get(order_id="ORD1")
+        self.assertEqual(order.status, "PENDING")
+        self.assertEqual(order.bank_order_id, "bank-1")
+
+    def test_settled_order_is_answered_from_db(self):
+        Order.objects.create(order_id="ORD2", amount=501, customer_id="c", status="CHARGED",
+                             customer_email="a@example.com", customer_phone="+911234567890")
+        metrics.reset()
+        gateway = mock.AsyncMock()
+        with mock.patch("payments.status_cache.aget_order_status", gateway):
+            resp = self.client.get(reverse("payments:hdfc_order_status", args=["ORD2"]), {"customer_id": "c"})
+
+        gateway.assert_not_called()
+        self.assertEqual((resp.json()["is_paid"], resp.json()["source"]), (True, "db"))
+        self.assertEqual(metrics.snapshot()["status.gateway_avoided"], 1)
+
+    def test_settled_order_of_another_customer_is_not_found(self):
+        Order.objects.create(order_id="ORD4", amount=501, customer_id="c", status="CHARGED",
+                             customer_email="a@example.com", customer_phone="+911234567890",
+                             last_status_payload={"status": "CHARGED", "customer_email": "a@example.com"})
+        gateway = mock.AsyncMock()
+        with mock.patch("payments.status_cache.aget_order_status", gateway):
+            resp = self.client.get(reverse("payments:hdfc_order_status", args=["ORD4"]), {"customer_id": "x"})
+
+        gateway.assert_not_called()
+        self.assertEqual(resp.status_code, 404)
+        self.assertNotIn("a@example.com", resp.content.decode())
+
+    def test_staff_refresh_bypasses_db_and_cache(self):
+        from django.contrib.auth import get_user_model
+        Order.objects.create(order_id="ORD3", amount=501, customer_id="c", status="CHARGED",
+                             customer_email="a@example.com", customer_phone="+911234567890")
+        url = reverse("payments:hdfc_order_status", args=["ORD3"])
+        gateway = mock.AsyncMock(return_value={"ok": True, "status_code": 200, "data": {"status": "CHARGED"}})
+        with mock.patch("payments.status_cache.aget_order_status", gateway):
+            self.client.get(url, {"customer_id": "c", "refresh": "1"})  # anonymous: ignored
+            self.assertEqual(gateway.call_count, 0)
+            staff = get_user_model().objects.create_user("ops", password="x", is_staff=True)
+            self.client.force_login(staff)
+            self.client.get(url, {"customer_id": "c", "refresh": "1"})
+            self.client.get(url, {"customer_id": "c", "refresh": "1"})
+        self.assertEqual(gateway.call_count, 2)
+
+
+class BatchStatusViewTests(TestCase):
+    def setUp(self):
+        from donations.models import Donor, Donation
+        cache.clear()
+        for oid, status in [("PAID1", "CHARGED"), ("OPEN1", "NEW"), ("OPEN2", "NEW"), ("OPEN3", "NEW")]:
+            Order.objects.create(order_id=oid, amount=501, customer_id="c", status=status,
+                                 customer_email="a@example.com", customer_phone="+911234567890")
+        Order.objects.create(order_id="OTHER", amount=501, customer_id="someone-else",
+                             customer_email="b@example.com", customer_phone="+911234567890")
+        donor = Donor.objects.create(email="c", email_norm="c")
+        Donation.objects.create(donor=donor, amount=100, txn_id="DON1", order_id="GW1", status="FAILED")
+
+    def test_settled_from_db_and_rest_from_gateway_with_bounded_concurrency(self):
+        in_flight, peak = 0, 0
+
+        async def status(order_id, customer_id):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            return {"ok": True, "status_code": 200, "data": {"status": "PENDING" if order_id != "OPEN3" else "CHARGED"}}
+
+        body = {"order_ids": ["PAID1", "OPEN1", "OPEN2", "OPEN3", "DON1", "OTHER", "NOPE"], "customer_id": "c"}
+        with mock.patch("payments.status_cache.aget_order_status", side_effect=status) as gw, \
+             self.settings(HDFC_BATCH_CONCURRENCY=2):
+            resp = self.client.post(reverse("payments:hdfc_order_status_batch"), data=json.dumps(body),
+                                    content_type="application/json")
+
+        results = resp.json()["results"]
+        self.assertEqual(gw.call_count, 3)
+        self.assertEqual(peak, 2)
+        self.assertEqual(results["PAID1"], {"ok": True, "status": "CHARGED", "is_paid": True, "source": "db"})
+        self.assertEqual(results["DON1"]["status"], "FAILED")
+        self.assertEqual((results["OPEN3"]["is_paid"], results["OPEN3"]["source"]), (True, "gateway"))
+        self.assertEqual(results["OPEN1"]["status"], "PENDING")
+        self.assertFalse(results["OTHER"]["ok"])
+        self.assertFalse(results["NOPE"]["ok"])
+        self.assertEqual(Order.objects.get(order_id="OPEN3").status, "CHARGED")
+
+    def test_order_without_customer_or_donation_is_unknown(self):
+        Order.objects.create(order_id="ORPHAN", amount=501, customer_id="", status="CHARGED",
+                             customer_email="a@example.com", customer_phone="+911234567890")
+        body = {"order_ids": ["ORPHAN", "PAID1"], "customer_id": "c"}
+        resp = self.client.post(reverse("payments:hdfc_order_status_batch"), data=json.dumps(body),
+                                content_type="application/json")
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()["results"]["ORPHAN"], {"ok": False, "error": "unknown order"})
+        self.assertTrue(resp.json()["results"]["PAID1"]["ok"])
+
+    def test_rejects_missing_customer_and_oversized_batches(self):
+        url = reverse("payments:hdfc_order_status_batch")
+        resp = self.client.post(url, data=json.dumps({"order_ids": ["PAID1"]}), content_type="application/json")
+        self.assertEqual(resp.status_code, 400)
+        with self.settings(HDFC_BATCH_MAX_IDS=2):
+            resp = self.client.post(url, data=json.dumps({"order_ids": ["A", "B", "C"], "customer_id": "c"}),
+                                    content_type="application/json")
+        self.assertEqual(resp.status_code, 400)
+
+
+class ReturnViewTests(TestCase):
+    def setUp(self):
+        from donations.models import Donor, Donation, Receipt
+        cache.clear()
+        donor = Donor.objects.create(name="Asha", email="a@example.com", email_norm="a@example.com")
+        self.donation = Donation.objects.create(donor=donor, amount=501, purpose="Annadaan", txn_id="ORD1",
+                                                order_id="bank-1", status="SUCCESS")
+        Receipt.objects.create(donation=self.donation, number="R-1")
+        Order.objects.create(order_id="ORD1", bank_order_id="bank-1", amount=501, customer_id="c",
+                             customer_email="a@example.com", customer_phone="+911234567890",
+                             donation=self.donation)
+
+    def test_return_page_renders_within_query_budget(self):
+        gateway = mock.AsyncMock(return_value={"ok": True, "status_code": 200,
+                                               "data": {"status": "CHARGED", "id": "bank-1"}})
+        with mock.patch("payments.status_cache.aget_order_status", gateway), self.assertNumQueries(2):
+            resp = self.client.get(reverse("payments:hdfc_return"), {"order_id": "ORD1"})
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.context["is_paid"])
+        self.assertEqual((resp.context["donor_name"], resp.context["purpose"], resp.context["receipt_no"]),
+                         ("Asha", "Annadaan", "R-1"))
+        self.assertEqual(Order.objects.get(order_id="ORD1").status, "CHARGED")
+
+
+    def test_paid_return_settles_pending_donation(self):
+        from donations.models import Donation, MagicLinkToken
+        pending = Donation.objects.create(donor=self.donation.donor, amount=251, purpose="Annadaan",
+                                          txn_id="ORD2", order_id="bank-2")
+        Order.objects.create(order_id="ORD2", amount=251, customer_id="c", customer_email="a@example.com",
+                             customer_phone="+911234567890", donation=pending)
+        gateway = mock.AsyncMock(return_value={"ok": True, "status_code": 200,
+                                               "data": {"status": "CHARGED", "id": "bank-2", "payment_method": "UPI"}})
+        with mock.patch.object(hdfc.AsyncHdfcClient, "get_order_status", gateway):
+            resp = self.client.get(reverse("payments:hdfc_return"), {"order_id": "ORD2"})
+
+        gateway.assert_awaited_once_with("ORD2", "c")
+        self.assertTrue(resp.context["is_paid"])
+        pending.refresh_from_db()
+        self.assertEqual(pending.status, "SUCCESS")
+        self.assertEqual(pending.receipt.number, pending.issued_receipt_no)
+        token = MagicLinkToken.objects.get(donor=pending.donor)
+        receipt_mail = EmailOutbox.objects.get(kind="receipt")
+        self.assertIn(reverse("donations:magic_claim", kwargs={"token": token.token}), receipt_mail.body)
+        self.assertTrue(pending.gateway_meta["receipt_email_sent"])
+        self.assertEqual(cache.get(status_cache._key("ORD2", "c"))["data"]["status"], "CHARGED")
+
+
+    def test_live_status_token_only_for_the_orders_customer(self):
+        Order.objects.filter(order_id="ORD1").update(status="PENDING")
+        gateway = mock.AsyncMock(return_value={"ok": True, "status_code": 200, "data": {"status": "PENDING"}})
+        url = reverse("payments:hdfc_return")
+        with mock.patch("payments.status_cache.aget_order_status", gateway):
+            owner = self.client.get(url, {"order_id": "ORD1", "customer_id": "c"})
+            self.client.cookies.clear()
+            stranger = self.client.get(url, {"order_id": "ORD1", "customer_id": "x"})
+
+        self.assertTrue(live.check_token(owner.context["live_token"], "ORD1"))
+        self.assertContains(owner, reverse("payments:payment_status_events", args=["ORD1"]) + "?token=")
+        self.assertNotIn("live_token", stranger.context)
+        self.assertNotContains(stranger, "/events?token=")
+
+class StatusCacheTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        metrics.reset()
+
+    def _result(self, status):
+        return {"ok": True, "status_code": 200, "data": {"status": status}}
+
+    def test_pending_status_cached_briefly_and_terminal_longer(self):
+        with mock.patch("payments.status_cache.get_order_status", return_value=self._result("PENDING")) as gw, \
+             mock.patch.object(cache, "set", wraps=cache.set) as cache_set:
+            status_cache.order_status("ORD-1", "c")
+            status_cache.order_status("ORD1", "c")
+        self.assertEqual(gw.call_count, 1)
+        self.assertEqual(cache_set.call_args.args[2], 5)
+        self.assertEqual(status_cache.stats(), {"hit": 1, "miss": 1, "coalesced": 0})
+
+        with mock.patch("payments.status_cache.get_order_status", return_value=self._result("CHARGED")), \
+             mock.patch.object(cache, "set", wraps=cache.set) as cache_set:
+            status_cache.order_status("ORD2", "c")
+        self.assertEqual(cache_set.call_args.args[2], 3600)
+
+    def test_cached_result_is_per_customer(self):
+        with mock.patch("payments.status_cache.get_order_status", return_value=self._result("CHARGED")) as gw:
+            status_cache.order_status("ORD1", "owner@example.com")
+            status_cache.order_status("ORD1", "someone-else")
+            status_cache.order_status("ORD1", "owner@example.com")
+        self.assertEqual([c.args[1] for c in gw.call_args_list], ["owner@example.com", "someone-else"])
+
+        status_cache.invalidate("ORD1", "owner@example.com")
+        with mock.patch("payments.status_cache.get_order_status", return_value=self._result("CHARGED")) as gw:
+            status_cache.order_status("ORD1", "owner@example.com")
+        self.assertEqual(gw.call_count, 1)
+
+    def test_force_bypasses_cache(self):
+        with mock.patch("payments.status_cache.get_order_status", return_value=self._result("PENDING")) as gw:
+            status_cache.order_status("ORD1", "c")
+            status_cache.order_status("ORD1", "c", force=True)
+        self.assertEqual(gw.call_count, 2)
+
+    def test_concurrent_async_misses_share_one_request(self):
+        calls = []
+
+        async def slow_status(order_id, customer_id):
+            calls.append(order_id)
+            await asyncio.sleep(0.01)
+            return self._result("PENDING")
+
+        async def run():
+            return await asyncio.gather(*(status_cache.aorder_status("ORD1", "c") for _ in range(5)))
+
+        with mock.patch("payments.status_cache.aget_order_status", slow_status):
+            results = asyncio.run(run())
+
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(r["data"]["status"] == "PENDING" for r in results))
+        self.assertEqual(status_cache.stats()["coalesced"], 4)
+
+
+class ReconcileEngineTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def _order(self, order_id, minutes_ago=10):
+        o = Order.objects.create(order_id=order_id, amount=501, customer_id="c",
+                                 customer_email="a@example.com", customer_phone="+911234567890")
+        past = timezone.now() - timezone.timedelta(minutes=minutes_ago)
+        Order.objects.filter(pk=o.pk).update(updated_at=past, next_check_at=past)
+        return o
+
+    def test_run_checks_in_chunks_and_bulk_updates(self):
+        for i in range(5):
+            self._order(f"ORD{i}")
+        self._order("FRESH", minutes_ago=0)
+
+        def status(order_id, customer_id):
+            if order_id == "ORD3":
+                raise hdfc.HdfcError("boom")
+            return {"ok": True, "data": {"status": "CHARGED", "id": f"bank-{order_id}", "amount_refunded": None}}
+
+        with mock.patch("payments.reconcile.get_order_status", side_effect=status) as gw:
+            stats = reconcile.run(reconcile.OrderSource(older_than_minutes=1), limit=10,
+                                  chunk_size=2, workers=3, qps=0)
+
+        self.assertEqual(gw.call_count, 5)
+        self.assertEqual((stats.checked, stats.updated, stats.errors), (5, 4, 1))
+        self.assertEqual(Order.objects.filter(status="CHARGED").count(), 4)
+        self.assertEqual(Order.objects.get(order_id="ORD0").bank_order_id, "bank-ORD0")
+        self.assertEqual(Order.objects.get(order_id="FRESH").status, "NEW")
+
+    def test_limit_caps_candidates(self):
+        for i in range(4):
+            self._order(f"ORD{i}")
+        with mock.patch("payments.reconcile.get_order_status",
+                        return_value={"ok": True, "data": {"status": "PENDING"}}) as gw:
+            stats = reconcile.run(reconcile.OrderSource(), limit=3, chunk_size=2, workers=2, qps=0)
+        self.assertEqual(gw.call_count, 3)
+        self.assertEqual(stats.checked, 3)
+
+    def test_row_settled_between_fetch_and_apply_is_left_alone(self):
+        self._order("ORD1")
+        self._order("ORD2")
+        source = reconcile.OrderSource()
+        fetched = list(source.candidates())
+        Order.objects.filter(order_id="ORD1").update(status="CHARGED")  # webhook landed meanwhile
+
+        updated, expired = source.apply([(o, {"status": "PENDING"}) for o in fetched], lambda *a: None)
+
+        self.assertEqual((updated, expired), (1, 0))
+        self.assertEqual(Order.objects.get(order_id="ORD1").status, "CHARGED")
+        self.assertEqual(Order.objects.get(order_id="ORD2").check_count, 1)
+
+    def test_workers_bypass_the_status_cache(self):
+        self._order("ORD1")
+        with mock.patch("payments.reconcile.get_order_status",
+                        return_value={"ok": True, "data": {"status": "PENDING"}}) as gw, \
+             mock.patch("payments.status_cache.get_order_status") as cached:
+            reconcile.run(reconcile.OrderSource(), limit=10, qps=0)
+        gw.assert_called_once_with("ORD1", "c")
+        cached.assert_not_called()
+
+    def test_token_bucket_throttles(self):
+        bucket = reconcile.TokenBucket(rate=50, burst=1)
+        started = time.monotonic()
+        for _ in range(4):
+            bucket.acquire()
+        self.assertGreaterEqual(time.monotonic() - started, 0.05)
+
+    def test_not_due_orders_are_skipped(self):
+        o = self._order("LATER")
+        Order.objects.filter(pk=o.pk).update(next_check_at=timezone.now() + timezone.timedelta(minutes=5))
+        with mock.patch("payments.reconcile.get_order_status") as gw:
+            stats = reconcile.run(reconcile.OrderSource(), limit=10, qps=0)
+        gw.assert_not_called()
+        self.assertEqual(stats.checked, 0)
+
+    def test_pending_order_backs_off_then_expires(self):
+        o = self._order("ORD1")
+        pending = {"ok": True, "data": {"status": "PENDING"}}
+        with mock.patch("payments.reconcile.get_order_status", return_value=pending):
+            reconcile.run(reconcile.OrderSource(), limit=10, qps=0)
+        o.refresh_from_db()
+        self.assertEqual((o.status, o.check_count), ("PENDING", 1))
+        self.assertAlmostEqual((o.next_check_at - timezone.now()).total_seconds(), 120, delta=5)
+
+        past = timezone.now() - timezone.timedelta(minutes=5)
+        Order.objects.filter(pk=o.pk).update(next_check_at=past, updated_at=past,
+                                             order_expiry=timezone.now() - timezone.timedelta(minutes=1))
+        with mock.patch("payments.reconcile.get_order_status", return_value=pending):
+            stats = reconcile.run(reconcile.OrderSource(), limit=10, qps=0)
+        o.refresh_from_db()
+        self.assertEqual((o.status, o.next_check_at, stats.expired), ("EXPIRED", None, 1))
+
+    def test_long_overdue_orders_expire_without_gateway_call(self):
+        o = self._order("OLD")
+        Order.objects.filter(pk=o.pk).update(order_expiry=timezone.now() - timezone.timedelta(days=2))
+        with mock.patch("payments.reconcile.get_order_status") as gw:
+            stats = reconcile.run(reconcile.OrderSource(), limit=10, qps=0)
+        gw.assert_not_called()
+        self.assertEqual(stats.expired, 1)
+        self.assertEqual(Order.objects.get(pk=o.pk).status, "EXPIRED")
+
+    def test_schedule_doubles_and_stops_at_expiry(self):
+        now = timezone.now()
+        gaps = [(reconcile.schedule_next_check(n, now) - now).total_seconds() for n in range(4)]
+        self.assertEqual(gaps, [60, 120, 240, 480])
+        expires = now + timezone.timedelta(seconds=90)
+        self.assertEqual(reconcile.schedule_next_check(3, now, expires), expires)
+
+    def test_loop_runs_passes_until_stopped(self):
+        stop = threading.Event()
+        passes = []
+
+        def fake_run(source, **kwargs):
+            passes.append(source)
+            if len(passes) == 2:
+                stop.set()
+            return reconcile.ReconcileStats()
+
+        with mock.patch("payments.reconcile.run", side_effect=fake_run):
+            reconcile.run_loop(
+                lambda: reconcile.run_locked(reconcile.OrderSource(), lock_name="test", noun="orders",
+                                             log=lambda *a: None, limit=10),
+                name="test", interval=0, log=lambda *a: None, stop=stop,
+            )
+        self.assertEqual(len(passes), 2)
+
+
+class PaymentReferenceTests(TestCase):
+    def setUp(self):
+        from donations.models import Donor, Donation
+        donor = Donor.objects.create(email="a@example.com", email_norm="a@example.com")
+        self.donation = Donation.objects.create(donor=donor, amount=100, txn_id="TXN1", order_id="GW1")
+        self.order = Order.objects.create(order_id="ORD1", bank_order_id="BANK1", amount=501, customer_id="c",
+                                          customer_email="a@example.com", customer_phone="+911234567890")
+
+    def test_unindexed_rows_are_found_once_then_resolve_in_one_query(self):
+        self.assertEqual(references.find_donation("GW1"), self.donation)
+        self.assertEqual(references.find_order("BANK1"), self.order)
+        self.assertEqual(PaymentReference.objects.count(), 4)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(references.find_donation("unknown", "TXN1").donor.email, "a@example.com")
+        with self.assertNumQueries(1):
+            self.assertEqual(references.find_order("ORD1"), self.order)
+
+    def test_one_ref_can_map_to_order_and_donation(self):
+        references.link("SHARED", order=self.order)
+        references.link("SHARED", donation=self.donation)
+        ref = PaymentReference.objects.get(ref="SHARED")
+        self.assertEqual((ref.order, ref.donation), (self.order, self.donation))
+        self.assertIsNone(references.find_donation("", None))
+
+    def test_migration_backfill_shares_refs_between_orders_and_donations(self):
+        import importlib
+        from django.apps import apps
+        migration = importlib.import_module("payments.migrations.0003_payment_reference")
+        shared = Order.objects.create(order_id="TXN1", amount=100, customer_id="c",
+                                      customer_email="a@example.com", customer_phone="+911234567890")
+        PaymentReference.objects.all().delete()
+
+        migration.backfill(apps, None)
+
+        ref = PaymentReference.objects.get(ref="TXN1")
+        self.assertEqual((ref.order, ref.donation), (shared, self.donation))
+        self.assertEqual(PaymentReference.objects.get(ref="GW1").donation, self.donation)
+        self.assertEqual(PaymentReference.objects.get(ref="BANK1").order, self.order)
+
+    def test_backfill_links_orders_to_donations(self):
+        from donations.models import Donation
+        by_gateway = Order.objects.create(order_id="ORD2", bank_order_id="GW1", amount=100, customer_id="c",
+                                          customer_email="a@example.com", customer_phone="+911234567890")
+        by_txn = Order.objects.create(order_id="TXN2", amount=100, customer_id="c",
+                                      customer_email="a@example.com", customer_phone="+911234567890")
+        other = Donation.objects.create(donor=self.donation.donor, amount=100, txn_id="TXN2", order_id="GW2")
+
+        call_command("link_orders_to_donations", "--batch-size", "1", stdout=open(os.devnull, "w"))
+
+        self.assertEqual(Order.objects.get(pk=by_gateway.pk).donation, self.donation)
+        self.assertEqual(Order.objects.get(pk=by_txn.pk).donation, other)
+        self.assertIsNone(Order.objects.get(pk=self.order.pk).donation)
+        with self.assertNumQueries(1):
+            o = Order.objects.select_related("donation__donor").get(pk=by_txn.pk)
+            self.assertEqual(o.donation.donor.email, "a@example.com")
+
+
+class LiveStatusTests(TransactionTestCase):
+    # Status reads run on executor threads with their own connections, so rows must be committed
+    def _order(self, order_id, status="NEW"):
+        return Order.objects.create(order_id=order_id, amount=501, customer_id="c", status=status,
+                                    customer_email="a@example.com", customer_phone="+911234567890")
+
+    def _settle(self, order_id):
+        Order.objects.filter(order_id=order_id).update(status="CHARGED")
+        live.publish(order_id)  # autocommit: delivered at once
+
+    async def test_stream_pushes_change_without_waiting_for_poll(self):
+        await sync_to_async(self._order)("ORD1")
+        stream = live.status_stream("ORD1", poll=30, max_seconds=30)
+        self.assertTrue((await anext(stream)).startswith("retry:"))
+        self.assertIn('"status": "NEW"', await anext(stream))
+
+        started = time.monotonic()
+        pending = asyncio.ensure_future(anext(stream))
+        await asyncio.sleep(0.05)
+        await sync_to_async(self._settle)("ORD1")
+        event = await asyncio.wait_for(pending, 5)
+
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertIn('"is_paid": true', event)
+        with self.assertRaises(StopAsyncIteration):
+            await anext(stream)  # final status ends the stream
+
+    async def test_waiting_stream_holds_no_connection(self):
+        await sync_to_async(self._order)("ORD3")
+        request_thread = threading.get_ident()
+        reads = []
+        real_close = type(connections["default"]).close
+
+        def close(conn):
+            reads.append((threading.get_ident(), conn.in_atomic_block))
+            return real_close(conn)
+
+        with mock.patch.object(type(connections["default"]), "close", close):
+            stream = live.status_stream("ORD3", poll=0.05, max_seconds=0.3)
+            events = [event async for event in stream]
+
+        self.assertIn("event: end", events[-1])
+        self.assertGreater(len(reads), 2)  # one read per wake, each followed by a close
+        self.assertTrue(all(thread != request_thread and not atomic for thread, atomic in reads))
+
+    async def test_events_view_streams_final_status(self):
+        await sync_to_async(self._order)("ORD2", status="CHARGED")
+        url = reverse("payments:payment_status_events", args=["ORD2"])
+        resp = await self.async_client.get(url, {"token": live.stream_token("ORD2")})
+        body = b"".join([chunk async for chunk in resp.streaming_content]).decode()
+
+        self.assertEqual(resp["Content-Type"], "text/event-stream")
+        self.assertIn("event: status", body)
+        self.assertIn('"status": "CHARGED"', body)
+
+    async def test_events_view_needs_a_token_for_that_order(self):
+        await sync_to_async(self._order)("ORD2", status="CHARGED")
+        url = reverse("payments:payment_status_events", args=["ORD2"])
+        self.assertEqual((await self.async_client.get(url)).status_code, 404)
+        resp = await self.async_client.get(url, {"token": live.stream_token("ORD3")})
+        self.assertEqual(resp.status_code, 404)
+
+
+class EmailOutboxTests(TestCase):
+    def _message(self, to="a@example.com"):
+        msg = EmailMultiAlternatives("Receipt", "text body", "from@example.com", [to])
+        msg.attach_alternative("<p>html body</p>", "text/html")
+        return msg
+
+    def test_queued_in_caller_transaction_and_sent_by_worker(self):
+        from django.db import transaction
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            outbox.enqueue(self._message("rolled-back@example.com"), kind="receipt")
+            raise RuntimeError
+        outbox.enqueue(self._message(), kind="receipt")
+        self.assertEqual(len(mail.outbox), 0)
+
+        metrics.reset()
+        stats = outbox.drain()
+
+        self.assertEqual(stats.sent, 1)
+        self.assertEqual([m.to for m in mail.outbox], [["a@example.com"]])
+        self.assertEqual(mail.outbox[0].alternatives[0][0], "<p>html body</p>")
+        row = EmailOutbox.objects.get()
+        self.assertEqual(row.status, "SENT")
+        self.assertIsNotNone(row.latency_ms)
+        self.assertEqual(metrics.snapshot()["email.sent"], 1)
+
+    def test_failures_back_off_then_give_up(self):
+        outbox.enqueue(self._message(), kind="receipt")
+        with mock.patch("django.core.mail.backends.locmem.EmailBackend.send_messages", side_effect=OSError("smtp down")), \
+             self.settings(EMAIL_OUTBOX_MAX_ATTEMPTS=2):
+            first = outbox.drain()
+            row = EmailOutbox.objects.get()
+            self.assertEqual((first.retried, row.status, row.attempts), (1, "PENDING", 1))
+            self.assertGreater(row.next_attempt_at, timezone.now())
+            self.assertEqual(outbox.drain().sent, 0)  # not due yet
+
+            EmailOutbox.objects.update(next_attempt_at=timezone.now())
+            second = outbox.drain()
+
+        row.refresh_from_db()
+        self.assertEqual((second.failed, row.status, row.attempts), (1, "FAILED", 2))
+        self.assertIn("smtp down", row.last_error)
+
+    def test_disabled_outbox_sends_inline(self):
+        with self.settings(EMAIL_OUTBOX_ENABLED=False):
+            outbox.enqueue(self._message(), kind="receipt")
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertFalse(EmailOutbox.objects.exists())
+
+
+class _FakeSmtp:
+    def __init__(self, backend):
+        self.backend = backend
+
+    def noop(self):
+        return (self.backend.noop_code, b"")
+
+
+class _FakeSmtpBackend:
+    """Records opens and sends like the SMTP backend, without a socket."""
+    opens = 0
+    sent = []
+    noop_code = 250
+    drop_next = False
+
+    def __init__(self, fail_silently=False, **kwargs):
+        self.connection = None
+
+    def open(self):
+        if self.connection:
+            return False
+        type(self).opens += 1
+        self.connection = _FakeSmtp(type(self))
+        return True
+
+    def close(self):
+        self.connection = None
+
+    def send_messages(self, messages):
+        if type(self).drop_next:
+            type(self).drop_next = False
+            raise smtplib.SMTPServerDisconnected("gone")
+        type(self).sent.extend(messages)
+        return len(messages)
+
+
+@mock.patch("payments.smtp.get_connection", lambda fail_silently=False: _FakeSmtpBackend())
+class SmtpPoolTests(SimpleTestCase):
+    def setUp(self):
+        smtp.close_all()
+        _FakeSmtpBackend.opens, _FakeSmtpBackend.sent = 0, []
+        _FakeSmtpBackend.noop_code, _FakeSmtpBackend.drop_next = 250, False
+        self.addCleanup(smtp.close_all)
+
+    def _msg(self):
+        return EmailMultiAlternatives("Hi", "body", "from@example.com", ["a@example.com"])
+
+    def test_messages_share_one_warm_connection(self):
+        for _ in range(3):
+            smtp.send(self._msg())
+        self.assertEqual((_FakeSmtpBackend.opens, len(_FakeSmtpBackend.sent)), (1, 3))
+
+    def test_stale_connection_is_replaced_before_reuse(self):
+        smtp.send(self._msg())
+        conn = smtp.acquire()
+        conn.last_used -= 60
+        smtp.release(conn)
+        _FakeSmtpBackend.noop_code = 421
+        smtp.send(self._msg())
+        self.assertEqual((_FakeSmtpBackend.opens, len(_FakeSmtpBackend.sent)), (2, 2))
+
+    def test_dropped_socket_reconnects_and_resends_once(self):
+        smtp.send(self._msg())
+        _FakeSmtpBackend.drop_next = True
+        self.assertEqual(smtp.send(self._msg()), 1)
+        self.assertEqual((_FakeSmtpBackend.opens, len(_FakeSmtpBackend.sent)), (2, 2))
+
+
+class MailTemplatesTests(SimpleTestCase):
+    def setUp(self):
+        mail_templates.clear()
+
+    def test_templates_resolved_once_including_misses(self):
+        from django.template import engines
+        engine = engines["django"]
+        ctx = {"donor": {"name": "Alice"}, "donation": {"amount": 100}, "magic_link_url": "https://x/y"}
+        with mock.patch.object(engine, "get_template", wraps=engine.get_template) as get_template:
+            for _ in range(3):
+                msg = mail_templates.message("Receipt", ["a@example.com"], context=ctx,
+                                             text_template="emails/email_receipt.txt",
+                                             html_template="emails/email_receipt.html")
+        self.assertEqual(get_template.call_count, 2)  # one text hit, one cached miss
+        self.assertIn("Alice", msg.body)
+        self.assertEqual(msg.alternatives, [])
+
+    def test_text_fallback_and_html_part(self):
+        msg = mail_templates.message("Code", ["a@example.com"], context={"username": "A", "code": "123456"},
+                                     text="Your code is 123456", html_template="emails/otp_email.html")
+        self.assertEqual(msg.body, "Your code is 123456")
+        self.assertEqual(msg.alternatives[0][1], "text/html")
+        self.assertIn("123456", msg.alternatives[0][0])
+
+    def test_benchmark_command_runs(self):
+        out = io.StringIO()
+        call_command("bench_email_render", "-n", "3", stdout=out)
+        self.assertIn("emails/s", out.getvalue())
+
+
+class EmailInlineTests(SimpleTestCase):
+    def test_rules_inlined_by_specificity_before_inline_styles(self):
+        source = (
+            "<html><head><style>p { color: red; margin: 0 } .note { color: blue } "
+            ".box p { padding: 4px } a:hover { color: green }</style></head>"
+            "<body>\n  <div class='box'>\n    <p class=\"note\" style=\"margin: 2px\">{{ name }}</p>\n"
+            "  </div>\n  {% if x %}<p>x</p>{% endif %}\n</body></html>"
+        )
+        html = email_inline.inline_css(source)
+        self.assertIn('<p class="note" style="color:blue;padding:4px;margin:2px">{{ name }}</p>', html)
+        self.assertIn("{% if x %}<p style=\"color:red;margin:0\">x</p>{% endif %}", html)
+        self.assertIn("<style>a:hover{color:green}</style>", html)
+        self.assertNotIn("\n", html)
+
+    def test_compiled_variant_used_until_source_changes(self):
+        with tempfile.TemporaryDirectory() as out, self.settings(EMAIL_COMPILED_DIR=out):
+            self.assertIn("emails/welcome_email.html", email_inline.stale())
+            call_command("compile_email_templates", stdout=io.StringIO())
+            self.assertEqual(email_inline.stale(), [])
+
+            html = mail_templates.render("emails/welcome_email.html", {"username": "Alice"})
+            self.assertIn('<div class="header" style="background-color:#f7f7f7', html)
+            self.assertIn("Hare Krishna Alice", html)
+
+            # Manifest fingerprint no longer matches the source -> fall back to the source template
+            manifest = email_inline.load_manifest()
+            manifest["emails/welcome_email.html"]["source"] = "0" * 64
+            with open(os.path.join(out, email_inline.MANIFEST), "w") as fh:
+                json.dump(manifest, fh)
+            mail_templates.clear()
+            with self.assertLogs("payments.mail_templates", "WARNING"):
+                html = mail_templates.render("emails/welcome_email.html", {"username": "Alice"})
+            self.assertIn("<style>", html)
+            with self.assertRaises(CommandError):
+                call_command("compile_email_templates", "--check", stdout=io.StringIO())
+
+
+@override_settings(PAYMENTS_ADMIN_EMAILS="admin@example.com")
+class PaymentDigestTests(TestCase):
+    def _order(self, order_id, amount, purpose="Annadaan", status="CHARGED"):
+        return Order.objects.create(order_id=order_id, amount=amount, customer_id="c", status=status,
+                                    customer_email=f"{order_id.lower()}@example.com",
+                                    customer_phone="+911234567890", metadata={"description": purpose})
+
+    def test_digest_claims_paid_orders_once_with_totals_from_one_query(self):
+        self._order("A1", 100)
+        self._order("A2", 250)
+        self._order("G1", 51, purpose="Gau Seva")
+        self._order("N1", 999, status="NEW")
+        old = self._order("OLD", 5)
+        Order.objects.filter(pk=old.pk).update(updated_at=timezone.now() - timezone.timedelta(days=3))
+
+        sent = digest.send_digest()
+
+        self.assertEqual(sent.order_count, 3)
+        self.assertEqual(set(sent.orders.values_list("order_id", flat=True)), {"A1", "A2", "G1"})
+        with self.assertNumQueries(1):
+            ctx = digest.summary(sent)
+        self.assertEqual([(p["purpose"], p["total"], p["count"]) for p in ctx["purposes"]],
+                         [("Annadaan", 350, 2), ("Gau Seva", 51, 1)])
+        self.assertEqual(ctx["totals"], [{"currency": "INR", "total": 401}])
+        email = EmailOutbox.objects.get(kind="payment_digest")
+        self.assertEqual(email.to, ["admin@example.com"])
+        self.assertIn("Gau Seva: INR 51", email.body)
+
+        self.assertIsNone(digest.send_digest())
+        self.assertEqual(AdminDigest.objects.count(), 1)
+
+    def test_order_committed_after_a_run_is_reported_by_the_next(self):
+        self._order("A1", 100)
+        first = timezone.now()
+        digest.send_digest(now=first)
+        # Saved (updated_at stamped) well before the first run ended, but committed only after it
+        late = self._order("LATE", 75)
+        Order.objects.filter(pk=late.pk).update(updated_at=first - timezone.timedelta(hours=3))
+        old = self._order("OLD", 5)
+        Order.objects.filter(pk=old.pk).update(updated_at=first - timezone.timedelta(days=3))
+
+        sent = digest.send_digest(now=first + timezone.timedelta(hours=6))
+
+        self.assertEqual(list(sent.orders.values_list("order_id", flat=True)), ["LATE"])
+        self.assertEqual(sent.period_start, first)
+
+    def test_table_is_capped_but_totals_are_not(self):
+        for i in range(3):
+            self._order(f"T{i}", 10)
+        sent = digest.send_digest()
+        ctx = digest.summary(sent, max_rows=2)
+        self.assertEqual((len(ctx["orders"]), ctx["more"], ctx["purposes"][0]["total"]), (2, 1, 30))
+
+    def test_per_payment_admin_mail_only_above_threshold(self):
+        from .emails import send_payment_confirmation
+        with self.settings(PAYMENTS_ADMIN_DIGEST=True, PAYMENTS_ADMIN_INSTANT_MIN_AMOUNT=Decimal("10000")):
+            send_payment_confirmation(order=self._order("SMALL", 500))
+            send_payment_confirmation(order=self._order("BIG", 25000))
+        admin_mails = EmailOutbox.objects.filter(kind="payment_admin")
+        self.assertEqual([m.subject.split(":")[1].split()[0] for m in admin_mails], ["BIG"])
+        self.assertEqual(EmailOutbox.objects.filter(kind="payment_confirmation").count(), 2)
+
+
+
+class MyPaymentsPaginationTests(TestCase):
+    def setUp(self):
+        from django.contrib.auth import get_user_model
+        self.client.force_login(get_user_model().objects.create_user("cust1", password="x"))
+        Order.objects.bulk_create(
+            Order(order_id=f"ORDPAGE{i}", amount=100 + i, customer_id="cust1",
+                  customer_email="a@example.com", customer_phone="+911234567890")
+            for i in range(25)
+        )
+        Order.objects.create(order_id="ORDOTHER", amount=1, customer_id="someone-else",
+                             customer_email="b@example.com", customer_phone="+911234567890")
+        # Half share one timestamp so the pk tie-break is exercised
+        same = timezone.now()
+        Order.objects.filter(order_id__in=[f"ORDPAGE{i}" for i in range(5, 15)]).update(created_at=same)
+        self.expected = list(Order.objects.filter(customer_id="cust1")
+                             .order_by("-created_at", "-pk").values_list("order_id", flat=True))
+
+    def _page(self, cursor=None):
+        params = {"cursor": cursor} if cursor else {}
+        return self.client.get(reverse("payments:my_payments_json"), params).json()
+
+    def test_walks_all_pages_forward_and_back_without_count(self):
+        pages, cursor = [], None
+        with CaptureQueriesContext(connection) as queries:
+            while True:
+                data = self._page(cursor)
+                pages.append(data)
+                cursor = data["next_cursor"]
+                if not cursor:
+                    break
+        self.assertFalse(any("COUNT(" in q["sql"] for q in queries.captured_queries))
+        self.assertEqual([len(p["orders"]) for p in pages], [10, 10, 5])
+        self.assertEqual([o["order_id"] for p in pages for o in p["orders"]], self.expected)
+        self.assertIsNone(pages[0]["prev_cursor"])
+
+        back = self._page(pages[2]["prev_cursor"])
+        self.assertEqual(back["orders"], pages[1]["orders"])
+        first = self._page(back["prev_cursor"])
+        self.assertEqual(first["orders"], pages[0]["orders"])
+        self.assertIsNone(first["prev_cursor"])
+
+    def test_tampered_cursor(self):
+        cursor = self._page()["next_cursor"]
+        resp = self.client.get(reverse("payments:my_payments_json"), {"cursor": cursor[:-2] + "xx"})
+        self.assertEqual(resp.status_code, 400)
+        resp = self.client.get(reverse("payments:my_payments"), {"cursor": "garbage"})
+        self.assertEqual(resp.status_code, 200)
+        self.assertContains(resp, self.expected[0])
+
+    def test_html_links_next_page(self):
+        resp = self.client.get(reverse("payments:my_payments"))
+        self.assertContains(resp, "?cursor=")
+        self.assertNotContains(resp, "ORDOTHER")
+
+
+@skipUnless(connection.vendor == "postgresql", "EXPLAIN plans are checked on PostgreSQL only")
+class OrderIndexUsageTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Order.objects.bulk_create(
+            Order(order_id=f"ORDIDX{i}", amount=Decimal("10.00"), customer_id=f"cust{i % 50}",
+                  customer_email="a@example.com", customer_phone="9999999999",
+                  status="CHARGED" if i % 5 else "PENDING")
+            for i in range(1000)
+        )
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE payments_order")
+
+    def assertUsesIndex(self, qs, index):
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+        self.assertIn(index, qs.explain())
+
+    def test_customer_orders_newest_first(self):
+        qs = Order.objects.filter(customer_id="cust7").order_by("-created_at")[:20]
+        self.assertUsesIndex(qs, "order_customer_created_idx")
+
+    def test_stale_pending_orders(self):
+        qs = Order.objects.filter(status__in=reconcile.PENDING_ORDER_STATUSES,
+                                  updated_at__lt=timezone.now() - timedelta(minutes=5))
+        self.assertUsesIndex(qs, "order_status_updated_idx")
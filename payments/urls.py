@@ -4,8 +4,12 @@ app_name = "payments"
 urlpatterns = [
     path("test", views.hdfc_test_page_view, name="hdfc_test"),
     path("my", views.my_payments_view, name="my_payments"),
+    path("my.json", views.my_payments_view, {"as_json": True}, name="my_payments_json"),
     path("create-session", views.hdfc_create_session_view, name="hdfc_create_session"),
+    path("status/batch", views.hdfc_order_status_batch_view, name="hdfc_order_status_batch"),
     path("status/<str:order_id>", views.hdfc_order_status_view, name="hdfc_order_status"),
+    path("status/<str:order_id>/events", views.payment_status_events_view, name="payment_status_events"),
+    path("metrics", views.payments_metrics_view, name="metrics"),
     path("return", views.hdfc_return_view, name="hdfc_return"),  # https://.../payments/return
     # Webhook alias to match configured URL https://<domain>/payments/webhook
     path("webhook", views.hdfc_webhook_alias, name="hdfc_webhook"),
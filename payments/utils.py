@@ -1,6 +1,9 @@
 import random
 import string
-from datetime import datetime
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.utils import timezone
 
 ALNUM = string.ascii_uppercase + string.digits
 
@@ -10,3 +13,8 @@ def generate_order_id(prefix="ORD"):
     base = f"{prefix}{ts}{rand}"  # may be >20
     # Return last 20 alnum chars (bank requires <21)
     return base[-20:]
+
+
+def first_check_at():
+    """Default reconcile due time for a new order: one backoff step after creation."""
+    return timezone.now() + timedelta(seconds=getattr(settings, "RECONCILE_BACKOFF_BASE", 60))
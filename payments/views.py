@@ -1,16 +1,27 @@
+import asyncio
 import json
-from django.http import JsonResponse, HttpResponseBadRequest
+import os
+from django.http import JsonResponse, HttpResponseBadRequest, StreamingHttpResponse
 from django.shortcuts import render
 from django.views.decorators.http import require_POST, require_GET
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.csrf import csrf_exempt
+from django.conf import settings
+from django.db import transaction
 from django.utils.dateparse import parse_datetime
 from datetime import timezone
 
-from .integrations.hdfc import create_session, get_order_status, HdfcError, _sanitize_order_id
+from asgiref.sync import sync_to_async
+
+from django.contrib.admin.views.decorators import staff_member_required
+
+from .integrations.hdfc import create_session, HdfcError, SUCCESS_STATUSES, _sanitize_order_id, extract_status
+from .status_cache import aorder_status
+from . import live, metrics, pagination, references
+from .context import PaymentContext, gateway_avoided, wants_refresh
 from django.utils.crypto import get_random_string
 from .emails import send_payment_confirmation
-from .models import Order
+from .models import Order, PaymentReference
 
 def _json_body(request):
     try: return json.loads(request.body.decode("utf-8"))
@@ -30,34 +41,48 @@ def hdfc_test_page_view(request):
     return render(request, "payments/hdfc_test.html", ctx)
 
 
+MY_PAYMENTS_PAGE_SIZE = 10
+
+
+def _order_json(o):
+    return {
+        "order_id": o.order_id,
+        "amount": str(o.amount),
+        "currency": o.currency,
+        "status": o.status,
+        "created_at": o.created_at.isoformat(),
+        "purpose": (o.metadata or {}).get("description") or "Donation",
+        "payment_link": o.payment_links_web or None,
+    }
+
+
 @login_required
-def my_payments_view(request):
-    """List previous payments for the logged-in customer."""
+def my_payments_view(request, as_json=False):
+    """List previous payments for the logged-in customer, newest first (``?cursor=`` pages)."""
     # Determine the user's customer_id; default to username
     cust_id = getattr(getattr(request.user, "customer", None), "customer_id", None) or request.user.username
-    qs = Order.objects.filter(customer_id=cust_id).order_by("-created_at")
+    qs = Order.objects.filter(customer_id=cust_id)
 
-    # Very light pagination
     try:
-        page = int(request.GET.get("page", "1"))
-        if page < 1: page = 1
-    except Exception:
-        page = 1
-    page_size = 10
-    start = (page - 1) * page_size
-    end = start + page_size
-    total = qs.count()
-    items = list(qs[start:end])
-    has_next = end < total
-    has_prev = start > 0
-
+        page = pagination.paginate(qs, request.GET.get("cursor"), MY_PAYMENTS_PAGE_SIZE)
+    except pagination.InvalidCursor:
+        if as_json:
+            return HttpResponseBadRequest("Invalid cursor")
+        page = pagination.paginate(qs, None, MY_PAYMENTS_PAGE_SIZE)
+
+    if as_json:
+        return JsonResponse({
+            "customer_id": cust_id,
+            "orders": [_order_json(o) for o in page.items],
+            "next_cursor": page.next_cursor,
+            "prev_cursor": page.prev_cursor,
+        })
     ctx = {
-        "orders": items,
-        "page": page,
-        "has_next": has_next,
-        "has_prev": has_prev,
-        "next_page": page + 1,
-        "prev_page": page - 1,
+        "orders": page.items,
+        "has_next": page.has_next,
+        "has_prev": page.has_prev,
+        "next_cursor": page.next_cursor,
+        "prev_cursor": page.prev_cursor,
         "customer_id": cust_id,
     }
     return render(request, "payments/my_payments.html", ctx)
@@ -111,7 +136,7 @@ def hdfc_create_session_view(request):
         links = data.get("payment_links", {}) or {}
         sdk = data.get("sdk_payload", None)
 
-        Order.objects.update_or_create(
+        order, _ = Order.objects.update_or_create(
             order_id=oid,
             defaults={
                 "bank_order_id": bank_id,
@@ -128,6 +153,10 @@ def hdfc_create_session_view(request):
             },
         )
 
+        references.link(oid, bank_id, order=order)
+        if references.attach_donations([order]):
+            order.save(update_fields=["donation"])
+
         resp = JsonResponse(result, status=200, safe=False)
         resp.set_cookie("hdfc_last_order_id", oid, max_age=1800, secure=True, samesite="Lax")
         resp.set_cookie("hdfc_customer_id", body["customer_id"], max_age=1800, secure=True, samesite="Lax")
@@ -139,134 +168,202 @@ def hdfc_create_session_view(request):
         # Ensure JSON error instead of HTML 500 page for the test client
         return JsonResponse({"ok": False, "error": f"Server error: {str(e)}"}, status=500, safe=False)
 
+def _reconcile_order_status(request, pc: PaymentContext, data: dict, paid: bool) -> None:
+    """Persist a gateway status to Order/Donation and send confirmations (sync ORM work)."""
+    # persist
+    order = pc.order
+
+    if order:
+        previous_status = order.status
+        order.status = str(data.get("status", order.status or ""))
+        order.bank_order_id = data.get("id", order.bank_order_id or "")
+        order.txn_id = data.get("txn_id", order.txn_id or "")
+        order.payment_method_type = data.get("payment_method_type", order.payment_method_type or "")
+        order.payment_method = data.get("payment_method", order.payment_method or "")
+        order.auth_type = data.get("auth_type", order.auth_type or "")
+        order.refunded = bool(data.get("refunded", order.refunded))
+        try:
+            order.amount_refunded = data.get("amount_refunded", order.amount_refunded)
+        except Exception:
+            pass
+        order.last_status_payload = data
+
+        iso = data.get("order_expiry") or (data.get("metadata") or {}).get("order_expiry")
+        if iso:
+            dt = parse_datetime(iso)
+            if dt and dt.tzinfo is None:
+                dt = dt.replace(tzinfo=timezone.utc)
+            order.order_expiry = dt
+
+        # Mark description if we get it back in metadata or leave existing
+        meta = order.metadata or {}
+        if (data.get("description") and not meta.get("description")):
+            meta["description"] = data.get("description")
+        order.metadata = meta
+        order.save()
+        references.link(order.order_id, order.bank_order_id, order.txn_id, order=order)
+        if order.status != previous_status:
+            live.publish(order.order_id)
+
+    # Send confirmation emails once per paid order using a row-level lock to avoid duplicates
+    if paid and order:
+        try:
+            with transaction.atomic():
+                locked = Order.objects.select_for_update().get(pk=order.pk)
+                meta = locked.metadata or {}
+                if not bool(meta.get("receipt_sent")):
+                    meta["receipt_sent"] = True
+                    locked.metadata = meta
+                    locked.save(update_fields=["metadata"])
+                    # Queued in the outbox with the flag: both commit or neither does
+                    send_payment_confirmation(order=order)
+        except Exception:
+            # Never break the status API due to email logic
+            pass
+
+    # Reconcile Donations app if webhook missed: mark SUCCESS and send receipt/magic link
+    try:
+        if paid:
+            pc.add_refs(data.get("id"), data.get("txn_id"))
+            donation = pc.donation
+            if donation and donation.status != "SUCCESS":
+                from donations.services import mark_paid_and_receipt, issue_magic_link
+                from django.urls import reverse
+                from donations.emails import send_receipt_email
+
+                mode = data.get("payment_method") or data.get("payment_method_type") or ""
+                with transaction.atomic():
+                    mark_paid_and_receipt(donation, mode, data)
+                    # queue receipt + magic link once, committed together with the SUCCESS status
+                    try:
+                        with transaction.atomic():
+                            mlt = issue_magic_link(donation.donor)
+                            link = request.build_absolute_uri(
+                                reverse("donations:magic_claim", kwargs={"token": mlt.token})
+                            )
+                            send_receipt_email(donation, magic_link_url=link)
+                            meta = donation.gateway_meta or {}
+                            meta["receipt_email_sent"] = True
+                            meta["reconciled_via"] = "payments_status_api"
+                            donation.gateway_meta = meta
+                            donation.save(update_fields=["gateway_meta"])
+                    except Exception:
+                        # Mark that we attempted; avoid crashing status API
+                        pass
+    except Exception:
+        # Never break status API due to cross-app reconciliation
+        pass
+
 @require_GET
-def hdfc_order_status_view(request, order_id: str):
+async def hdfc_order_status_view(request, order_id: str):
     oid = _sanitize_order_id(order_id)
     customer_id = request.GET.get("customer_id", "")
     if not customer_id:
         return HttpResponseBadRequest("customer_id is required")
 
-    def _extract_status(data: dict) -> str:
-        # Normalize status from various possible keys/locations
-        if not isinstance(data, dict):
-            return ""
-        s = (data.get("status") or
-             (data.get("order") or {}).get("status") or
-             (data.get("payment") or {}).get("status") or
-             (data.get("transaction") or {}).get("status") or
-             (data.get("result") or {}).get("status") or
-             "")
-        return str(s).upper()
+    # Settled by webhook/reconciler already: answer from the DB, no gateway call
+    pc = PaymentContext(oid)
+    force = await wants_refresh(request)
+    if not force:
+        settled = await sync_to_async(pc.settled_status)()
+        if settled:
+            if await sync_to_async(lambda: pc.gateway_customer_id)() != customer_id:
+                return JsonResponse({"ok": False, "error": "unknown order"}, status=404)
+            gateway_avoided()
+            payload = getattr(pc.order, "last_status_payload", None) or {}
+            data = payload if extract_status(payload) == settled else {"status": settled}
+            return JsonResponse({"ok": True, "status_code": 200, "data": data,
+                                 "is_paid": settled in SUCCESS_STATUSES, "source": "db"})
 
     try:
-        result = get_order_status(oid, customer_id)
-        data = result["data"]
-
-        # persist
+        result = await aorder_status(oid, customer_id, force=force)
+    except HdfcError as e:
+        return JsonResponse({"ok": False, "error": str(e)}, status=400, safe=False)
+    data = result["data"]
+
+    paid = extract_status(data) in SUCCESS_STATUSES
+    result["is_paid"] = paid
+
+    await sync_to_async(_reconcile_order_status)(request, pc, data, paid)
+    return JsonResponse(result, status=200, safe=False)
+
+def _load_return_ctx(ctx: dict, pc: PaymentContext, customer_id: str) -> tuple[str, str]:
+    """Pre-fill page details from the DB; returns customer_id (looked up if missing) and any settled status."""
+    if customer_id and customer_id == pc.gateway_customer_id:
+        # Only the paying customer may follow the order's live status
+        ctx["live_token"] = live.stream_token(pc.order_id)
+    if not customer_id and pc.customer_id:
+        customer_id = pc.customer_id
+        ctx["customer_id"] = customer_id
+    pc.fill(ctx)
+    return customer_id, pc.settled_status()
+
+_RETURN_ORDER_FIELDS = ["status", "bank_order_id", "txn_id", "payment_method_type", "payment_method",
+                        "auth_type", "last_status_payload", "updated_at"]
+
+def _apply_return_status(request, ctx: dict, pc: PaymentContext, data: dict, paid: bool) -> None:
+    """Persist the gateway status seen on the return page and reconcile Donations."""
+    # Persist to payments.Order table
+    order = pc.order
+    if order is not None:
+        known_ids = (order.bank_order_id, order.txn_id)
+        previous_status = order.status
+        order.status = str(data.get("status", order.status or ""))
+        order.bank_order_id = data.get("id", order.bank_order_id or "")
+        order.txn_id = data.get("txn_id", order.txn_id or "")
+        order.payment_method_type = data.get("payment_method_type", order.payment_method_type or "")
+        order.payment_method = data.get("payment_method", order.payment_method or "")
+        order.auth_type = data.get("auth_type", order.auth_type or "")
+        order.last_status_payload = data
+        order.save(update_fields=_RETURN_ORDER_FIELDS)
+        if (order.bank_order_id, order.txn_id) != known_ids:
+            references.link(order.order_id, order.bank_order_id, order.txn_id, order=order)
+        if order.status != previous_status:
+            live.publish(order.order_id)
+
+    # Refill from the saved order and Donations (ids from the gateway may find one we missed)
+    pc.add_refs(data.get("id"), data.get("txn_id"))
+    pc.fill(ctx)
+    donation = pc.donation
+
+    # Reconcile Donations app if paid
+    if paid:
         try:
-            order = Order.objects.get(order_id=oid)
-        except Order.DoesNotExist:
-            order = None
-
-        if order:
-            order.status = str(data.get("status", order.status or ""))
-            order.bank_order_id = data.get("id", order.bank_order_id or "")
-            order.txn_id = data.get("txn_id", order.txn_id or "")
-            order.payment_method_type = data.get("payment_method_type", order.payment_method_type or "")
-            order.payment_method = data.get("payment_method", order.payment_method or "")
-            order.auth_type = data.get("auth_type", order.auth_type or "")
-            order.refunded = bool(data.get("refunded", order.refunded))
-            try:
-                order.amount_refunded = data.get("amount_refunded", order.amount_refunded)
-            except Exception:
-                pass
-            order.last_status_payload = data
-
-            iso = data.get("order_expiry") or (data.get("metadata") or {}).get("order_expiry")
-            if iso:
-                dt = parse_datetime(iso)
-                if dt and dt.tzinfo is None:
-                    dt = dt.replace(tzinfo=timezone.utc)
-                order.order_expiry = dt
-
-            # Mark description if we get it back in metadata or leave existing
-            meta = order.metadata or {}
-            if (data.get("description") and not meta.get("description")):
-                meta["description"] = data.get("description")
-            order.metadata = meta
-            order.save()
-
-        norm_status = _extract_status(data)
-        success_statuses = {"CHARGED", "SUCCESS", "SUCCESSFUL", "PAID", "CAPTURED", "COMPLETED", "SETTLED"}
-        paid = norm_status in success_statuses
-        result["is_paid"] = paid
-
-        # Send confirmation emails once per paid order using a row-level lock to avoid duplicates
-        if paid and order:
-            from django.db import transaction
-            try:
-                should_send = False
-                with transaction.atomic():
-                    locked = Order.objects.select_for_update().get(pk=order.pk)
-                    meta = locked.metadata or {}
-                    if not bool(meta.get("receipt_sent")):
-                        meta["receipt_sent"] = True
-                        locked.metadata = meta
-                        locked.save(update_fields=["metadata"])
-                        should_send = True
-                if should_send:
-                    # Send after commit to avoid emailing on rolled-back tx
-                    try:
-                        from django.db import transaction as _tx
-                        _tx.on_commit(lambda: send_payment_confirmation(order=order))
-                    except Exception:
-                        send_payment_confirmation(order=order)
-            except Exception:
-                # Never break the status API due to email logic
-                pass
+            from donations.services import mark_paid_and_receipt, issue_magic_link
+            from donations.emails import send_receipt_email
+            from django.urls import reverse
 
-        # Reconcile Donations app if webhook missed: mark SUCCESS and send receipt/magic link
-        try:
-            if paid:
-                from donations.models import Donation
-                donation = (
-                    Donation.objects.filter(txn_id=oid).first() or
-                    Donation.objects.filter(order_id=data.get("id") or "").first() or
-                    Donation.objects.filter(txn_id=data.get("txn_id") or "").first()
-                )
-                if donation and donation.status != "SUCCESS":
-                    from donations.services import mark_paid_and_receipt, issue_magic_link
-                    from django.urls import reverse
-                    from donations.emails import send_receipt_email
-
-                    mode = data.get("payment_method") or data.get("payment_method_type") or ""
+            if donation and donation.status != "SUCCESS":
+                mode = data.get("payment_method") or data.get("payment_method_type") or ""
+                with transaction.atomic():
                     mark_paid_and_receipt(donation, mode, data)
-                    # send receipt + magic link once
-                    try:
-                        mlt = issue_magic_link(donation.donor)
-                        link = request.build_absolute_uri(
-                            reverse("donations:magic_claim", kwargs={"token": mlt.token})
-                        )
-                        send_receipt_email(donation, magic_link_url=link)
-                        meta = donation.gateway_meta or {}
-                        meta["receipt_email_sent"] = True
-                        meta["reconciled_via"] = "payments_status_api"
-                        donation.gateway_meta = meta
-                        donation.save(update_fields=["gateway_meta"])
-                    except Exception:
-                        # Mark that we attempted; avoid crashing status API
-                        pass
+                    meta = donation.gateway_meta or {}
+                    if not bool(meta.get("receipt_email_sent")):
+                        try:
+                            with transaction.atomic():
+                                mlt = issue_magic_link(donation.donor)
+                                link = request.build_absolute_uri(
+                                    reverse("donations:magic_claim", kwargs={"token": mlt.token})
+                                )
+                                send_receipt_email(donation, magic_link_url=link)
+                                meta["receipt_email_sent"] = True
+                                donation.gateway_meta = meta
+                                donation.save(update_fields=["gateway_meta"])
+                        except Exception:
+                            pass
         except Exception:
-            # Never break status API due to cross-app reconciliation
             pass
 
-        return JsonResponse(result, status=200, safe=False)
-
-    except HdfcError as e:
-        return JsonResponse({"ok": False, "error": str(e)}, status=400, safe=False)
+def _render_return(request, ctx: dict, order_id: str, customer_id: str):
+    resp = render(request, "payments/return.html", ctx)
+    if order_id:
+        resp.set_cookie("hdfc_last_order_id", order_id, max_age=1800, secure=True, samesite="Lax")
+    if customer_id:
+        resp.set_cookie("hdfc_customer_id", customer_id, max_age=1800, secure=True, samesite="Lax")
+    return resp
 
 @csrf_exempt
-def hdfc_return_view(request):
+async def hdfc_return_view(request):
     order_id = request.POST.get("order_id") or request.GET.get("order_id") or ""
     customer_id = request.POST.get("customer_id") or request.GET.get("customer_id") or ""
 
@@ -300,188 +397,135 @@ def hdfc_return_view(request):
         "donor_name": "",
     }
 
-    def _fill_ctx_from_order(o: Order):
-        try:
-            if not o:
-                return
-            ctx["amount"] = getattr(o, "amount", None)
-            ctx["currency"] = getattr(o, "currency", None)
-            ctx["customer_email"] = getattr(o, "customer_email", "") or ""
-            ctx["customer_phone"] = getattr(o, "customer_phone", "") or ""
-            # purpose/description stored in metadata during create_session
-            meta = getattr(o, "metadata", None) or {}
-            purpose = meta.get("description") or meta.get("purpose") or ""
-            if purpose:
-                ctx["purpose"] = purpose
-            # method details if already known
-            ctx["payment_method_type"] = getattr(o, "payment_method_type", "") or ""
-            ctx["payment_method"] = getattr(o, "payment_method", "") or ""
-        except Exception:
-            pass
-    
-    # If customer_id missing, try to fetch from our DB by order_id
-    if order_id and not customer_id:
-        try:
-            o = Order.objects.filter(order_id=_sanitize_order_id(order_id)).first()
-            if o and o.customer_id:
-                customer_id = o.customer_id
-                ctx["customer_id"] = customer_id
-            _fill_ctx_from_order(o)
-            # Try to enrich with donor name/purpose and fallback details from Donations
-            try:
-                from donations.models import Donation
-                d = (
-                    Donation.objects.filter(txn_id=_sanitize_order_id(order_id)).first() or
-                    Donation.objects.filter(order_id=getattr(o, "bank_order_id", "") or "").first()
-                )
-                if d:
-                    ctx["donor_name"] = getattr(d.donor, "name", "") or ctx.get("donor_name", "")
-                    if not ctx.get("purpose"):
-                        ctx["purpose"] = getattr(d, "purpose", "") or ctx.get("purpose", "")
-                    # Fallbacks if Order wasn't found or lacks info
-                    if ctx.get("amount") is None:
-                        try:
-                            ctx["amount"] = d.amount
-                        except Exception:
-                            pass
-                    if not ctx.get("currency"):
-                        ctx["currency"] = ctx.get("currency") or "INR"
-                    if not ctx.get("customer_email"):
-                        try:
-                            ctx["customer_email"] = getattr(d.donor, "email", "") or ""
-                        except Exception:
-                            pass
-                    if not ctx.get("customer_phone"):
-                        try:
-                            ctx["customer_phone"] = getattr(d.donor, "phone_e164", "") or ""
-                        except Exception:
-                            pass
-            except Exception:
-                pass
-        except Exception:
-            pass
+    pc = PaymentContext(order_id)
+    customer_id, settled = await sync_to_async(_load_return_ctx)(ctx, pc, customer_id)
+    force = await wants_refresh(request)
 
-    # Even if customer_id already present (e.g., via cookie), pre-fill details from Order for better UX
-    if order_id:
-        try:
-            _o = Order.objects.filter(order_id=_sanitize_order_id(order_id)).first()
-            _fill_ctx_from_order(_o)
-        except Exception:
-            pass
-        
+    if settled and not force:
+        # Webhook/reconciler got there first; the DB is authoritative
+        gateway_avoided()
+        ctx.update({"server_checked": True, "is_paid": settled in SUCCESS_STATUSES, "status": settled})
     # Server-side reconciliation for reliability (single source of truth)
-    if order_id and customer_id:
+    elif order_id and customer_id:
         try:
-            result = get_order_status(_sanitize_order_id(order_id), customer_id)
+            result = await aorder_status(_sanitize_order_id(order_id), customer_id, force=force)
             data = result.get("data") or {}
 
-            # Normalize success state
-            def _extract_status(d: dict) -> str:
-                s = (
-                    (d or {}).get("status")
-                    or (d or {}).get("order", {}).get("status")
-                    or (d or {}).get("payment", {}).get("status")
-                    or (d or {}).get("transaction", {}).get("status")
-                    or (d or {}).get("result", {}).get("status")
-                    or ""
-                )
-                return str(s).upper()
-
-            norm_status = _extract_status(data)
-            success_statuses = {"CHARGED", "SUCCESS", "SUCCESSFUL", "PAID", "CAPTURED", "COMPLETED", "SETTLED"}
-            paid = norm_status in success_statuses
+            norm_status = extract_status(data)
+            paid = norm_status in SUCCESS_STATUSES
             ctx.update({"server_checked": True, "is_paid": paid, "status": norm_status})
 
-            # Persist to payments.Order table
-            try:
-                order = Order.objects.get(order_id=_sanitize_order_id(order_id))
-                order.status = str(data.get("status", order.status or ""))
-                order.bank_order_id = data.get("id", order.bank_order_id or "")
-                order.txn_id = data.get("txn_id", order.txn_id or "")
-                order.payment_method_type = data.get("payment_method_type", order.payment_method_type or "")
-                order.payment_method = data.get("payment_method", order.payment_method or "")
-                order.auth_type = data.get("auth_type", order.auth_type or "")
-                order.last_status_payload = data
-                order.save()
-                # Update context from saved order and gateway response
-                _fill_ctx_from_order(order)
-                # Enrich again from Donations if available (and fill missing fields)
-                try:
-                    from donations.models import Donation
-                    d2 = (
-                        Donation.objects.filter(txn_id=_sanitize_order_id(order_id)).first() or
-                        Donation.objects.filter(order_id=data.get("id") or "").first() or
-                        Donation.objects.filter(txn_id=data.get("txn_id") or "").first()
-                    )
-                    if d2:
-                        ctx["donor_name"] = getattr(d2.donor, "name", "") or ctx.get("donor_name", "")
-                        if not ctx.get("purpose"):
-                            ctx["purpose"] = getattr(d2, "purpose", "") or ctx.get("purpose", "")
-                        if ctx.get("amount") is None:
-                            try:
-                                ctx["amount"] = d2.amount
-                            except Exception:
-                                pass
-                        if not ctx.get("currency"):
-                            ctx["currency"] = ctx.get("currency") or "INR"
-                        if not ctx.get("customer_email"):
-                            try:
-                                ctx["customer_email"] = getattr(d2.donor, "email", "") or ""
-                            except Exception:
-                                pass
-                        if not ctx.get("customer_phone"):
-                            try:
-                                ctx["customer_phone"] = getattr(d2.donor, "phone_e164", "") or ""
-                            except Exception:
-                                pass
-                except Exception:
-                    pass
-            except Exception:
-                pass
-
-            # Reconcile Donations app if paid
-            if paid:
-                try:
-                    from donations.models import Donation
-                    from donations.services import mark_paid_and_receipt, issue_magic_link
-                    from donations.emails import send_receipt_email
-                    from django.urls import reverse
-
-                    donation = (
-                        Donation.objects.filter(txn_id=order_id).first() or
-                        Donation.objects.filter(order_id=data.get("id") or "").first() or
-                        Donation.objects.filter(txn_id=data.get("txn_id") or "").first()
-                    )
-                    if donation and donation.status != "SUCCESS":
-                        mode = data.get("payment_method") or data.get("payment_method_type") or ""
-                        mark_paid_and_receipt(donation, mode, data)
-                        meta = donation.gateway_meta or {}
-                        if not bool(meta.get("receipt_email_sent")):
-                            try:
-                                mlt = issue_magic_link(donation.donor)
-                                link = request.build_absolute_uri(
-                                    reverse("donations:magic_claim", kwargs={"token": mlt.token})
-                                )
-                                send_receipt_email(donation, magic_link_url=link)
-                                meta["receipt_email_sent"] = True
-                                donation.gateway_meta = meta
-                                donation.save(update_fields=["gateway_meta"])
-                            except Exception:
-                                pass
-                except Exception:
-                    pass
+            await sync_to_async(_apply_return_status)(request, ctx, pc, data, paid)
         except HdfcError:
             # Ignore on page render; client can still try manual check
             pass
 
-    resp = render(request, "payments/return.html", ctx)
-    if order_id:
-        resp.set_cookie("hdfc_last_order_id", order_id, max_age=1800, secure=True, samesite="Lax")
-    if customer_id:
-        resp.set_cookie("hdfc_customer_id", customer_id, max_age=1800, secure=True, samesite="Lax")
+    return await sync_to_async(_render_return)(request, ctx, order_id, customer_id)
+
+
+def _load_batch(order_ids: list[str]) -> dict:
+    """(PaymentContext, gateway customer_id, settled status) per known id.
+
+    One reference-index query covers indexed ids; unindexed ones cost one
+    more query per table.
+    """
+    from donations.models import Donation
+
+    found = {}
+    for r in (PaymentReference.objects.filter(ref__in=order_ids)
+              .select_related("order__donation__donor", "donation__donor")):
+        found[r.ref] = PaymentContext.preloaded(r.ref, r.order, r.donation)
+    missing = [oid for oid in order_ids if oid not in found]
+    if missing:
+        for o in Order.objects.filter(order_id__in=missing).select_related("donation__donor"):
+            found[o.order_id] = PaymentContext.preloaded(o.order_id, o)
+        for d in Donation.objects.filter(txn_id__in=missing).select_related("donor"):
+            found.setdefault(d.txn_id, PaymentContext.preloaded(d.txn_id, None, d))
+    # A row with no customer_id and no donor has no owner to match: treat it as unknown
+    return {
+        oid: (pc, pc.gateway_customer_id, pc.settled_status())
+        for oid, pc in found.items() if pc.gateway_customer_id
+    }
+
+
+@csrf_exempt
+@require_POST
+async def hdfc_order_status_batch_view(request):
+    """Status of many orders: ``{"order_ids": [...], "customer_id": "..."}`` -> ``{"results": {id: {...}}}``.
+
+    Settled payments are answered from the DB; the rest are fetched from HDFC
+    concurrently, at most ``HDFC_BATCH_CONCURRENCY`` at a time. Staff may ask
+    about any order; everyone else only about orders of their ``customer_id``.
+    """
+    body = _json_body(request)
+    if not isinstance(body, dict) or not isinstance(body.get("order_ids"), list):
+        return HttpResponseBadRequest("Expected JSON body with an order_ids list")
+    order_ids = list(dict.fromkeys(_sanitize_order_id(str(o)) for o in body["order_ids"]))
+    order_ids = [o for o in order_ids if o]
+    max_ids = getattr(settings, "HDFC_BATCH_MAX_IDS", 100)
+    if not order_ids or len(order_ids) > max_ids:
+        return HttpResponseBadRequest(f"order_ids must hold 1-{max_ids} ids")
+
+    user = await request.auser()
+    customer_id = str(body.get("customer_id") or "")
+    if not (user.is_staff or customer_id):
+        return HttpResponseBadRequest("customer_id is required")
+    force = await wants_refresh(request)
+
+    loaded = await sync_to_async(_load_batch)(order_ids)
+    results, pending = {}, []
+    for oid in order_ids:
+        pc, cust, settled = loaded.get(oid, (None, "", ""))
+        if pc is None or not (user.is_staff or cust == customer_id):
+            results[oid] = {"ok": False, "error": "unknown order"}
+            continue
+        if settled and not force:
+            gateway_avoided()
+            results[oid] = {"ok": True, "status": settled, "is_paid": settled in SUCCESS_STATUSES, "source": "db"}
+        else:
+            pending.append((oid, pc, cust))
+
+    limit = asyncio.Semaphore(getattr(settings, "HDFC_BATCH_CONCURRENCY", 5))
+
+    async def fetch(oid, pc, cust):
+        async with limit:
+            try:
+                result = await aorder_status(oid, cust, force=force)
+            except HdfcError as e:
+                return oid, {"ok": False, "error": str(e)}
+        data = result.get("data") or {}
+        status = extract_status(data)
+        paid = status in SUCCESS_STATUSES
+        await sync_to_async(_reconcile_order_status)(request, pc, data, paid)
+        return oid, {"ok": True, "status": status, "is_paid": paid, "source": "gateway"}
+
+    for oid, entry in await asyncio.gather(*(fetch(*p) for p in pending)):
+        results[oid] = entry
+    return JsonResponse({"ok": True, "results": results})
+
+
+@require_GET
+async def payment_status_events_view(request, order_id: str):
+    """Server-Sent Events: the order's local status now and whenever the webhook/reconciler changes it.
+
+    Needs the ``?token=`` the return/thank-you page got from ``live.stream_token()``.
+    Serve under ASGI: a waiting client is a parked coroutine, not a worker thread.
+    """
+    if not live.check_token(request.GET.get("token", ""), order_id):
+        return JsonResponse({"ok": False, "error": "unknown order"}, status=404)
+    resp = StreamingHttpResponse(live.status_stream(order_id), content_type="text/event-stream")
+    resp["Cache-Control"] = "no-cache"
+    resp["X-Accel-Buffering"] = "no"  # don't let nginx buffer the stream
     return resp
 
 
+@staff_member_required
+@require_GET
+def payments_metrics_view(request):
+    """Per-worker payment counters (status cache hits/misses etc.) for ops."""
+    return JsonResponse({"pid": os.getpid(), "counters": metrics.snapshot()})
+
+
 @csrf_exempt
 def hdfc_webhook_alias(request):
     """Alias endpoint for HDFC webhook at /payments/webhook.